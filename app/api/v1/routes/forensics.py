@@ -1,18 +1,18 @@
-from forensics.visualizer_api import create_forensic_visualizations_api
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, Path
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from app.api.v1.schemas.forensics import ForensicAnalysisResponse, ErrorResponse
 from app.config import settings
+from app.services.analysis_pool import PoolSaturatedError
+from typing import List, Optional
+import asyncio
+import json
 import time
-import tempfile
-import os
 import traceback
 
 # Import existing forensics module
-analyze_document_forensics = None
+analysis = None
 try:
-    from forensics import analyze_document_forensics
-    from forensics.forensic_analyzer import preprocess_uploaded_file
+    from app.services import analysis
     print("[SUCCESS] Forensics module imported successfully")
 except ImportError as e:
     print(f"[ERROR] Could not import forensics module: {e}")
@@ -24,6 +24,40 @@ except Exception as e:
 router = APIRouter()
 
 
+def _validate_upload(file_name, file_content=None):
+    """Raise HTTP 400 if the upload's type (or size, when given) is not allowed"""
+    try:
+        analysis.validate_extension(file_name)
+        if file_content is not None:
+            analysis.validate_size(file_content)
+    except analysis.UploadRejectedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _run_analysis(request, file_content, file_name, doc_type, wait=False):
+    """
+    Analyze one upload through the cache and worker pool
+    
+    Returns:
+        tuple: (pipeline results dict, served_from_cache bool)
+    
+    Raises:
+        HTTPException: 503 when the worker pool is unavailable or saturated
+    """
+    try:
+        return await analysis.analyze_upload(
+            request.app.state, file_content, file_name, doc_type, wait=wait
+        )
+    except analysis.AnalysisUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy: {e}. Please retry shortly.",
+            headers={"Retry-After": "5"}
+        )
+
+
 @router.post(
     "/forensics/analyze",
     response_model=ForensicAnalysisResponse,
@@ -43,6 +77,7 @@ router = APIRouter()
     """
 )
 async def analyze_document(
+    request: Request,
     file: UploadFile = File(..., description="Document to analyze"),
     doc_type: str = Query(
         default="unknown",
@@ -55,7 +90,7 @@ async def analyze_document(
     """
     
     # Check if forensics module is available
-    if analyze_document_forensics is None:
+    if analysis is None:
         raise HTTPException(
             status_code=503,
             detail="Forensics analysis module is not available. Please check server logs."
@@ -64,85 +99,268 @@ async def analyze_document(
     start_time = time.time()
     
     # Validate file extension
-    file_ext = file.filename.split('.')[-1].lower()
-    if file_ext not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type '{file_ext}' not allowed. Allowed types: {', '.join(settings.ALLOWED_EXTENSIONS)}"
-        )
+    _validate_upload(file.filename)
     
     # Read file content
     file_content = await file.read()
     
     # Validate file size
-    if len(file_content) > settings.max_file_size_bytes:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE_MB}MB"
-        )
-    
-    # Save to temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=f'.{file_ext}') as tmp:
-        tmp.write(file_content)
-        tmp_path = tmp.name
+    _validate_upload(file.filename, file_content)
     
     try:
-        # Run forensic analysis
-        results = analyze_document_forensics(
-            pdf_file=tmp_path,
-            pdf_bytes=file_content,
-            file_name=file.filename,
-            doc_type=doc_type.lower()
+        results, from_cache = await _run_analysis(
+            request, file_content, file.filename, doc_type.lower()
         )
-    
-        # Generate visual forensics
-        try:
-            visualizations = create_forensic_visualizations_api(
-                pdf_file=tmp_path,
-                pdf_bytes=file_content,
-                forensic_results=results,
-                max_pages=2  # Limit to first 2 pages for performance
-            )
-        except Exception as viz_error:
-            print(f"[WARNING] Could not generate visualizations: {viz_error}")
-            visualizations = None
-    
+        
         # Calculate processing time
         processing_time = time.time() - start_time
         
-        # Build response
-        response_data = {
-            **results,
-            "processing_time": processing_time,
-            "file_name": file.filename,
-            "doc_type": doc_type,
-            "visualizations": visualizations  # Add visualizations
-        }
-        
-        # Handle missing keys gracefully
-        for key in ['alignment', 'fonts', 'metadata', 'numbers', 'image']:
-            if key not in response_data:
-                response_data[key] = {
-                    'risk_score': 0,
-                    'applicable': False,
-                    'error': f'{key} check not available'
-                }
-        
-        return ForensicAnalysisResponse(**response_data)
+        return analysis.build_response(results, file.filename, doc_type, processing_time, from_cache)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Forensic analysis failed: {str(e)}"
         )
+
+
+@router.post(
+    "/forensics/analyze-batch",
+    responses={400: {"model": ErrorResponse}, 503: {"model": ErrorResponse}},
+    summary="Analyze many documents, streaming results as NDJSON",
+    description="""
+    Upload several documents at once. Files are analyzed in parallel on the
+    worker pool and each result is streamed as one JSON line
+    (`application/x-ndjson`) as soon as it finishes, in completion order.
+    
+    Each line has `index` (position in the upload), `file_name`, `status`
+    (`ok` or `error`) and either `result` (same shape as `/forensics/analyze`)
+    or `error`. Visualizations are omitted unless requested.
+    """
+)
+async def analyze_batch(
+    request: Request,
+    files: List[UploadFile] = File(..., description="Documents to analyze"),
+    doc_type: str = Query(
+        default="unknown",
+        description="Document type for every file: 'noa', 't1', or 'unknown'",
+        pattern="^(noa|t1|unknown)$"
+    ),
+    include_visualizations: bool = Query(
+        default=False,
+        description="Include visualization artifact references in each result line"
+    )
+):
+    """
+    Analyze a batch of documents, streaming each result when it is ready
+    """
+    
+    if analysis is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Forensics analysis module is not available. Please check server logs."
+        )
+    
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many files. Maximum per batch: {settings.MAX_BATCH_FILES}"
+        )
+    
+    # Read every upload now: the request body is gone once streaming starts
+    uploads = []
+    for file in files:
+        uploads.append((file.filename, await file.read()))
+    
+    analysis_pool = getattr(request.app.state, "analysis_pool", None)
+    # One batch may occupy every worker but never the whole queue, so
+    # single-document requests still get through
+    batch_slots = asyncio.Semaphore(analysis_pool.max_workers if analysis_pool else 1)
+    
+    async def analyze_one(index, file_name, file_content):
+        """Analyze one upload and build its NDJSON record"""
+        record = {"index": index, "file_name": file_name}
+        start_time = time.time()
+        try:
+            _validate_upload(file_name, file_content)
+            async with batch_slots:
+                results, from_cache = await _run_analysis(
+                    request, file_content, file_name, doc_type.lower(), wait=True
+                )
+            response = analysis.build_response(
+                results, file_name, doc_type, time.time() - start_time, from_cache
+            )
+            if not include_visualizations:
+                response.visualizations = None
+            record.update(status="ok", result=response.model_dump(mode="json"))
+        except HTTPException as e:
+            record.update(status="error", error=e.detail)
+        except Exception as e:
+            record.update(status="error", error=f"Forensic analysis failed: {str(e)}")
+        return record
     
-    finally:
-        # Clean up temporary file
+    async def stream_results():
+        tasks = [
+            asyncio.create_task(analyze_one(index, file_name, file_content))
+            for index, (file_name, file_content) in enumerate(uploads)
+        ]
         try:
-            if os.path.exists(tmp_path):
-                os.unlink(tmp_path)
-        except:
-            pass
+            for finished in asyncio.as_completed(tasks):
+                record = await finished
+                yield json.dumps(record) + "\n"
+        finally:
+            # Client went away: stop work that has not started yet
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def _negotiated_image_format(request, image_format):
+    """Requested image format, else WebP if the client accepts it, else PNG"""
+    if image_format:
+        return image_format
+    return "webp" if "image/webp" in request.headers.get("accept", "") else "png"
+
+
+async def _serve_visualization(request, doc_hash, page, extension, kind):
+    """
+    Stream a visualization artifact, rendering it on first request
+    
+    Raises:
+        HTTPException: 404 for unknown documents or pages, 503 when
+            visualizations are disabled or the worker pool is unavailable
+    """
+    if analysis is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Forensics analysis module is not available. Please check server logs."
+        )
+    
+    try:
+        path = await analysis.visualization_path(
+            request.app.state, doc_hash, page, extension, kind=kind
+        )
+    except analysis.VisualizationNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except analysis.AnalysisUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except PoolSaturatedError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy: {e}. Please retry shortly.",
+            headers={"Retry-After": "5"}
+        )
+    
+    headers = {
+        "ETag": analysis.visualization_etag(path),
+        "Cache-Control": "private, max-age=86400",
+        "Vary": "Accept"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=analysis.MEDIA_TYPES[extension], headers=headers)
+
+
+DOC_HASH_PATH = Path(..., description="Content hash from the artifact ID", pattern="^[0-9a-f]{64}$")
+PAGE_PATH = Path(..., ge=1, description="Page number (1-based)")
+IMAGE_FORMAT_QUERY = Query(
+    default=None,
+    description="Image format: 'png' or 'webp' (default: WebP if accepted, else PNG)",
+    pattern="^(png|webp)$"
+)
+VISUALIZATION_RESPONSES = {
+    304: {"description": "Not modified (If-None-Match matched the ETag)"},
+    404: {"model": ErrorResponse},
+    503: {"model": ErrorResponse}
+}
+
+
+@router.get(
+    "/forensics/visualizations/{doc_hash}/{page}",
+    response_class=FileResponse,
+    responses={200: {"content": {"image/png": {}, "image/webp": {}}}, **VISUALIZATION_RESPONSES},
+    summary="Annotated forensic panels of one analyzed page",
+    description="""
+    Serve the 4-panel visualization (original, font inconsistencies,
+    number patterns, alignment issues) of a page listed in an analysis
+    response's `visualizations`. The page is rendered on its first request
+    and served from disk afterwards, with an `ETag` for conditional requests.
+    
+    The format is `format` if given, otherwise WebP when the `Accept`
+    header allows it and PNG otherwise.
+    """
+)
+async def get_visualization(
+    request: Request,
+    doc_hash: str = DOC_HASH_PATH,
+    page: int = PAGE_PATH,
+    format: Optional[str] = IMAGE_FORMAT_QUERY
+):
+    """
+    Render (once) and stream the visualization of an analyzed page
+    """
+    image_format = _negotiated_image_format(request, format)
+    return await _serve_visualization(request, doc_hash, page, image_format, analysis.PANELS)
+
+
+@router.get(
+    "/forensics/visualizations/{doc_hash}/{page}/overlay",
+    response_class=FileResponse,
+    responses={200: {"content": {"application/json": {}, "image/svg+xml": {}}}, **VISUALIZATION_RESPONSES},
+    summary="Forensic highlights of one analyzed page as vector layers",
+    description="""
+    The boxes behind the visualization panels, for clients that draw the
+    highlights themselves over the page `thumbnail`: non-dominant-font
+    characters (`odd_fonts`), numbers by decimal precision
+    (`numbers_2dp`, `numbers_other`, `numbers_integer`) and misaligned
+    words (`alignment`).
+    
+    `format=json` (default) returns `{page, width, height, layers}` with
+    each layer's `boxes` as `[x0, top, x1, bottom]` in PDF points from the
+    top-left corner, plus its `fill`, `stroke`, `opacity` and
+    `stroke_width`. `format=svg` returns the same layers as one `<g>`
+    each in a page-sized viewBox.
+    """
+)
+async def get_visualization_overlay(
+    request: Request,
+    doc_hash: str = DOC_HASH_PATH,
+    page: int = PAGE_PATH,
+    format: str = Query(
+        default="json",
+        description="Overlay format: 'json' or 'svg'",
+        pattern="^(json|svg)$"
+    )
+):
+    """
+    Compute (once) and return the vector highlights of an analyzed page
+    """
+    return await _serve_visualization(request, doc_hash, page, format, analysis.OVERLAY)
+
+
+@router.get(
+    "/forensics/visualizations/{doc_hash}/{page}/thumbnail",
+    response_class=FileResponse,
+    responses={200: {"content": {"image/png": {}, "image/webp": {}}}, **VISUALIZATION_RESPONSES},
+    summary="Plain raster of one analyzed page, the backdrop for vector overlays",
+    description="""
+    The page rendered at 72 dpi, one pixel per PDF point, so `overlay`
+    boxes map onto it directly. Cached on disk after the first request.
+    """
+)
+async def get_visualization_thumbnail(
+    request: Request,
+    doc_hash: str = DOC_HASH_PATH,
+    page: int = PAGE_PATH,
+    format: Optional[str] = IMAGE_FORMAT_QUERY
+):
+    """
+    Render (once) and stream the thumbnail of an analyzed page
+    """
+    image_format = _negotiated_image_format(request, format)
+    return await _serve_visualization(request, doc_hash, page, image_format, analysis.THUMBNAIL)
 
 @router.get(
     "/forensics/supported-formats",
@@ -0,0 +1,148 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request, Path
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from app.api.v1.schemas.forensics import ErrorResponse
+from app.api.v1.schemas.jobs import JobStatusResponse
+from app.config import settings
+from app.services import analysis
+from app.services.jobs import COMPLETED, FAILED
+import json
+
+router = APIRouter()
+
+JOBS_PATH = "/forensics/jobs"
+
+
+def _job_services(request):
+    """JobStore and JobRunner from the app state, or HTTP 503"""
+    store = getattr(request.app.state, "job_store", None)
+    runner = getattr(request.app.state, "job_runner", None)
+    if store is None or runner is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue is not running. Please check server logs."
+        )
+    return store, runner
+
+
+def _status_response(job):
+    return JobStatusResponse.from_job(job, f"{settings.API_V1_STR}{JOBS_PATH}")
+
+
+async def _get_job(store, job_id):
+    """Job record or HTTP 404"""
+    job = await run_in_threadpool(store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found or expired")
+    return job
+
+
+@router.post(
+    JOBS_PATH,
+    status_code=202,
+    response_model=JobStatusResponse,
+    responses={400: {"model": ErrorResponse}, 503: {"model": ErrorResponse}},
+    summary="Submit a document for asynchronous forensic analysis",
+    description="""
+    Queue a document (PDF, JPEG, or PNG) for the same analysis as
+    `/forensics/analyze` and return immediately with a job ID. Poll the
+    status URL, then fetch the result once the job is `completed`.
+    Jobs are stored durably and resume after a server restart.
+    """
+)
+async def submit_job(
+    request: Request,
+    file: UploadFile = File(..., description="Document to analyze"),
+    doc_type: str = Query(
+        default="unknown",
+        description="Document type: 'noa', 't1', or 'unknown'",
+        pattern="^(noa|t1|unknown)$"
+    )
+):
+    """
+    Queue a forensic analysis job
+    """
+    store, runner = _job_services(request)
+    
+    file_content = await file.read()
+    try:
+        analysis.validate_extension(file.filename)
+        analysis.validate_size(file_content)
+    except analysis.UploadRejectedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    job = await run_in_threadpool(store.create, file.filename, doc_type.lower(), file_content)
+    runner.notify()
+    
+    return _status_response(job)
+
+
+@router.get(
+    JOBS_PATH + "/{job_id}",
+    response_model=JobStatusResponse,
+    responses={404: {"model": ErrorResponse}},
+    summary="Get job status"
+)
+async def get_job_status(
+    request: Request,
+    job_id: str = Path(..., description="Job ID returned on submission")
+):
+    """
+    Get the status of an analysis job
+    """
+    store, _ = _job_services(request)
+    job = await _get_job(store, job_id)
+    return _status_response(job)
+
+
+@router.get(
+    JOBS_PATH + "/{job_id}/result",
+    responses={404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}},
+    summary="Get job result",
+    description="""
+    Returns the analysis result (same shape as `/forensics/analyze`) once the
+    job is `completed`. Returns 409 while the job is queued or running, or if
+    it failed or was cancelled. Results are kept for `JOB_RESULT_TTL_SECONDS`.
+    """
+)
+async def get_job_result(
+    request: Request,
+    job_id: str = Path(..., description="Job ID returned on submission")
+):
+    """
+    Get the result of a completed analysis job
+    """
+    store, _ = _job_services(request)
+    job = await _get_job(store, job_id)
+    
+    if job['status'] == COMPLETED:
+        # Stored as the serialized ForensicAnalysisResponse
+        return JSONResponse(content=json.loads(job["result"]))
+    
+    detail = f"Job is {job['status']}"
+    if job['status'] == FAILED and job['error']:
+        detail = f"{detail}: {job['error']}"
+    raise HTTPException(status_code=409, detail=detail)
+
+
+@router.delete(
+    JOBS_PATH + "/{job_id}",
+    response_model=JobStatusResponse,
+    responses={404: {"model": ErrorResponse}, 409: {"model": ErrorResponse}},
+    summary="Cancel a job"
+)
+async def cancel_job(
+    request: Request,
+    job_id: str = Path(..., description="Job ID returned on submission")
+):
+    """
+    Cancel a queued or running analysis job
+    """
+    store, runner = _job_services(request)
+    await _get_job(store, job_id)
+    
+    cancelled = await runner.cancel(job_id)
+    job = await _get_job(store, job_id)
+    if not cancelled:
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return _status_response(job)
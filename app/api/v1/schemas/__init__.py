@@ -1,6 +1,3 @@
 from .forensics import *
 from .comparison import *
-
-
-
-
+from .jobs import *
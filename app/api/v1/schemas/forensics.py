@@ -27,10 +27,35 @@ class ForensicAnalysisResponse(BaseModel):
     page_numbers: Optional[Dict[str, Any]] = None
     noa_id_check: Optional[Dict[str, Any]] = None
     
-    # NEW: Visual forensics
+    # Compressed-domain JPEG check (JPEG uploads only)
+    jpeg: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Quantization-table quality estimate and double-compression test"
+    )
+    
+    # Per-page scanned/digital classification used to route the checks
+    page_classification: Optional[Dict[str, Any]] = Field(
+        default=None,
+        description="Page types (digital, scanned, hybrid, blank) with text/image coverage and font count"
+    )
+    
+    # Whether the result was served from the content-addressed cache
+    cached: bool = Field(
+        default=False,
+        description="True when this result was served from the analysis cache"
+    )
+    
+    # Wall time of each check in seconds
+    timings: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Per-check wall time in seconds"
+    )
+    
+    # Visual forensics, rendered on request by /forensics/visualizations
     visualizations: Optional[List[Dict[str, str]]] = Field(
         default=None,
-        description="Base64-encoded visualization images showing forensic issues"
+        description="Per-page visualization artifacts: page, artifact_id ('{doc_hash}/{page}'), url of the "
+                    "rendered panels, overlay_url (vector highlights) and thumbnail_url"
     )
     
     class Config:
@@ -43,9 +68,11 @@ class ForensicAnalysisResponse(BaseModel):
                 "fonts": {"risk_score": 45, "applicable": True},
                 "visualizations": [
                     {
-                        "page": 1,
-                        "image_base64": "iVBORw0KGgoAAAANS...",
-                        "format": "png"
+                        "page": "1",
+                        "artifact_id": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08/1",
+                        "url": "/api/v1/forensics/visualizations/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08/1",
+                        "overlay_url": "/api/v1/forensics/visualizations/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08/1/overlay",
+                        "thumbnail_url": "/api/v1/forensics/visualizations/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08/1/thumbnail"
                     }
                 ]
             }
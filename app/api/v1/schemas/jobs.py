@@ -0,0 +1,36 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class JobStatusResponse(BaseModel):
+    """Status of an asynchronous forensic analysis job"""
+    job_id: str
+    status: str = Field(description="queued, running, completed, failed or cancelled")
+    file_name: str
+    doc_type: str
+    created_at: float = Field(description="Submission time (Unix timestamp)")
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = Field(
+        default=None,
+        description="When the result will be deleted (set once the job finishes)"
+    )
+    error: Optional[str] = None
+    status_url: str
+    result_url: str
+
+    @classmethod
+    def from_job(cls, job, base_url):
+        """Build from a JobStore record"""
+        return cls(
+            job_id=job['id'],
+            status=job['status'],
+            file_name=job['file_name'],
+            doc_type=job['doc_type'],
+            created_at=job['created_at'],
+            started_at=job['started_at'],
+            finished_at=job['finished_at'],
+            expires_at=job['expires_at'],
+            error=job['error'],
+            status_url=f"{base_url}/{job['id']}",
+            result_url=f"{base_url}/{job['id']}/result"
+        )
@@ -44,6 +44,36 @@ class Settings(BaseSettings):
         """Convert MB to bytes"""
         return self.MAX_FILE_SIZE_MB * 1024 * 1024
     
+    # Forensic analysis
+    FORENSIC_CHECK_WORKERS: int = 4  # Threads running independent checks per document
+    ANALYSIS_WORKERS: int = 2  # Worker processes for CPU-bound analysis
+    ANALYSIS_QUEUE_SIZE: int = 8  # Analyses allowed to wait for a worker before 503
+    MAX_BATCH_FILES: int = 50  # Files accepted by one /forensics/analyze-batch call
+    
+    # Analysis result cache
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_PATH: str = "./forensic_cache.db"
+    RESULT_CACHE_MEMORY_ITEMS: int = 64
+    RESULT_CACHE_MAX_MB: int = 512
+    
+    # OCR result cache (shared by the analysis worker processes)
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_PATH: str = "./forensic_ocr_cache.db"
+    OCR_CACHE_MEMORY_ITEMS: int = 512  # Per worker process
+    OCR_CACHE_MAX_ENTRIES: int = 50000
+    
+    # Visualizations (rendered on first request, then served from disk)
+    VISUALIZATION_ENABLED: bool = True
+    VISUALIZATION_DIR: str = "./visualizations"
+    VISUALIZATION_PAGES: int = 2  # Pages per document offered for visualization
+    VISUALIZATION_CACHE_MAX_MB: int = 1024
+    VISUALIZATION_TTL_SECONDS: int = 86400  # How long a document is kept after its last analysis
+    
+    # Asynchronous analysis jobs
+    JOB_DB_PATH: str = "./forensic_jobs.db"
+    JOB_STORAGE_DIR: str = "./job_uploads"
+    JOB_RESULT_TTL_SECONDS: int = 86400  # How long finished job results are kept
+    
     # Path to existing fraud detection code
     # FRAUD_DETECTION_CODE_PATH: str = "../fraud-detection-poc"
     
@@ -1,7 +1,15 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 from app.config import settings
+from app.services.analysis_pool import AnalysisPool
+from app.services.jobs import JobStore, JobRunner
+from app.services.visualizations import VisualizationStore
+from forensics.cache import ResultCache
+from forensics.ocr import configure_ocr_cache
+from forensics.ocr_cache import OcrCache
 import time
 # import sys
 # import os
@@ -10,7 +18,76 @@ import time
 # sys.path.insert(0, os.path.abspath(settings.FRAUD_DETECTION_CODE_PATH))
 
 # Import routes AFTER adding fraud-detection-poc to sys.path
-from app.api.v1.routes import forensics, comparison, database
+from app.api.v1.routes import forensics, comparison, database, jobs
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the analysis worker pool and job runner on startup and stop them on shutdown"""
+    print(f"Starting {settings.PROJECT_NAME} v{settings.VERSION}")
+    # Display localhost for browser access (0.0.0.0 is just the bind address)
+    display_host = "localhost" if settings.API_HOST == "0.0.0.0" else settings.API_HOST
+    print(f"API Documentation: http://{display_host}:{settings.API_PORT}/api/docs")
+    print(f"Health Check: http://{display_host}:{settings.API_PORT}/health")
+    
+    # Workers read and fill the OCR cache; this process only reports its stats
+    app.state.ocr_cache = None
+    pool_initializer = None
+    pool_initargs = ()
+    if settings.OCR_CACHE_ENABLED:
+        app.state.ocr_cache = OcrCache(
+            db_path=settings.OCR_CACHE_PATH,
+            memory_items=settings.OCR_CACHE_MEMORY_ITEMS,
+            max_entries=settings.OCR_CACHE_MAX_ENTRIES
+        )
+        pool_initializer = configure_ocr_cache
+        pool_initargs = (
+            settings.OCR_CACHE_PATH,
+            settings.OCR_CACHE_MEMORY_ITEMS,
+            settings.OCR_CACHE_MAX_ENTRIES
+        )
+    
+    app.state.analysis_pool = AnalysisPool(
+        max_workers=settings.ANALYSIS_WORKERS,
+        queue_size=settings.ANALYSIS_QUEUE_SIZE,
+        initializer=pool_initializer,
+        initargs=pool_initargs
+    )
+    app.state.analysis_pool.start()
+    
+    app.state.result_cache = None
+    if settings.RESULT_CACHE_ENABLED:
+        app.state.result_cache = ResultCache(
+            db_path=settings.RESULT_CACHE_PATH,
+            memory_items=settings.RESULT_CACHE_MEMORY_ITEMS,
+            max_disk_bytes=settings.RESULT_CACHE_MAX_MB * 1024 * 1024
+        )
+    
+    app.state.visualization_store = None
+    if settings.VISUALIZATION_ENABLED:
+        app.state.visualization_store = VisualizationStore(
+            root_dir=settings.VISUALIZATION_DIR,
+            max_bytes=settings.VISUALIZATION_CACHE_MAX_MB * 1024 * 1024,
+            ttl=settings.VISUALIZATION_TTL_SECONDS
+        )
+        app.state.visualization_store.purge_expired()
+    
+    app.state.job_store = JobStore(
+        db_path=settings.JOB_DB_PATH,
+        storage_dir=settings.JOB_STORAGE_DIR,
+        result_ttl=settings.JOB_RESULT_TTL_SECONDS
+    )
+    app.state.job_runner = JobRunner(
+        app.state.job_store,
+        app.state,
+        concurrency=settings.ANALYSIS_WORKERS
+    )
+    app.state.job_runner.start()
+    
+    yield
+    
+    print(f"Shutting down {settings.PROJECT_NAME}")
+    await app.state.job_runner.stop()
+    app.state.analysis_pool.shutdown()
 
 # Create FastAPI application
 app = FastAPI(
@@ -19,7 +96,8 @@ app = FastAPI(
     version=settings.VERSION,
     docs_url="/api/docs",
     redoc_url="/api/redoc",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    lifespan=lifespan
 )
 
 # CORS Middleware
@@ -48,6 +126,12 @@ app.include_router(
     tags=["forensics"]
 )
 
+app.include_router(
+    jobs.router,
+    prefix=settings.API_V1_STR,
+    tags=["jobs"]
+)
+
 app.include_router(
     comparison.router,
     prefix=settings.API_V1_STR,
@@ -74,11 +158,13 @@ async def root():
 
 # Health check endpoint
 @app.get("/health", tags=["system"])
-async def health_check():
+async def health_check(request: Request):
     """
     Health check endpoint
     Returns API status and configuration
     """
+    analysis_pool = getattr(request.app.state, "analysis_pool", None)
+    ocr_cache = getattr(request.app.state, "ocr_cache", None)
     return {
         "status": "healthy",
         "version": settings.VERSION,
@@ -93,25 +179,11 @@ async def health_check():
             "max_file_size_mb": settings.MAX_FILE_SIZE_MB,
             "allowed_extensions": settings.ALLOWED_EXTENSIONS,
             "gemini_configured": bool(settings.GEMINI_API_KEY)
-        }
+        },
+        "analysis_pool": analysis_pool.stats() if analysis_pool else None,
+        "ocr_cache": await run_in_threadpool(ocr_cache.stats) if ocr_cache else None
     }
 
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    """Run on application startup"""
-    print(f"Starting {settings.PROJECT_NAME} v{settings.VERSION}")
-    # Display localhost for browser access (0.0.0.0 is just the bind address)
-    display_host = "localhost" if settings.API_HOST == "0.0.0.0" else settings.API_HOST
-    print(f"API Documentation: http://{display_host}:{settings.API_PORT}/api/docs")
-    print(f"Health Check: http://{display_host}:{settings.API_PORT}/health")
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Run on application shutdown"""
-    print(f"Shutting down {settings.PROJECT_NAME}")
-
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
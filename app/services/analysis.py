@@ -0,0 +1,227 @@
+"""
+Forensic analysis orchestration shared by the API routes and the job runner
+Validates uploads, consults the result cache, dispatches cache misses to
+the analysis worker pool and records uploads for on-demand visualizations
+"""
+
+from starlette.concurrency import run_in_threadpool
+from app.api.v1.schemas.forensics import ForensicAnalysisResponse
+from app.config import settings
+from forensics.cache import content_hash, make_cache_key, is_cacheable
+from forensics.forensic_analyzer import replay_side_effects
+from forensics.pipeline import run_forensic_pipeline
+from forensics.visualizer_api import (
+    convert_artifact, render_overlay, render_thumbnail, render_visualization
+)
+from app.services.visualizations import (
+    MEDIA_TYPES, OVERLAY, PANELS, THUMBNAIL, etag as visualization_etag
+)
+
+
+class UploadRejectedError(Exception):
+    """Raised when an upload fails validation (type or size)"""
+
+
+class AnalysisUnavailableError(Exception):
+    """Raised when the analysis worker pool is not running"""
+
+
+class VisualizationNotFoundError(Exception):
+    """Raised for a visualization of an unknown document or page"""
+
+
+def validate_extension(file_name):
+    """Raise UploadRejectedError unless the file extension is allowed"""
+    file_ext = file_name.split('.')[-1].lower()
+    if file_ext not in settings.ALLOWED_EXTENSIONS:
+        raise UploadRejectedError(
+            f"File type '{file_ext}' not allowed. Allowed types: {', '.join(settings.ALLOWED_EXTENSIONS)}"
+        )
+
+
+def validate_size(file_content):
+    """Raise UploadRejectedError if the upload exceeds the size limit"""
+    if len(file_content) > settings.max_file_size_bytes:
+        raise UploadRejectedError(
+            f"File too large. Maximum size: {settings.MAX_FILE_SIZE_MB}MB"
+        )
+
+
+def build_response(results, file_name, doc_type, processing_time, from_cache):
+    """Turn pipeline results into a ForensicAnalysisResponse"""
+    visualizations = results.pop('visualizations', None)
+    
+    response_data = {
+        **results,
+        "processing_time": processing_time,
+        "file_name": file_name,
+        "doc_type": doc_type,
+        "visualizations": visualizations,  # Artifact references, rendered on request
+        "cached": from_cache
+    }
+    
+    # Handle missing keys gracefully
+    for key in ['alignment', 'fonts', 'metadata', 'numbers', 'image']:
+        if key not in response_data:
+            response_data[key] = {
+                'risk_score': 0,
+                'applicable': False,
+                'error': f'{key} check not available'
+            }
+    
+    return ForensicAnalysisResponse(**response_data)
+
+
+async def analyze_upload(state, file_content, file_name, doc_type, wait=False):
+    """
+    Analyze one upload, serving it from the result cache when possible
+    
+    Misses are dispatched to the analysis worker pool and stored in the
+    cache; hits replay NOA ID registration for this submission.
+    
+    Args:
+        state: Application state holding analysis_pool, result_cache and
+               visualization_store
+        file_content: Uploaded bytes
+        file_name: Original file name
+        doc_type: Document type ('noa', 't1', or 'unknown')
+        wait: Wait for pool capacity instead of failing fast when saturated
+    
+    Returns:
+        tuple: (pipeline results dict, served_from_cache bool)
+    
+    Raises:
+        AnalysisUnavailableError: if the worker pool is not running
+        PoolSaturatedError: if the pool is full and wait is False
+    """
+    result_cache = getattr(state, "result_cache", None)
+    file_hash = content_hash(file_content)
+    cache_key = make_cache_key(file_hash, doc_type)
+    
+    if result_cache is not None:
+        results = await run_in_threadpool(result_cache.get, cache_key)
+        if results is not None:
+            results = await run_in_threadpool(replay_side_effects, results, file_name, file_hash)
+            results['visualizations'] = await _record_visualizations(
+                state, file_hash, file_content, results
+            )
+            return results, True
+    
+    analysis_pool = getattr(state, "analysis_pool", None)
+    if analysis_pool is None:
+        raise AnalysisUnavailableError("Analysis workers are not running. Please check server logs.")
+    
+    # Analysis runs in a worker process so the event loop keeps serving
+    # other requests meanwhile
+    results = await analysis_pool.submit(
+        run_forensic_pipeline,
+        file_content,
+        file_name=file_name,
+        doc_type=doc_type,
+        max_workers=settings.FORENSIC_CHECK_WORKERS,
+        visualization_pages=settings.VISUALIZATION_PAGES,
+        wait=wait
+    )
+    
+    if result_cache is not None and is_cacheable(results):
+        await run_in_threadpool(result_cache.put, cache_key, results)
+    
+    results['visualizations'] = await _record_visualizations(
+        state, file_hash, file_content, results
+    )
+    return results, False
+
+
+def visualization_url(doc_hash, page):
+    """Path of the endpoint serving a page's visualization"""
+    return f"{settings.API_V1_STR}/forensics/visualizations/{doc_hash}/{page}"
+
+
+async def _record_visualizations(state, file_hash, file_content, results):
+    """
+    Keep what the visualization endpoint needs and return artifact references
+    
+    Returns:
+        list: {'page', 'artifact_id', 'url', 'overlay_url', 'thumbnail_url'}
+              per page, or None when visualizations are disabled
+    """
+    pages = results.pop('visualization_pages', [])
+    store = getattr(state, "visualization_store", None)
+    if store is None:
+        return None
+    
+    await run_in_threadpool(store.save, file_hash, file_content, results, pages)
+    return [
+        {
+            "page": str(page),
+            "artifact_id": f"{file_hash}/{page}",
+            "url": visualization_url(file_hash, page),
+            "overlay_url": f"{visualization_url(file_hash, page)}/overlay",
+            "thumbnail_url": f"{visualization_url(file_hash, page)}/thumbnail"
+        }
+        for page in pages
+    ]
+
+
+async def visualization_path(state, doc_hash, page, extension, kind=PANELS, wait=False):
+    """
+    Rendered visualization artifact of an analyzed page, rendering it on first use
+    
+    Args:
+        state: Application state holding analysis_pool and visualization_store
+        doc_hash: Content hash of the upload
+        page: Page number (1-based)
+        extension: 'png' or 'webp' (PANELS, THUMBNAIL), 'json' or 'svg' (OVERLAY)
+        kind: PANELS, OVERLAY or THUMBNAIL
+        wait: Wait for pool capacity instead of failing fast when saturated
+    
+    Returns:
+        str: Path of the rendered artifact on disk
+    
+    Raises:
+        VisualizationNotFoundError: if the document or page was not analyzed
+        AnalysisUnavailableError: if visualizations are disabled or the
+            worker pool is not running
+        PoolSaturatedError: if the pool is full and wait is False
+    """
+    store = getattr(state, "visualization_store", None)
+    if store is None:
+        raise AnalysisUnavailableError("Visualizations are disabled.")
+    
+    path = await run_in_threadpool(store.rendered, doc_hash, kind, page, extension)
+    if path is not None:
+        return path
+    
+    stored = await run_in_threadpool(store.load, doc_hash)
+    if stored is None or page not in stored[2]:
+        raise VisualizationNotFoundError(
+            f"No visualization for page {page} of document '{doc_hash}'"
+        )
+    file_content, visualization_inputs, _ = stored
+    
+    analysis_pool = getattr(state, "analysis_pool", None)
+    if analysis_pool is None:
+        raise AnalysisUnavailableError("Analysis workers are not running. Please check server logs.")
+    
+    # Another format of a rendered artifact is converted rather than
+    # rendered again; overlays are always rendered as JSON first
+    source = await run_in_threadpool(store.source, doc_hash, kind, page, extension)
+    if source is None and kind == OVERLAY and extension != "json":
+        await visualization_path(state, doc_hash, page, "json", kind=OVERLAY, wait=wait)
+        source = await run_in_threadpool(store.source, doc_hash, kind, page, extension)
+    
+    if source is not None:
+        render_args = (convert_artifact, source[0], source[1], extension)
+    elif file_content is None:
+        raise VisualizationNotFoundError(
+            f"Page {page} of document '{doc_hash}' is no longer retained in that format; "
+            "analyze the document again"
+        )
+    elif kind == THUMBNAIL:
+        render_args = (render_thumbnail, file_content, page, extension)
+    elif kind == OVERLAY:
+        render_args = (render_overlay, file_content, visualization_inputs, page, extension)
+    else:
+        render_args = (render_visualization, file_content, visualization_inputs, page, extension)
+    data = await analysis_pool.submit(*render_args, wait=wait)
+    return await run_in_threadpool(store.store_rendered, doc_hash, kind, page, extension, data)
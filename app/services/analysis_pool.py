@@ -0,0 +1,110 @@
+"""
+Process pool for CPU-bound forensic work
+Keeps pdfplumber, poppler and tesseract off the asyncio event loop so light
+endpoints stay responsive while documents are analyzed
+"""
+
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the pool already has its maximum number of jobs in flight"""
+
+
+class AnalysisPool:
+    """
+    Bounded process pool owned by the application lifespan
+    
+    At most max_workers jobs run at once and up to queue_size more wait in
+    the executor queue. Beyond that submit() fails fast with
+    PoolSaturatedError so the API can apply backpressure (HTTP 503) instead
+    of piling up uploads in memory. Callers that already hold the data (batch
+    uploads) can instead pass wait=True to wait for a free slot.
+    """
+    
+    def __init__(self, max_workers=2, queue_size=8, initializer=None, initargs=()):
+        """
+        Args:
+            max_workers: Number of worker processes
+            queue_size: Jobs allowed to wait for a free worker
+            initializer: Callable run once in each worker process
+            initargs: Arguments for initializer
+        """
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+        self._in_flight = 0
+        self._slot_freed = asyncio.Condition()
+    
+    @property
+    def max_in_flight(self):
+        """Running plus queued jobs accepted before rejecting"""
+        return self.max_workers + self.queue_size
+    
+    @property
+    def in_flight(self):
+        """Jobs currently running or queued"""
+        return self._in_flight
+    
+    def start(self):
+        """Create the worker processes"""
+        if self._executor is None:
+            # spawn: forking a process that runs uvicorn's threads is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=self.initializer,
+                initargs=self.initargs
+            )
+    
+    def shutdown(self):
+        """Stop the worker processes, cancelling jobs that have not started"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+    
+    async def submit(self, func, *args, wait=False, **kwargs):
+        """
+        Run func(*args, **kwargs) in a worker process and await its result
+        
+        Args:
+            wait: Wait for a free slot instead of failing when saturated
+        
+        Raises:
+            PoolSaturatedError: if max_in_flight jobs are already pending
+                and wait is False
+        """
+        if self._executor is None:
+            raise RuntimeError("Analysis pool is not running")
+        
+        async with self._slot_freed:
+            if self._in_flight >= self.max_in_flight and not wait:
+                raise PoolSaturatedError(
+                    f"Analysis queue is full ({self._in_flight} jobs in flight)"
+                )
+            await self._slot_freed.wait_for(lambda: self._in_flight < self.max_in_flight)
+            self._in_flight += 1
+        
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            async with self._slot_freed:
+                self._in_flight -= 1
+                self._slot_freed.notify()
+    
+    def stats(self):
+        """Pool configuration and current load"""
+        return {
+            "workers": self.max_workers,
+            "queue_size": self.queue_size,
+            "in_flight": self._in_flight,
+            "running": self._executor is not None
+        }
@@ -0,0 +1,311 @@
+"""
+Asynchronous forensic analysis jobs
+A durable SQLite job table plus a background runner that feeds queued jobs
+to the analysis worker pool, so long analyses don't hold HTTP connections
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+
+from starlette.concurrency import run_in_threadpool
+
+from app.services import analysis
+
+# Job lifecycle states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobStore:
+    """
+    SQLite-backed job table
+
+    Uploads are kept on disk next to the database until the job finishes.
+    Finished jobs keep their result until expires_at, after which
+    purge_expired() removes them.
+    """
+
+    def __init__(self, db_path='forensic_jobs.db', storage_dir='./job_uploads', result_ttl=86400):
+        """
+        Args:
+            db_path: SQLite file for the job table
+            storage_dir: Directory holding uploads of unfinished jobs
+            result_ttl: Seconds a finished job's result is retained
+        """
+        self.db_path = db_path
+        self.storage_dir = storage_dir
+        self.result_ttl = result_ttl
+        os.makedirs(storage_dir, exist_ok=True)
+        self._create_tables()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _create_tables(self):
+        """Create the job table if it doesn't exist"""
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                doc_type TEXT NOT NULL,
+                upload_path TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                expires_at REAL
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_created
+            ON analysis_jobs(status, created_at)
+        ''')
+        conn.commit()
+        conn.close()
+
+    def create(self, file_name, doc_type, file_content):
+        """
+        Persist an upload and queue a job for it
+
+        Returns:
+            dict: The new job record
+        """
+        job_id = uuid.uuid4().hex
+        upload_path = os.path.join(self.storage_dir, f"{job_id}.upload")
+        with open(upload_path, 'wb') as f:
+            f.write(file_content)
+
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT INTO analysis_jobs (id, status, file_name, doc_type, upload_path, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (job_id, QUEUED, file_name, doc_type, upload_path, time.time()))
+            conn.commit()
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """Job record as a dict, or None if unknown or expired"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT * FROM analysis_jobs WHERE id = ?', (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+        if row is None:
+            return None
+        job = dict(row)
+        if job['expires_at'] is not None and job['expires_at'] < time.time():
+            return None
+        return job
+
+    def claim_next(self):
+        """
+        Atomically move the oldest queued job to running
+
+        Returns:
+            dict: The claimed job, or None if the queue is empty
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('''
+                SELECT id FROM analysis_jobs WHERE status = ?
+                ORDER BY created_at ASC LIMIT 1
+            ''', (QUEUED,)).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute('''
+                UPDATE analysis_jobs SET status = ?, started_at = ? WHERE id = ?
+            ''', (RUNNING, time.time(), row['id']))
+            conn.commit()
+        finally:
+            conn.close()
+        return self.get(row['id'])
+
+    def _finish(self, job_id, status, result=None, error=None):
+        """Record a terminal state for a running or queued job"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''
+                UPDATE analysis_jobs
+                SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ?
+                WHERE id = ? AND status IN (?, ?)
+            ''', (status, result, error, now, now + self.result_ttl, job_id, QUEUED, RUNNING))
+            conn.commit()
+            updated = cursor.rowcount > 0
+            upload_path = None
+            if updated:
+                row = conn.execute(
+                    'SELECT upload_path FROM analysis_jobs WHERE id = ?', (job_id,)
+                ).fetchone()
+                upload_path = row['upload_path']
+        finally:
+            conn.close()
+
+        # The upload is no longer needed once the job is done
+        if upload_path and os.path.exists(upload_path):
+            os.unlink(upload_path)
+        return updated
+
+    def complete(self, job_id, result_json):
+        """Store a finished job's result (JSON text); False if it was cancelled meanwhile"""
+        return self._finish(job_id, COMPLETED, result=result_json)
+
+    def fail(self, job_id, error):
+        """Mark a job failed; False if it was cancelled meanwhile"""
+        return self._finish(job_id, FAILED, error=error)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; False if it had already finished"""
+        return self._finish(job_id, CANCELLED)
+
+    def requeue_running(self):
+        """Return jobs left running by a previous process to the queue"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute('''
+                UPDATE analysis_jobs SET status = ?, started_at = NULL WHERE status = ?
+            ''', (QUEUED, RUNNING))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def purge_expired(self):
+        """Delete finished jobs whose retention has expired"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'DELETE FROM analysis_jobs WHERE expires_at IS NOT NULL AND expires_at < ?',
+                (time.time(),)
+            )
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+
+class JobRunner:
+    """
+    Background task that runs queued jobs on the analysis worker pool
+
+    At most `concurrency` jobs run at once, leaving the rest of the pool's
+    queue to synchronous requests. Jobs are picked up from the durable
+    table, so anything queued before a restart is resumed.
+    """
+
+    def __init__(self, store, state, concurrency=1, poll_interval=2.0):
+        """
+        Args:
+            store: JobStore
+            state: Application state holding analysis_pool and result_cache
+            concurrency: Jobs run at the same time
+            poll_interval: Seconds between queue polls when idle
+        """
+        self.store = store
+        self.state = state
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._running = {}     # job_id -> asyncio.Task
+        self._loop_task = None
+
+    def start(self):
+        """Resume interrupted jobs and start polling the queue"""
+        requeued = self.store.requeue_running()
+        if requeued:
+            print(f"[INFO] Requeued {requeued} interrupted analysis job(s)")
+        self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop polling and abandon in-progress jobs (they are requeued on next start)"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def notify(self):
+        """Wake the runner after a job was submitted"""
+        self._wakeup.set()
+
+    async def cancel(self, job_id):
+        """
+        Cancel a job
+
+        A running job stops waiting for its analysis, but the worker process
+        already analyzing it finishes and its result is discarded.
+
+        Returns:
+            bool: False if the job had already finished
+        """
+        cancelled = await run_in_threadpool(self.store.cancel, job_id)
+        # Tasks belong to the event loop: only touch them from here
+        task = self._running.get(job_id)
+        if cancelled and task is not None:
+            task.cancel()
+        return cancelled
+
+    async def _run(self):
+        while True:
+            await run_in_threadpool(self.store.purge_expired)
+
+            while len(self._running) < self.concurrency:
+                job = await run_in_threadpool(self.store.claim_next)
+                if job is None:
+                    break
+                task = asyncio.create_task(self._execute(job))
+                self._running[job['id']] = task
+                task.add_done_callback(lambda _, job_id=job['id']: self._running.pop(job_id, None))
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, job):
+        """Run one claimed job and store its outcome"""
+        start_time = time.time()
+        try:
+            with open(job['upload_path'], 'rb') as f:
+                file_content = f.read()
+
+            results, from_cache = await analysis.analyze_upload(
+                self.state, file_content, job['file_name'], job['doc_type'], wait=True
+            )
+            response = analysis.build_response(
+                results, job['file_name'], job['doc_type'], time.time() - start_time, from_cache
+            )
+            await run_in_threadpool(self.store.complete, job['id'], response.model_dump_json())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await run_in_threadpool(self.store.fail, job['id'], f"Forensic analysis failed: {str(e)}")
+        finally:
+            # Free a slot for the next queued job
+            self._wakeup.set()
+
@@ -0,0 +1,300 @@
+"""
+On-demand forensic visualizations
+Analyses only record what could be visualized; the annotated panels, vector
+overlay and thumbnail of a page are rendered on their first request and kept
+on disk, keyed by the upload's content hash
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+
+# Keys of the analysis results the visualizer reads
+VISUALIZATION_INPUTS = ('fonts', 'numbers', 'alignment')
+
+MEDIA_TYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'json': 'application/json',
+    'svg': 'image/svg+xml',
+}
+
+# Rendered artifacts per page: annotated panels, vector highlights and the
+# plain page raster they are drawn over
+PANELS = 'page'
+OVERLAY = 'overlay'
+THUMBNAIL = 'thumbnail'
+
+# Artifacts drawn from the analysis results (stale once they change)
+RESULT_ARTIFACTS = (PANELS, OVERLAY)
+
+# Formats another format of an artifact can be converted from: images
+# between each other, an SVG overlay from the JSON one
+SOURCE_FORMATS = {'png': ('webp',), 'webp': ('png',), 'svg': ('json',), 'json': ()}
+
+# Documents used this recently are never evicted (a response may be streaming them)
+EVICTION_GRACE_SECONDS = 60
+
+
+class VisualizationStore:
+    """
+    Disk store of uploads, their visualization inputs and rendered artifacts
+
+    Each document gets a directory named after its content hash holding the
+    upload, the subset of the analysis results the highlights are drawn from,
+    and every artifact rendered so far. The upload is dropped as soon as
+    every offered page has all its artifacts rendered (other formats are
+    converted from those), and whole documents are purged `ttl` seconds
+    after their last analysis. When the store exceeds max_bytes the least
+    recently used documents are removed.
+    """
+
+    def __init__(self, root_dir='./visualizations', max_bytes=1024 * 1024 * 1024, ttl=86400):
+        """
+        Args:
+            root_dir: Directory holding one subdirectory per document
+            max_bytes: Total size allowed on disk
+            ttl: Seconds a document is kept after its last analysis
+        """
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # Serializes writers with eviction and purging, which delete whole documents
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _document_dir(self, doc_hash):
+        return os.path.join(self.root_dir, doc_hash)
+
+    def _inputs_path(self, doc_hash):
+        return os.path.join(self._document_dir(doc_hash), 'inputs.json')
+
+    def _upload_path(self, doc_hash):
+        return os.path.join(self._document_dir(doc_hash), 'upload')
+
+    def artifact_path(self, doc_hash, kind, page, extension):
+        """Where a rendered artifact (PANELS, OVERLAY or THUMBNAIL) of a page is stored"""
+        return os.path.join(self._document_dir(doc_hash), f'{kind}-{page}.{extension}')
+
+    def save(self, doc_hash, file_content, results, pages):
+        """
+        Record an analyzed upload so its pages can be rendered later
+
+        Rendered panels and overlays are kept unless the visualization inputs
+        changed (e.g. the upload was re-analyzed by a newer check suite).
+        Each analysis restarts the document's retention period.
+
+        Args:
+            doc_hash: content_hash() of the upload
+            file_content: Uploaded bytes
+            results: Analysis results
+            pages: Page numbers (1-based) that may be visualized
+        """
+        inputs = json.dumps({
+            'pages': list(pages),
+            'results': {key: results.get(key) for key in VISUALIZATION_INPUTS},
+        }, sort_keys=True)
+
+        with self._lock:
+            document_dir = self._document_dir(doc_hash)
+            os.makedirs(document_dir, exist_ok=True)
+
+            inputs_path = self._inputs_path(doc_hash)
+            if os.path.exists(inputs_path):
+                with open(inputs_path) as f:
+                    unchanged = f.read() == inputs
+            else:
+                unchanged = False
+            if unchanged:
+                os.utime(inputs_path)
+            else:
+                for name in os.listdir(document_dir):
+                    if name.startswith(tuple(f'{kind}-' for kind in RESULT_ARTIFACTS)):
+                        _unlink(os.path.join(document_dir, name))
+                _write_atomic(inputs_path, inputs.encode())
+
+            if self._fully_rendered(doc_hash, pages):
+                _unlink(self._upload_path(doc_hash))
+            elif not os.path.exists(self._upload_path(doc_hash)):
+                _write_atomic(self._upload_path(doc_hash), file_content)
+            os.utime(document_dir)
+            self._purge_expired()
+            self._evict(keep=doc_hash)
+
+    def load(self, doc_hash):
+        """
+        Upload and visualization inputs of a document
+
+        Returns:
+            tuple: (file bytes or None once dropped, results subset, page
+                   numbers), or None if unknown
+        """
+        inputs = self._inputs(doc_hash)
+        if inputs is None:
+            return None
+        try:
+            with open(self._upload_path(doc_hash), 'rb') as f:
+                file_content = f.read()
+        except FileNotFoundError:
+            file_content = None
+        return file_content, inputs['results'], inputs['pages']
+
+    def _inputs(self, doc_hash):
+        try:
+            with open(self._inputs_path(doc_hash)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def rendered(self, doc_hash, kind, page, extension):
+        """Path of an already rendered artifact, or None"""
+        path = self.artifact_path(doc_hash, kind, page, extension)
+        try:
+            os.utime(self._document_dir(doc_hash))
+        except FileNotFoundError:
+            return None
+        return path if os.path.exists(path) else None
+
+    def source(self, doc_hash, kind, page, extension):
+        """
+        Rendered artifact another format of it can be converted from
+
+        Returns:
+            tuple: (bytes, format), or None if no convertible format is rendered
+        """
+        for source_format in SOURCE_FORMATS[extension]:
+            try:
+                with open(self.artifact_path(doc_hash, kind, page, source_format), 'rb') as f:
+                    return f.read(), source_format
+            except FileNotFoundError:
+                continue
+        return None
+
+    def store_rendered(self, doc_hash, kind, page, extension, data):
+        """Keep a rendered artifact; returns its path"""
+        with self._lock:
+            os.makedirs(self._document_dir(doc_hash), exist_ok=True)
+            path = self.artifact_path(doc_hash, kind, page, extension)
+            _write_atomic(path, data)
+            inputs = self._inputs(doc_hash)
+            if inputs is not None and self._fully_rendered(doc_hash, inputs['pages']):
+                _unlink(self._upload_path(doc_hash))
+            self._evict(keep=doc_hash)
+            return path
+
+    def _fully_rendered(self, doc_hash, pages):
+        """
+        Whether every page has panels, a thumbnail and a JSON overlay, from
+        which any other format can be converted without the upload
+        """
+        try:
+            names = os.listdir(self._document_dir(doc_hash))
+        except FileNotFoundError:
+            return False
+        images = {name.rsplit('.', 1)[0] for name in names if name.endswith(('.png', '.webp'))}
+        return all(
+            f'{PANELS}-{page}' in images and f'{THUMBNAIL}-{page}' in images
+            and f'{OVERLAY}-{page}.json' in names
+            for page in pages
+        )
+
+    def purge_expired(self):
+        """Delete documents whose last analysis is older than ttl"""
+        with self._lock:
+            return self._purge_expired()
+
+    def _purge_expired(self):
+        """purge_expired() with the lock held"""
+        purged = 0
+        now = time.time()
+        for entry in _scandir(self.root_dir):
+            try:
+                used = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            try:
+                analyzed = os.stat(os.path.join(entry.path, 'inputs.json')).st_mtime
+            except FileNotFoundError:
+                # Artifact stored after its document was removed
+                analyzed = 0
+            if now - analyzed > self.ttl and now - used > EVICTION_GRACE_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                purged += 1
+        return purged
+
+    def _evict(self, keep):
+        """Remove least recently used documents other than `keep` until under max_bytes (lock held)"""
+        documents = []
+        total = 0
+        now = time.time()
+        for entry in _scandir(self.root_dir):
+            try:
+                used = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            size = _dir_size(entry.path)
+            total += size
+            if entry.name != keep and now - used > EVICTION_GRACE_SECONDS:
+                documents.append((used, size, entry.path))
+
+        documents.sort()
+        for _, size, path in documents:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+
+def _scandir(path):
+    """Subdirectories of path (documents removed meanwhile are skipped)"""
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return []
+    directories = []
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                directories.append(entry)
+        except FileNotFoundError:
+            continue
+    return directories
+
+
+def _dir_size(path):
+    """Total size of the files in a directory, skipping files removed meanwhile"""
+    try:
+        entries = list(os.scandir(path))
+    except FileNotFoundError:
+        return 0
+    size = 0
+    for entry in entries:
+        try:
+            if entry.is_file():
+                size += entry.stat().st_size
+        except FileNotFoundError:
+            continue
+    return size
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_atomic(path, data):
+    """Write a file so readers never see it half-written"""
+    tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def etag(path):
+    """Strong validator of a rendered artifact (changes whenever it is re-rendered)"""
+    stat = os.stat(path)
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
@@ -4,6 +4,7 @@ Independent forensic analysis for any PDF document
 """
 
 from .forensic_analyzer import analyze_document_forensics
+from .document import DocumentContext
 # Don't import visualizer - it's only for Streamlit UI, not the API
 # from .visualizer import create_forensic_visualizations
 from .checks import (
@@ -16,6 +17,7 @@ from .checks import (
 
 __all__ = [
     'analyze_document_forensics',
+    'DocumentContext',
     # 'create_forensic_visualizations',  # Not needed for API
     'check_text_alignment',
     'check_font_consistency',
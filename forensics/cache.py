@@ -0,0 +1,185 @@
+"""
+Content-addressed cache for forensic analysis results
+Keyed by the SHA-256 of the uploaded bytes, the document type and the check
+suite version, with an in-memory LRU tier in front of a size-bounded SQLite
+tier on disk
+"""
+
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .checks import CHECK_SUITE_VERSION
+
+
+def content_hash(file_bytes):
+    """SHA-256 hex digest of an upload"""
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def make_cache_key(file_hash, doc_type, suite_version=CHECK_SUITE_VERSION):
+    """Cache key for one document analyzed as doc_type by a given check suite"""
+    return f"{file_hash}:{doc_type}:{suite_version}"
+
+
+def is_cacheable(results):
+    """
+    Whether an analysis may be cached
+
+    Results where a check raised are not stored: the failure may be transient
+    (missing binary, worker crash) and would otherwise be served until the
+    entry is evicted.
+    """
+    return not any(
+        isinstance(value, dict) and value.get('error')
+        for value in results.values()
+    )
+
+
+class ResultCache:
+    """
+    Two-tier cache of analysis results
+
+    The memory tier holds the most recently used entries (pickled, so callers
+    always get their own copy). The disk tier is a SQLite table; when its
+    total payload exceeds max_disk_bytes the least recently accessed entries
+    are evicted.
+    """
+
+    def __init__(self, db_path='forensic_cache.db', memory_items=64, max_disk_bytes=512 * 1024 * 1024):
+        """
+        Args:
+            db_path: SQLite file for the disk tier
+            memory_items: Entries kept in the memory tier
+            max_disk_bytes: Total payload size allowed on disk
+        """
+        self.db_path = db_path
+        self.memory_items = memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = {'memory': 0, 'disk': 0}
+        self._misses = 0
+        self._create_tables()
+
+    def _create_tables(self):
+        """Create the cache table if it doesn't exist"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                cache_key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_cache_last_access
+            ON analysis_cache(last_access)
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _remember(self, key, payload):
+        """Put a payload in the memory tier, evicting the LRU entry if full"""
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Cached results for key, or None
+
+        Returns:
+            dict: A fresh copy of the cached results
+        """
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+                self._hits['memory'] += 1
+                return pickle.loads(payload)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            row = conn.execute(
+                'SELECT payload FROM analysis_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    'UPDATE analysis_cache SET last_access = ? WHERE cache_key = ?',
+                    (time.time(), key)
+                )
+                conn.commit()
+        finally:
+            conn.close()
+
+        if row is None:
+            with self._lock:
+                self._misses += 1
+            return None
+
+        payload = row[0]
+        self._remember(key, payload)
+        with self._lock:
+            self._hits['disk'] += 1
+        return pickle.loads(payload)
+
+    def put(self, key, results):
+        """Store results under key in both tiers"""
+        payload = pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, payload)
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO analysis_cache (cache_key, payload, size, last_access)
+                VALUES (?, ?, ?, ?)
+            ''', (key, payload, len(payload), time.time()))
+            self._evict(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _evict(self, conn):
+        """Drop least recently accessed disk entries until under max_disk_bytes"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM analysis_cache').fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+
+        rows = conn.execute(
+            'SELECT cache_key, size FROM analysis_cache ORDER BY last_access ASC'
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            conn.execute('DELETE FROM analysis_cache WHERE cache_key = ?', (key,))
+            total -= size
+
+    def stats(self):
+        """Hit/miss counters for this process and disk tier usage"""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            entries, size = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analysis_cache'
+            ).fetchone()
+        finally:
+            conn.close()
+
+        with self._lock:
+            hits = self._hits['memory'] + self._hits['disk']
+            lookups = hits + self._misses
+            return {
+                'memory_entries': len(self._memory),
+                'disk_entries': entries,
+                'disk_bytes': size,
+                'memory_hits': self._hits['memory'],
+                'disk_hits': self._hits['disk'],
+                'misses': self._misses,
+                'hit_rate': hits / lookups if lookups else 0.0
+            }
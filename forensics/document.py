@@ -0,0 +1,347 @@
+"""
+Shared document context for forensic checks
+Parses an uploaded PDF once and lazily exposes its pages, columnar
+char/word layout, text and metadata to every check that needs them. Image
+uploads get the same interface without a PDF (ImageDocument)
+"""
+
+import io
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pdfplumber
+from PIL import Image
+
+from .embedded_images import extract_page_scan
+from .layout import CharTable, FontCatalog, ImageTable, WordTable
+from .pdf_trailer import TrailerError, read_trailer
+from .raster import ImageRasterProvider, PageRasterProvider
+
+# Leading bytes of the raster formats accepted as uploads
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n')
+
+# EXIF tags mapped onto the PDF Info keys check_metadata reads
+EXIF_MAKE, EXIF_MODEL, EXIF_SOFTWARE, EXIF_DATETIME = 0x010F, 0x0110, 0x0131, 0x0132
+EXIF_IFD, EXIF_DATETIME_ORIGINAL = 0x8769, 0x9003
+
+
+def is_image(data):
+    """Whether bytes are a JPEG or PNG rather than a PDF"""
+    return bytes(data[:8]).startswith(IMAGE_SIGNATURES)
+
+
+class DocumentContext:
+    """
+    Parsed view of a single document, shared by all forensic checks
+
+    The PDF is opened with pdfplumber on first use. Each page is extracted at
+    most once: its chars and words become columnar tables (see layout.py)
+    and its text is kept, after which pdfplumber's per-page object cache is
+    flushed so the char dicts don't stay in memory. Page images come from a
+    single PageRasterProvider shared the same way.
+
+    pdfminer is not thread-safe, so all parsing goes through one lock; checks
+    running in parallel threads serialize only while extracting, and work on
+    the cached results concurrently.
+    """
+
+    def __init__(self, pdf_file=None, pdf_bytes=None):
+        """
+        Args:
+            pdf_file: File path or file-like object (optional if pdf_bytes given)
+            pdf_bytes: Raw document bytes (optional if pdf_file given)
+        """
+        if pdf_file is None and pdf_bytes is None:
+            raise ValueError("DocumentContext needs a file path or bytes")
+
+        self.pdf_file = pdf_file
+        self._pdf_bytes = pdf_bytes
+        self._pdf = None
+        self._layout = {}     # page index -> (CharTable, WordTable, text, ImageTable)
+        self.fonts = FontCatalog()
+        self._rasters = None
+        self._trailer = None
+        self._lock = threading.RLock()
+
+    @property
+    def pdf_bytes(self):
+        """Raw document bytes, read from pdf_file on first access if needed"""
+        with self._lock:
+            if self._pdf_bytes is None:
+                if isinstance(self.pdf_file, str) or hasattr(self.pdf_file, '__fspath__'):
+                    with open(self.pdf_file, 'rb') as f:
+                        self._pdf_bytes = f.read()
+                else:
+                    self.pdf_file.seek(0)
+                    self._pdf_bytes = self.pdf_file.read()
+            return self._pdf_bytes
+
+    @property
+    def pdf(self):
+        """pdfplumber document, opened on first access"""
+        with self._lock:
+            if self._pdf is None:
+                if self.pdf_file is not None:
+                    self._pdf = pdfplumber.open(self.pdf_file)
+                else:
+                    self._pdf = pdfplumber.open(io.BytesIO(self._pdf_bytes))
+            return self._pdf
+
+    @property
+    def pages(self):
+        """List of pdfplumber pages"""
+        with self._lock:
+            return self.pdf.pages
+
+    @property
+    def page_count(self):
+        """Number of pages in the document"""
+        return len(self.pages)
+
+    @property
+    def metadata(self):
+        """Document information dictionary (may be empty)"""
+        with self._lock:
+            return self.pdf.metadata or {}
+
+    @property
+    def trailer(self):
+        """
+        TrailerInfo read from the end of the file (Info dict, revisions)
+
+        Path-backed documents whose bytes haven't been loaded are
+        memory-mapped instead of read. Raises TrailerError if the xref
+        structure is unreadable.
+        """
+        with self._lock:
+            if self._trailer is None:
+                is_path = isinstance(self.pdf_file, str) or hasattr(self.pdf_file, '__fspath__')
+                if self._pdf_bytes is None and is_path:
+                    self._trailer = read_trailer(self.pdf_file)
+                else:
+                    self._trailer = read_trailer(self.pdf_bytes)
+            return self._trailer
+
+    @property
+    def rasters(self):
+        """PageRasterProvider shared by every image-based check"""
+        with self._lock:
+            if self._rasters is None:
+                # Reuse the page count if pdfplumber has already parsed the document
+                page_count = len(self._pdf.pages) if self._pdf is not None else None
+                self._rasters = PageRasterProvider(self.pdf_bytes, page_count=page_count)
+            return self._rasters
+
+    def _page_layout(self, page_index):
+        """Extract a page's chars, words, text and images once, then drop pdfplumber's objects"""
+        with self._lock:
+            if page_index not in self._layout:
+                page = self.pages[page_index]
+                self._layout[page_index] = (
+                    CharTable(page.chars, self.fonts),
+                    WordTable(page.extract_words()),
+                    page.extract_text() or '',
+                    ImageTable(page.images)
+                )
+                page.flush_cache()
+            return self._layout[page_index]
+
+    def char_table(self, page_index):
+        """CharTable of a page (0-indexed)"""
+        return self._page_layout(page_index)[0]
+
+    def word_table(self, page_index):
+        """WordTable of a page (0-indexed), words as from page.extract_words()"""
+        return self._page_layout(page_index)[1]
+
+    def text(self, page_index):
+        """Extracted text of a page (0-indexed), '' if the page has none"""
+        return self._page_layout(page_index)[2]
+
+    def image_table(self, page_index):
+        """ImageTable of a page (0-indexed): where embedded images are drawn"""
+        return self._page_layout(page_index)[3]
+
+    def image_data(self, page_index, image_index):
+        """
+        Stream data of an embedded image, with every filter except
+        DCTDecode/JPXDecode applied (those stay encoded)
+        """
+        with self._lock:
+            stream = self.image_table(page_index).sources[image_index][0]
+            return stream.get_data() if stream is not None else None
+
+    def page_scan(self, page_index, target_dpi=None):
+        """
+        Scanned image of a page at (close to) native resolution
+
+        Returns:
+            tuple: (PIL.Image in mode 'L', effective dpi), or None when the
+            page has no decodable scan and must be rendered instead
+        """
+        return extract_page_scan(self, page_index, target_dpi)
+
+    def font_histogram(self):
+        """
+        Char count per font over the whole document
+
+        Returns:
+            numpy array indexed by font code (see self.fonts)
+        """
+        tables = [self.char_table(i) for i in range(self.page_count)]
+        with self._lock:
+            font_count = len(self.fonts)
+        if not tables:
+            return np.zeros(0, dtype=np.int64)
+        return np.sum([table.font_histogram(font_count) for table in tables], axis=0)
+
+    def close(self):
+        """Release the underlying pdfplumber document"""
+        with self._lock:
+            if self._pdf is not None:
+                self._pdf.close()
+                self._pdf = None
+            if self._rasters is not None:
+                self._rasters.close()
+                self._rasters = None
+            self._layout.clear()
+            self._trailer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ImagePage:
+    """Page geometry of an image upload, in PDF points"""
+
+    __slots__ = ('width', 'height')
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+
+class ImageDocument(DocumentContext):
+    """
+    A JPEG/PNG upload as a one-page scanned document
+
+    Exposes the DocumentContext interface without a PDF: the page is the
+    image itself (decoded by ImageRasterProvider, see raster.py), the text
+    layer is empty, and the metadata comes from EXIF. Checks and OCR get
+    the decoded pixels directly instead of a PDF wrapper that would be
+    rasterized again.
+    """
+
+    def __init__(self, image_bytes):
+        """
+        Args:
+            image_bytes: JPEG or PNG file content
+        """
+        super().__init__(pdf_bytes=image_bytes)
+        self._rasters = ImageRasterProvider(image_bytes)
+        width, height = self._rasters.size_points
+        self._page = ImagePage(width, height)
+        self._metadata = None
+
+    @property
+    def pdf(self):
+        raise TypeError("Image uploads have no PDF structure")
+
+    @property
+    def pages(self):
+        return [self._page]
+
+    @property
+    def page_count(self):
+        return 1
+
+    @property
+    def metadata(self):
+        """Camera/scanner and software EXIF tags as PDF Info keys (may be empty)"""
+        with self._lock:
+            if self._metadata is None:
+                with Image.open(io.BytesIO(self.pdf_bytes)) as image:
+                    exif = image.getexif()
+                    original = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL)
+                device = ' '.join(str(exif[tag]).strip() for tag in (EXIF_MAKE, EXIF_MODEL) if exif.get(tag))
+                fields = {
+                    'Producer': device,
+                    'Creator': exif.get(EXIF_SOFTWARE),
+                    'CreationDate': original,
+                    'ModDate': exif.get(EXIF_DATETIME)
+                }
+                self._metadata = {key: str(value).strip() for key, value in fields.items() if value}
+            return self._metadata
+
+    @property
+    def trailer(self):
+        raise TrailerError("Image uploads have no PDF trailer")
+
+    @property
+    def rasters(self):
+        return self._rasters
+
+    def _page_layout(self, page_index):
+        """Empty text layer and one image covering the page"""
+        with self._lock:
+            if page_index != 0:
+                raise IndexError(f"Page {page_index + 1} out of range (document has 1)")
+            if 0 not in self._layout:
+                image = {
+                    'x0': 0, 'top': 0, 'x1': self._page.width, 'bottom': self._page.height,
+                    'srcsize': self._rasters.source_size
+                }
+                self._layout[0] = (CharTable([], self.fonts), WordTable([]), '', ImageTable([image]))
+            return self._layout[0]
+
+    def page_scan(self, page_index, target_dpi=None):
+        """The uploaded image in grayscale, decoded no coarser than target_dpi"""
+        if page_index != 0:
+            return None
+        return self._rasters.scan(target_dpi)
+
+    def close(self):
+        with self._lock:
+            self._rasters.close()
+            self._layout.clear()
+
+
+@contextmanager
+def open_document(source, pdf_bytes=None):
+    """
+    Yield a DocumentContext for a check's input
+
+    An existing DocumentContext is passed through untouched (the caller owns
+    it); a path, file-like object or bytes gets a temporary context that is
+    closed when the block exits. JPEG/PNG bytes open as an ImageDocument.
+
+    Args:
+        source: DocumentContext, file path, file-like object or bytes
+        pdf_bytes: Optional bytes of the same document, saves re-reading it
+    """
+    if isinstance(source, DocumentContext):
+        yield source
+        return
+
+    if isinstance(source, (bytes, bytearray)):
+        document = load_document(bytes(source))
+    elif source is None and pdf_bytes is not None:
+        document = load_document(pdf_bytes)
+    else:
+        document = DocumentContext(pdf_file=source, pdf_bytes=pdf_bytes)
+
+    try:
+        yield document
+    finally:
+        document.close()
+
+
+def load_document(file_bytes):
+    """DocumentContext for uploaded bytes: ImageDocument for JPEG/PNG, else PDF"""
+    if is_image(file_bytes):
+        return ImageDocument(file_bytes)
+    return DocumentContext(pdf_bytes=file_bytes)
@@ -0,0 +1,146 @@
+"""
+Direct extraction of embedded page images
+Decodes a scanned page's image XObject at its native resolution instead of
+re-rendering the page, so image checks see the scanner's pixels rather than
+a resampled copy. JPEG streams can be decoded at a reduced DCT scale when
+the consumer doesn't need full resolution
+"""
+
+import io
+import math
+
+import numpy as np
+from PIL import Image
+
+from .layout import X0, TOP, X1, BOTTOM
+from .page_classifier import SCAN_IMAGE_COVERAGE
+
+# Filter names (full and abbreviated) decoded by PIL from the raw stream
+JPEG_FILTERS = ('DCTDecode', 'DCT')
+JPEG2000_FILTERS = ('JPXDecode',)
+# Filters pdfminer decodes to raw samples
+SAMPLE_FILTERS = (
+    'FlateDecode', 'Fl', 'LZWDecode', 'LZW', 'RunLengthDecode', 'RL',
+    'ASCII85Decode', 'A85', 'ASCIIHexDecode', 'AHx'
+)
+
+# Components per pixel by colorspace name
+COLORSPACE_COMPONENTS = {
+    'DeviceGray': 1, 'CalGray': 1, 'G': 1,
+    'DeviceRGB': 3, 'CalRGB': 3, 'RGB': 3,
+    'DeviceCMYK': 4, 'CMYK': 4,
+}
+MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+
+def _name(obj):
+    """Name of a pdfminer literal (or the value itself)"""
+    return getattr(obj, 'name', obj)
+
+
+def _components(colorspace):
+    """Components per pixel of an image colorspace, or None if unsupported"""
+    if isinstance(colorspace, list) and colorspace:
+        colorspace = colorspace[0]
+    if isinstance(colorspace, list) and colorspace:
+        # [/ICCBased stream]
+        if _name(colorspace[0]) == 'ICCBased' and len(colorspace) > 1:
+            profile = colorspace[1]
+            profile = profile.resolve() if hasattr(profile, 'resolve') else profile
+            return profile.get('N')
+        return None
+    return COLORSPACE_COMPONENTS.get(_name(colorspace))
+
+
+def decode_image(data, filters, src_size, bits, colorspace, min_size=None):
+    """
+    Decode an image XObject's data to a grayscale PIL image
+
+    Args:
+        data: Stream data as returned by DocumentContext.image_data()
+        filters: Filter names of the stream, in order
+        src_size: (width, height) in pixels
+        bits: Bits per component
+        colorspace: pdfminer colorspace of the image
+        min_size: Smallest (width, height) the consumer needs; JPEG streams
+                  are decoded at the coarsest DCT scale that still covers it
+
+    Returns:
+        PIL.Image in mode 'L', or None for encodings that need a renderer
+        (CCITT, JBIG2, indexed or non-8-bit samples)
+    """
+    if data is None:
+        return None
+    last_filter = filters[-1] if filters else None
+
+    if last_filter in JPEG_FILTERS + JPEG2000_FILTERS:
+        image = Image.open(io.BytesIO(data))
+        if min_size and last_filter in JPEG_FILTERS:
+            # Scales by 1/2, 1/4 or 1/8 inside the decoder
+            image.draft('L', min_size)
+        return image.convert('L')
+
+    if last_filter is not None and last_filter not in SAMPLE_FILTERS:
+        return None
+    components = _components(colorspace)
+    if bits != 8 or components not in MODES:
+        return None
+
+    width, height = (int(v) for v in src_size)
+    expected = width * height * components
+    if width <= 0 or height <= 0 or len(data) < expected:
+        return None
+    image = Image.frombytes(MODES[components], (width, height), bytes(data[:expected]))
+    return image.convert('L')
+
+
+def extract_page_scan(document, page_index, target_dpi=None):
+    """
+    The scanned image of a page at (close to) native resolution
+
+    Picks the largest image drawn on the page; pages where no image covers
+    at least SCAN_IMAGE_COVERAGE of the page have no scan to extract.
+
+    Args:
+        document: DocumentContext
+        page_index: 0-indexed page
+        target_dpi: Resolution the consumer needs; JPEG scans above it are
+                    decoded at a reduced DCT scale that stays at or above it
+
+    Returns:
+        tuple: (PIL.Image in mode 'L', effective dpi), or None when the page
+        has no decodable scan and must be rendered instead
+    """
+    page = document.pages[page_index]
+    images = document.image_table(page_index)
+    if not len(images):
+        return None
+
+    boxes = images.boxes
+    areas = (boxes[:, X1] - boxes[:, X0]) * (boxes[:, BOTTOM] - boxes[:, TOP])
+    best = int(np.argmax(areas))
+    if areas[best] < SCAN_IMAGE_COVERAGE * float(page.width) * float(page.height):
+        return None
+
+    src_width, src_height = (int(v) for v in images.src_sizes[best])
+    placed_width = float(boxes[best, X1] - boxes[best, X0])
+    if src_width <= 0 or src_height <= 0 or placed_width <= 0:
+        return None
+    native_dpi = src_width / (placed_width / 72)
+
+    min_size = None
+    if target_dpi and native_dpi > target_dpi:
+        scale = target_dpi / native_dpi
+        min_size = (math.ceil(src_width * scale), math.ceil(src_height * scale))
+
+    stream, bits, colorspace = images.sources[best]
+    if stream is None:
+        return None
+    filters = [_name(f) for f, _ in stream.get_filters()]
+    image = decode_image(
+        document.image_data(page_index, best), filters,
+        (src_width, src_height), bits, colorspace, min_size
+    )
+    if image is None:
+        return None
+    return image, native_dpi * image.width / src_width
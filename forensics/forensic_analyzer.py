@@ -5,18 +5,24 @@ from .checks import (
     check_number_patterns,
     check_image_quality,
     check_page_numbers,
-    extract_and_check_noa_id
+    check_jpeg_compression,
+    extract_and_check_noa_id,
+    register_noa_id,
+    IMAGE_QUALITY_MAX_PAGES
 )
-from PIL import Image
-import io
-import tempfile
+from .document import ImageDocument, is_image, open_document
+from .jpeg_forensics import is_jpeg
+from .page_classifier import classify_document, has_text_layer
+from .raster import IMAGE_QUALITY_DPI, PAGE_NUMBER_DPI, NOA_ID_DPI
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 
 
 def preprocess_uploaded_file(uploaded_file):
     """
-    Convert uploaded file to PDF-compatible format
-    Supports: PDF, JPEG, JPG, PNG
+    Read an uploaded file for analysis
+    Supports: PDF, JPEG, JPG, PNG (images are passed through unchanged)
     
     Args:
         uploaded_file: Streamlit uploaded file object
@@ -32,71 +38,59 @@ def preprocess_uploaded_file(uploaded_file):
         return file_bytes, 'pdf', None
     
     elif file_name.endswith(('.jpg', '.jpeg', '.png')):
-        # Convert image to PDF
-        try:
-            from reportlab.pdfgen import canvas
-            from reportlab.lib.pagesizes import letter
-            
-            # Open image
-            img = Image.open(io.BytesIO(file_bytes))
-            
-            # Create PDF in memory
-            pdf_buffer = io.BytesIO()
-            c = canvas.Canvas(pdf_buffer, pagesize=letter)
-            
-            # Get page dimensions
-            page_width, page_height = letter
-            
-            # Get image dimensions
-            img_width, img_height = img.size
-            
-            # Scale image to fit page while maintaining aspect ratio
-            aspect = img_height / float(img_width)
-            
-            if aspect > 1:  # Portrait
-                display_width = page_width * 0.9
-                display_height = display_width * aspect
-            else:  # Landscape
-                display_height = page_height * 0.9
-                display_width = display_height / aspect
-            
-            # Center image on page
-            x = (page_width - display_width) / 2
-            y = (page_height - display_height) / 2
-            
-            # Save image temporarily
-            temp_img_path = tempfile.NamedTemporaryFile(delete=False, suffix='.png').name
-            img.save(temp_img_path, 'PNG')
-            
-            # Draw image on PDF
-            c.drawImage(temp_img_path, x, y, width=display_width, height=display_height)
-            c.save()
-            
-            # Get PDF bytes
-            pdf_bytes = pdf_buffer.getvalue()
-            
-            return pdf_bytes, 'image_converted', temp_img_path
-            
-        except Exception as e:
-            raise ValueError(f"Could not convert image to PDF: {str(e)}")
+        # Images are analyzed natively (ImageDocument), no PDF wrapper
+        if not is_image(file_bytes):
+            raise ValueError(f"Not a JPEG/PNG file: {file_name}")
+        return file_bytes, 'image', None
     
     else:
         raise ValueError(f"Unsupported file format: {file_name}")
 
 
-def analyze_document_forensics(pdf_file, pdf_bytes=None, file_name='unknown', doc_type='unknown'):
+# Extra fields added to a check's result when it raises
+_CHECK_ERROR_DEFAULTS = {
+    'page_numbers': {'applicable': False},
+    'noa_id_check': {'applicable': False},
+}
+
+
+def _run_check(name, check, args):
+    """
+    Run one forensic check, timing it and turning exceptions into results
+    
+    Returns:
+        tuple: (result dict, wall time in seconds)
+    """
+    start = time.perf_counter()
+    try:
+        result = check(*args)
+    except Exception as e:
+        result = {'risk_score': 0, 'error': str(e), **_CHECK_ERROR_DEFAULTS.get(name, {})}
+    return result, time.perf_counter() - start
+
+
+def analyze_document_forensics(pdf_file, pdf_bytes=None, file_name='unknown', doc_type='unknown',
+                               max_workers=None):
     """
     Complete forensic analysis of a PDF document with new NOA-specific checks
-    Now supports JPEG/PNG via conversion
+    JPEG/PNG uploads are analyzed as a one-page scan (ImageDocument); JPEGs
+    also get the compressed-domain check ('jpeg')
+    
+    The checks are independent of each other. With max_workers > 1 they run
+    concurrently on a bounded thread pool sharing one DocumentContext; the
+    heavy work (poppler, tesseract, OpenCV) happens outside the GIL, so wall
+    time approaches that of the slowest check.
     
     Args:
-        pdf_file: File path or uploaded file object
+        pdf_file: File path, uploaded file object or shared DocumentContext
         pdf_bytes: Optional bytes for image analysis
         file_name: Original file name for tracking
         doc_type: Document type ('noa', 't1', or 'unknown')
+        max_workers: Thread pool size for running checks (None or 1 = sequential)
         
     Returns:
-        dict with all forensic results and overall score
+        dict with all forensic results, page classification, overall score
+        and per-check timings
     """
     
     results = {
@@ -107,58 +101,104 @@ def analyze_document_forensics(pdf_file, pdf_bytes=None, file_name='unknown', do
         'image': None,
         'page_numbers': None,      # NEW
         'noa_id_check': None,      # NEW
+        'jpeg': None,
+        'page_classification': None,
         'overall_score': 0,
-        'risk_level': 'LOW'
+        'risk_level': 'LOW',
+        'timings': {}
     }
     
-    # Run existing checks
-    try:
-        results['alignment'] = check_text_alignment(pdf_file)
-    except Exception as e:
-        results['alignment'] = {'risk_score': 0, 'error': str(e)}
-    
-    try:
-        results['fonts'] = check_font_consistency(pdf_file)
-    except Exception as e:
-        results['fonts'] = {'risk_score': 0, 'error': str(e)}
-    
-    try:
-        results['metadata'] = check_metadata(pdf_file)
-    except Exception as e:
-        results['metadata'] = {'risk_score': 0, 'error': str(e)}
-    
-    try:
-        results['numbers'] = check_number_patterns(pdf_file)
-    except Exception as e:
-        results['numbers'] = {'risk_score': 0, 'error': str(e)}
-    
-    try:
+    # Parse the document once and share it across every check
+    with open_document(pdf_file, pdf_bytes) as document:
+        # Route checks by page type: text-layer checks need born-digital
+        # pages, the image check needs embedded images
+        classification = classify_document(document)
+        results['page_classification'] = classification
+        
+        # Declare raster needs up front so each page is rendered only once,
+        # at the highest DPI any image-based check uses on that page
         if pdf_bytes:
-            results['image'] = check_image_quality(pdf_bytes)
+            page_count = document.page_count
+            if classification['has_images']:
+                document.rasters.require(
+                    IMAGE_QUALITY_DPI,
+                    indices=range(min(IMAGE_QUALITY_MAX_PAGES, page_count))
+                )
+            if doc_type.lower() == 'noa':
+                # OCR checks only crop regions, which render on their own
+                # when an in-process region renderer is available
+                document.rasters.require(
+                    PAGE_NUMBER_DPI, regions_only=True, indices=range(0, page_count, 2)
+                )
+                # The ID is OCR'd from the first page only when it is a scan
+                if page_count and not has_text_layer(document, 0):
+                    document.rasters.require(NOA_ID_DPI, regions_only=True, indices=[0])
+        
+        checks = {'metadata': (check_metadata, (document,))}
+        
+        if classification['has_digital_text']:
+            checks['alignment'] = (check_text_alignment, (document,))
+            checks['fonts'] = (check_font_consistency, (document,))
+            checks['numbers'] = (check_number_patterns, (document,))
         else:
-            results['image'] = {'risk_score': 0, 'flags': ['Image analysis skipped']}
-    except Exception as e:
-        results['image'] = {'risk_score': 0, 'error': str(e)}
-    
-    # NEW CHECK 1: Page number consistency (NOA only)
-    try:
+            for name in ('alignment', 'fonts', 'numbers'):
+                results[name] = {
+                    'risk_score': 0,
+                    'applicable': False,
+                    'message': 'No born-digital text layer (scanned document)'
+                }
+        
         if pdf_bytes:
-            results['page_numbers'] = check_page_numbers(pdf_bytes, doc_type)
+            if classification['has_images']:
+                checks['image'] = (check_image_quality, (document,))
+            else:
+                results['image'] = {
+                    'risk_score': 0,
+                    'applicable': False,
+                    'flags': ['Image analysis skipped: no embedded images']
+                }
+            # Page number consistency and NOA ID duplicate detection (NOA only)
+            checks['page_numbers'] = (check_page_numbers, (document, doc_type))
+            checks['noa_id_check'] = (extract_and_check_noa_id, (document, file_name, doc_type))
         else:
+            results['image'] = {'risk_score': 0, 'flags': ['Image analysis skipped']}
             results['page_numbers'] = {'risk_score': 0, 'applicable': False}
-    except Exception as e:
-        results['page_numbers'] = {'risk_score': 0, 'error': str(e), 'applicable': False}
-    
-    # NEW CHECK 2: NOA ID duplicate detection (NOA only)
-    try:
-        if pdf_bytes:
-            results['noa_id_check'] = extract_and_check_noa_id(pdf_bytes, file_name, doc_type)
-        else:
             results['noa_id_check'] = {'risk_score': 0, 'applicable': False}
-    except Exception as e:
-        results['noa_id_check'] = {'risk_score': 0, 'error': str(e), 'applicable': False}
+        
+        if isinstance(document, ImageDocument) and is_jpeg(document.pdf_bytes):
+            checks['jpeg'] = (check_jpeg_compression, (document.pdf_bytes,))
+        
+        if max_workers and max_workers > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(checks))) as executor:
+                futures = {
+                    name: executor.submit(_run_check, name, check, args)
+                    for name, (check, args) in checks.items()
+                }
+                outcomes = {name: future.result() for name, future in futures.items()}
+        else:
+            outcomes = {
+                name: _run_check(name, check, args)
+                for name, (check, args) in checks.items()
+            }
+        
+        for name, (result, elapsed) in outcomes.items():
+            results[name] = result
+            results['timings'][name] = round(elapsed, 4)
+    
+    return score_results(results)
+
+
+def score_results(results):
+    """
+    Compute overall_score and risk_level from the individual check results
     
-    # Calculate overall score including new checks
+    Args:
+        results: dict as built by analyze_document_forensics
+    
+    Returns:
+        The same dict, updated in place
+    """
+    # Overall score including new checks
     scores = [
         results['alignment'].get('risk_score', 0),
         results['fonts'].get('risk_score', 0),
@@ -168,6 +208,9 @@ def analyze_document_forensics(pdf_file, pdf_bytes=None, file_name='unknown', do
         results['page_numbers'].get('risk_score', 0),       # NEW
         results['noa_id_check'].get('risk_score', 0)        # NEW
     ]
+    # JPEG uploads only
+    if results.get('jpeg'):
+        scores.append(results['jpeg'].get('risk_score', 0))
     
     results['overall_score'] = sum(scores) / len(scores)
     
@@ -181,3 +224,40 @@ def analyze_document_forensics(pdf_file, pdf_bytes=None, file_name='unknown', do
     
     return results
 
+
+# noa_id_check fields describing extraction rather than registration
+_NOA_EXTRACTION_FIELDS = ('id_source', 'ocr_confidence')
+
+
+def replay_side_effects(results, file_name, document_hash):
+    """
+    Re-apply the stateful parts of the check suite to a cached analysis
+    
+    Everything except NOA ID registration is a pure function of the document
+    bytes. Registration writes to the forensic database, so serving a cached
+    result must run it again for the new submission: a resubmitted NOA is a
+    duplicate exactly as it would be without the cache.
+    
+    Args:
+        results: Cached analyze_document_forensics results (modified in place)
+        file_name: Name of the current submission
+        document_hash: SHA-256 hex digest of the document bytes
+    
+    Returns:
+        The updated results dict
+    """
+    noa_result = results.get('noa_id_check') or {}
+    if noa_result.get('id_number'):
+        registered = register_noa_id(
+            noa_result['id_number'],
+            file_name,
+            document_hash[:16],
+            noa_result.get('extracted_info')
+        )
+        # Keep how the ID was extracted; only the registration outcome changes
+        for key in _NOA_EXTRACTION_FIELDS:
+            if key in noa_result:
+                registered[key] = noa_result[key]
+        results['noa_id_check'] = registered
+        score_results(results)
+    return results
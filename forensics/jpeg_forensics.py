@@ -0,0 +1,474 @@
+"""
+Compressed-domain JPEG reader
+Parses quantization tables, Huffman tables and the frame header straight
+from the bitstream and entropy-decodes a sample of luma blocks into
+quantized DCT coefficients, without dequantizing or running an IDCT. Used
+to estimate the encoder quality and detect double compression
+"""
+
+import functools
+import math
+import re
+
+import numpy as np
+
+
+class JpegError(ValueError):
+    """The JPEG bitstream could not be parsed"""
+
+
+# Zigzag position -> natural (row-major) index in an 8x8 block
+ZIGZAG = np.array([
+    0, 1, 8, 16, 9, 2, 3, 10, 17, 24, 32, 25, 18, 11, 4, 5,
+    12, 19, 26, 33, 40, 48, 41, 34, 27, 20, 13, 6, 7, 14, 21, 28,
+    35, 42, 49, 56, 57, 50, 43, 36, 29, 22, 15, 23, 30, 37, 44, 51,
+    58, 59, 52, 45, 38, 31, 39, 46, 53, 60, 61, 54, 47, 55, 62, 63
+])
+
+# libjpeg / IJG base luminance table (natural order), scaled by quality
+STANDARD_LUMINANCE = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99
+])[ZIGZAG]
+
+# Start-of-frame markers decoded here (baseline and extended sequential Huffman)
+SEQUENTIAL_HUFFMAN = (0xC0, 0xC1)
+# Other start-of-frame markers (progressive, lossless, arithmetic)
+OTHER_FRAMES = (0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)
+# APPn segments that name the software that wrote the file
+APP_SIGNATURES = (
+    (0xE0, b'JFIF', 'JFIF'),
+    (0xE1, b'Exif', 'Exif'),
+    (0xE1, b'http://ns.adobe.com/xap', 'XMP'),
+    (0xED, b'Photoshop', 'Photoshop'),
+    (0xEE, b'Adobe', 'Adobe'),
+)
+
+# Luma blocks entropy-decoded per image (spread across restart intervals)
+MAX_SAMPLE_BLOCKS = 8192
+# Low-frequency AC coefficients (zigzag 1..N) kept per block
+SAMPLE_MODES = 16
+
+_RESTART = re.compile(rb'\xff[\xd0-\xd7]')
+
+
+def is_jpeg(data):
+    """Whether bytes start with a JPEG SOI marker"""
+    return data[:3] == b'\xff\xd8\xff'
+
+
+def standard_table(quality):
+    """IJG luminance table (zigzag order) for a quality factor 1-100"""
+    scale = 5000 // quality if quality < 50 else 200 - 2 * quality
+    return np.clip((STANDARD_LUMINANCE * scale + 50) // 100, 1, 255)
+
+
+def estimate_quality(table):
+    """
+    Closest IJG quality factor for a luminance quantization table
+
+    Returns:
+        tuple: (quality 1-100, exact match bool)
+    """
+    errors = [np.abs(standard_table(q) - table).sum() for q in range(1, 101)]
+    best = int(np.argmin(errors))
+    return best + 1, errors[best] == 0
+
+
+def _huffman_lookup(counts, symbols):
+    """
+    16-bit peek table for one Huffman table
+
+    Returns:
+        list of 65536 (symbol, code length) tuples; (0, 0) for invalid codes
+    """
+    lookup = [(0, 0)] * 65536
+    code = 0
+    index = 0
+    for length in range(1, 17):
+        for _ in range(counts[length - 1]):
+            if code >= 1 << length:
+                raise JpegError('Invalid Huffman table (too many codes)')
+            span = 1 << (16 - length)
+            start = code << (16 - length)
+            lookup[start:start + span] = [(symbols[index], length)] * span
+            code += 1
+            index += 1
+        code <<= 1
+    return lookup
+
+
+class JpegStream:
+    """Markers, tables and the first scan of one JPEG file"""
+
+    def __init__(self, data):
+        """
+        Args:
+            data: JPEG file bytes
+
+        Raises:
+            JpegError: Not a JPEG, or truncated/malformed marker segments
+        """
+        if not is_jpeg(data):
+            raise JpegError('Missing SOI marker')
+
+        self.quant_tables = {}     # table id -> (64,) zigzag int array
+        self.huffman = {}          # (class, id) -> peek table
+        self.frame_type = None     # SOFn marker byte
+        self.width = self.height = 0
+        self.components = []       # [(id, h, v, quant table id)]
+        self.scan = None           # ([(component id, dc id, ac id)], entropy data)
+        self.restart_interval = 0
+        self.app_segments = []
+        self._parse(data)
+
+    @property
+    def sequential(self):
+        """Whether the first scan can be entropy-decoded here"""
+        return self.frame_type in SEQUENTIAL_HUFFMAN
+
+    def _parse(self, data):
+        pos = 2
+        while pos < len(data):
+            if data[pos] != 0xFF or pos + 1 >= len(data):
+                raise JpegError(f'Expected marker at offset {pos}')
+            marker = data[pos + 1]
+            pos += 2
+            if marker == 0xFF:
+                # Fill byte
+                pos -= 1
+                continue
+            if marker == 0xD9:
+                break
+            if pos + 2 > len(data):
+                raise JpegError('Truncated marker segment')
+            length = int.from_bytes(data[pos:pos + 2], 'big')
+            segment = data[pos + 2:pos + length]
+            if length < 2 or len(segment) < length - 2:
+                raise JpegError('Truncated marker segment')
+            pos += length
+
+            if marker == 0xDB:
+                self._read_dqt(segment)
+            elif marker == 0xC4:
+                self._read_dht(segment)
+            elif marker in SEQUENTIAL_HUFFMAN + OTHER_FRAMES:
+                self._read_sof(marker, segment)
+            elif marker == 0xDD:
+                self.restart_interval = int.from_bytes(segment[:2], 'big')
+            elif 0xE0 <= marker <= 0xEF:
+                for app, signature, name in APP_SIGNATURES:
+                    if marker == app and segment.startswith(signature):
+                        self.app_segments.append(name)
+            elif marker == 0xDA:
+                end = self._scan_end(data, pos)
+                if self.scan is None:
+                    count = segment[0] if segment else 0
+                    if not count or len(segment) < 1 + 2 * count:
+                        raise JpegError('Truncated scan header')
+                    selectors = [
+                        (segment[1 + 2 * i], segment[2 + 2 * i] >> 4, segment[2 + 2 * i] & 15)
+                        for i in range(count)
+                    ]
+                    self.scan = (selectors, data[pos:end])
+                pos = end
+
+    @staticmethod
+    def _scan_end(data, pos):
+        """Offset of the first marker after entropy-coded data (skips stuffing and RSTn)"""
+        while True:
+            pos = data.find(b'\xff', pos)
+            if pos < 0 or pos + 1 >= len(data):
+                return len(data)
+            following = data[pos + 1]
+            if following == 0x00 or 0xD0 <= following <= 0xD7 or following == 0xFF:
+                pos += 1 if following == 0xFF else 2
+                continue
+            return pos
+
+    def _read_dqt(self, segment):
+        pos = 0
+        while pos < len(segment):
+            precision, table_id = segment[pos] >> 4, segment[pos] & 15
+            pos += 1
+            if precision > 1:
+                raise JpegError('Invalid quantization table precision')
+            size = 128 if precision else 64
+            if pos + size > len(segment):
+                raise JpegError('Truncated quantization table')
+            values = np.frombuffer(segment[pos:pos + size], dtype='>u2' if precision else np.uint8)
+            pos += size
+            self.quant_tables[table_id] = values.astype(np.int32)
+
+    def _read_dht(self, segment):
+        pos = 0
+        while pos < len(segment):
+            table_class, table_id = segment[pos] >> 4, segment[pos] & 15
+            counts = list(segment[pos + 1:pos + 17])
+            total = sum(counts)
+            symbols = list(segment[pos + 17:pos + 17 + total])
+            if len(counts) != 16 or len(symbols) != total:
+                raise JpegError('Truncated Huffman table')
+            self.huffman[(table_class, table_id)] = _huffman_lookup(counts, symbols)
+            pos += 17 + total
+
+    def _read_sof(self, marker, segment):
+        if len(segment) < 6 or not segment[5] or len(segment) < 6 + 3 * segment[5]:
+            raise JpegError('Truncated frame header')
+        self.frame_type = marker
+        self.height = int.from_bytes(segment[1:3], 'big')
+        self.width = int.from_bytes(segment[3:5], 'big')
+        self.components = [
+            (segment[6 + 3 * i], segment[7 + 3 * i] >> 4, segment[7 + 3 * i] & 15, segment[8 + 3 * i])
+            for i in range(segment[5])
+        ]
+
+    def luma_table(self):
+        """Quantization table (zigzag order) of the first component"""
+        if not self.components:
+            raise JpegError('No frame header')
+        return self.quant_tables.get(self.components[0][3])
+
+    def sample_coefficients(self, max_blocks=MAX_SAMPLE_BLOCKS, modes=SAMPLE_MODES):
+        """
+        Quantized low-frequency AC coefficients of a sample of luma blocks
+
+        Only blocks with a non-zero low-frequency coefficient are kept, so
+        blank paper doesn't use up the sample (its blocks decode to a DC
+        code and an EOB, which is cheap). Restart intervals, when the file
+        has them, are visited in a fixed shuffled order so the sample spreads
+        over the whole image; otherwise the scan is decoded from the top.
+
+        Args:
+            max_blocks: Non-empty luma blocks to collect at most
+            modes: Coefficients kept per block (zigzag 1..modes-1; column 0 is unused)
+
+        Returns:
+            (n, modes) int16 array of quantized coefficients
+
+        Raises:
+            JpegError: The scan isn't sequential Huffman or its data is corrupt
+        """
+        if not self.sequential or self.scan is None:
+            raise JpegError('Only baseline/sequential Huffman scans can be sampled')
+
+        selectors, entropy = self.scan
+        by_id = {c[0]: c for c in self.components}
+        if any(s[0] not in by_id for s in selectors):
+            raise JpegError('Scan references an unknown component')
+        if len(selectors) == 1:
+            # Non-interleaved scan: one block per MCU
+            layout = [(selectors[0], 1)]
+        else:
+            layout = [(s, by_id[s[0]][1] * by_id[s[0]][2]) for s in selectors]
+        luma_id = self.components[0][0]
+        if all(s[0] != luma_id for s, _ in layout):
+            raise JpegError('First scan has no luma component')
+
+        tables = []
+        for (component_id, dc_id, ac_id), blocks in layout:
+            dc = self.huffman.get((0, dc_id))
+            ac = self.huffman.get((1, ac_id))
+            if dc is None or ac is None:
+                raise JpegError('Missing Huffman table')
+            tables.append((dc, ac, blocks, component_id == luma_id))
+
+        segments = _RESTART.split(entropy) if self.restart_interval else [entropy]
+        order = np.random.default_rng(0).permutation(len(segments))
+
+        out = np.zeros((max_blocks, modes), dtype=np.int16)
+        count = 0
+        for index in order:
+            count = _decode_segment(segments[index], tables, out, count, modes)
+            if count >= max_blocks:
+                break
+        return out[:count]
+
+
+def _decode_segment(segment, tables, out, count, modes):
+    """
+    Entropy-decode one restart interval (or a whole scan without restarts)
+
+    Writes the AC coefficients of non-empty luma blocks into out[count:] and
+    returns the new count. Decoding stops at the end of the data or when
+    `out` is full.
+    """
+    buf = segment.replace(b'\xff\x00', b'\xff') + b'\x00\x00\x00\x00'
+    limit = (len(buf) - 4) * 8
+    from_bytes = int.from_bytes
+    capacity = len(out)
+    bit = 0
+
+    while True:
+        for dc, ac, blocks, is_luma in tables:
+            for _ in range(blocks):
+                # The last byte may hold only padding bits
+                if bit > limit - 8 or (is_luma and count >= capacity):
+                    return count
+                # DC: category then magnitude bits (value itself is not needed)
+                byte = bit >> 3
+                peek = (from_bytes(buf[byte:byte + 3], 'big') >> (8 - (bit & 7))) & 0xFFFF
+                size, length = dc[peek]
+                if not length:
+                    raise JpegError('Invalid Huffman code in scan')
+                bit += length + size
+
+                row = out[count] if is_luma else None
+                active = False
+                k = 1
+                while k < 64:
+                    byte = bit >> 3
+                    peek = (from_bytes(buf[byte:byte + 3], 'big') >> (8 - (bit & 7))) & 0xFFFF
+                    symbol, length = ac[peek]
+                    if not length:
+                        raise JpegError('Invalid Huffman code in scan')
+                    bit += length
+                    run, size = symbol >> 4, symbol & 15
+                    if not size:
+                        if run != 15:
+                            break           # EOB
+                        k += 16             # ZRL
+                        continue
+                    k += run
+                    if row is not None and k < modes:
+                        byte = bit >> 3
+                        value = (from_bytes(buf[byte:byte + 3], 'big') >> (24 - (bit & 7) - size)) & ((1 << size) - 1)
+                        if value < (1 << (size - 1)):
+                            value -= (1 << size) - 1
+                        row[k] = value
+                        active = True
+                    bit += size
+                    k += 1
+                if active:
+                    count += 1
+
+
+# Histogram magnitudes examined per coefficient mode
+HISTOGRAM_BINS = 40
+# Non-zero samples a mode needs before its histogram is examined
+MIN_MODE_SAMPLES = 200
+# Largest primary quantization step considered per mode
+MAX_PRIMARY_STEP = 64
+# Spread (in units of the DCT coefficient) of the rounding and clipping
+# error a decode/re-encode adds before the second quantization
+ROUNDING_NOISE = 0.75
+
+_erf = np.vectorize(math.erf)
+
+
+def _histogram(values, bins=HISTOGRAM_BINS):
+    """
+    Histogram of |coefficient| over bins 1..reach
+
+    Returns:
+        float array, or None when the mode has too few non-zero samples or
+        the distribution doesn't reach enough bins to show a pattern
+    """
+    magnitudes = np.abs(values[values != 0]).astype(np.int64)
+    if len(magnitudes) < MIN_MODE_SAMPLES:
+        return None
+    histogram = np.bincount(np.minimum(magnitudes, bins + 1), minlength=bins + 2)[1:bins + 1].astype(float)
+    # Only bins the distribution actually reaches carry information
+    filled = np.nonzero(histogram >= 5)[0]
+    if not len(filled) or filled[-1] + 1 < 6:
+        return None
+    return histogram[:filled[-1] + 1]
+
+
+@functools.lru_cache(maxsize=4096)
+def _multiplicity(primary, secondary, reach):
+    """
+    Relative number of primary quantization levels feeding each bin
+
+    A coefficient quantized with step `primary`, decoded and quantized again
+    with step `secondary` can only take the values round(m * primary /
+    secondary), blurred by the rounding noise of the decode. Bins several
+    levels fall into are over-filled and bins none falls into are empty:
+    peaks and gaps when the quality went up, a periodically uneven staircase
+    when it went down.
+
+    Returns:
+        (reach,) float array for bins 1..reach (not to be modified)
+    """
+    levels = np.arange(int((reach + 2) * secondary / primary) + 3)
+    centers = levels * primary / secondary
+    edges = np.arange(0.5, reach + 1.5)
+    below = 0.5 * (1 + _erf((edges[None, :] - centers[:, None]) * secondary / (ROUNDING_NOISE * math.sqrt(2))))
+    # Level 0 spills into bin 1 from both signs, other levels only from theirs
+    weights = np.where(levels == 0, 0.5, 1.0)
+    counts = (weights[:, None] * np.diff(below, axis=1)).sum(axis=0)
+    return counts / counts.mean() + 1e-3
+
+
+def _isotonic_deviance(histogram, multiplicity):
+    """
+    Poisson deviance of the best fit multiplicity * g with g non-increasing
+
+    Natural |coefficient| distributions decay with magnitude; the fitted
+    envelope g is free apart from that (pool-adjacent-violators fit), so
+    only the bin-to-bin pattern a quantization history leaves is tested.
+    """
+    blocks = []  # [histogram sum, multiplicity sum, bins]
+    for observed, expected in zip(histogram, multiplicity):
+        blocks.append([observed, expected, 1])
+        while len(blocks) > 1 and blocks[-2][0] * blocks[-1][1] < blocks[-1][0] * blocks[-2][1]:
+            observed, expected, bins = blocks.pop()
+            blocks[-1][0] += observed
+            blocks[-1][1] += expected
+            blocks[-1][2] += bins
+    envelope = np.concatenate([[total / weight] * bins for total, weight, bins in blocks])
+    mean = multiplicity * envelope
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(histogram > 0, histogram * np.log(histogram / mean), 0.0)
+    return float(2 * np.sum(terms - (histogram - mean)))
+
+
+def double_quantization(coefficients, table):
+    """
+    Test quantized coefficients for an earlier compression at another quality
+
+    For every usable mode the histogram is fitted assuming each candidate
+    primary step (Fridrich/Lukas-style peak and gap models, in both
+    directions), and the candidates are tied together by requiring the
+    primary steps to form one IJG table. The score is how much the best
+    primary table improves the fit over a single compression, relative to
+    the single-compression misfit plus the number of bins examined.
+
+    Args:
+        coefficients: (n, modes) array from JpegStream.sample_coefficients
+        table: Luma quantization table (zigzag order) of the file
+
+    Returns:
+        tuple: (score >= 0 or None, estimated primary quality 1-100 or None,
+                modes examined)
+    """
+    modes = []
+    for k in range(1, min(coefficients.shape[1], len(table))):
+        histogram = _histogram(coefficients[:, k])
+        if histogram is None:
+            continue
+        step = int(table[k])
+        reach = len(histogram)
+        deviances = [
+            _isotonic_deviance(histogram, _multiplicity(primary, step, reach))
+            for primary in range(1, MAX_PRIMARY_STEP + 1)
+        ]
+        single = _isotonic_deviance(histogram, _multiplicity(step, step, reach))
+        modes.append((k, single, deviances, reach))
+    if not modes:
+        return None, None, 0
+
+    single = sum(deviance for _, deviance, _, _ in modes)
+    bins = sum(reach for _, _, _, reach in modes)
+    fits = [
+        sum(deviances[min(int(standard_table(quality)[k]), MAX_PRIMARY_STEP) - 1] for k, _, deviances, _ in modes)
+        for quality in range(1, 101)
+    ]
+    best = int(np.argmin(fits))
+    return max(single - fits[best], 0.0) / (single + bins), best + 1, len(modes)
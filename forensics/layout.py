@@ -0,0 +1,140 @@
+"""
+Columnar text layout for forensic checks
+Stores a page's chars, words and image placements as NumPy arrays (float32 boxes, categorical
+font codes) instead of one pdfplumber dict per glyph, so histograms and
+bounding-box queries are array operations
+"""
+
+import numpy as np
+
+# Box columns
+X0, TOP, X1, BOTTOM = range(4)
+
+
+class FontCatalog:
+    """
+    Document-wide mapping between font names and integer codes
+
+    Codes are assigned in order of first appearance and shared by every page
+    of a document, so per-page font codes can be compared and summed.
+    """
+
+    def __init__(self):
+        self.names = []
+        self._codes = {}
+
+    def code(self, name):
+        """Integer code for a font name, assigning a new one if unseen"""
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self.names)
+            self._codes[name] = code
+            self.names.append(name)
+        return code
+
+    def lookup(self, name):
+        """Code of a known font name, or -1"""
+        return self._codes.get(name, -1)
+
+    def __len__(self):
+        return len(self.names)
+
+
+def _boxes(objects):
+    """(n, 4) float32 array of x0, top, x1, bottom"""
+    if not objects:
+        return np.empty((0, 4), dtype=np.float32)
+    return np.array(
+        [(o['x0'], o['top'], o['x1'], o['bottom']) for o in objects],
+        dtype=np.float32
+    )
+
+
+class CharTable:
+    """Boxes and font codes of every char on one page"""
+
+    __slots__ = ('boxes', 'font_codes')
+
+    def __init__(self, chars, catalog):
+        """
+        Args:
+            chars: pdfplumber char dicts
+            catalog: FontCatalog of the document
+        """
+        self.boxes = _boxes(chars)
+        self.font_codes = np.array(
+            [catalog.code(c.get('fontname', 'Unknown')) for c in chars],
+            dtype=np.int32
+        )
+
+    def __len__(self):
+        return len(self.font_codes)
+
+    def font_histogram(self, font_count):
+        """Char count per font code (length font_count)"""
+        return np.bincount(self.font_codes, minlength=font_count)
+
+    def within(self, bbox):
+        """Boolean mask of chars lying entirely inside bbox (x0, top, x1, bottom)"""
+        return _within(self.boxes, bbox)
+
+
+class WordTable:
+    """Boxes and text of every word on one page"""
+
+    __slots__ = ('boxes', 'text')
+
+    def __init__(self, words):
+        """
+        Args:
+            words: pdfplumber word dicts from page.extract_words()
+        """
+        self.boxes = _boxes(words)
+        self.text = [w['text'] for w in words]
+
+    def __len__(self):
+        return len(self.text)
+
+    def within(self, bbox):
+        """Boolean mask of words lying entirely inside bbox (x0, top, x1, bottom)"""
+        return _within(self.boxes, bbox)
+
+    def centered_in(self, bbox):
+        """Boolean mask of words whose center lies inside bbox (x0, top, x1, bottom)"""
+        x0, top, x1, bottom = bbox
+        center_x = (self.boxes[:, X0] + self.boxes[:, X1]) / 2
+        center_y = (self.boxes[:, TOP] + self.boxes[:, BOTTOM]) / 2
+        return (center_x >= x0) & (center_x <= x1) & (center_y >= top) & (center_y <= bottom)
+
+
+class ImageTable:
+    """Placement boxes, native pixel sizes and streams of the images drawn on one page"""
+
+    __slots__ = ('boxes', 'src_sizes', 'sources')
+
+    def __init__(self, images):
+        """
+        Args:
+            images: pdfplumber image dicts (page.images)
+        """
+        self.boxes = _boxes(images)
+        self.src_sizes = np.array(
+            [img.get('srcsize') or (0, 0) for img in images],
+            dtype=np.int32
+        ).reshape(-1, 2)
+        # (pdfminer stream, bits per component, colorspace) for direct decoding
+        self.sources = [
+            (img.get('stream'), img.get('bits'), img.get('colorspace'))
+            for img in images
+        ]
+
+    def __len__(self):
+        return len(self.boxes)
+
+
+def _within(boxes, bbox):
+    x0, top, x1, bottom = bbox
+    return (
+        (boxes[:, X0] >= x0) & (boxes[:, TOP] >= top)
+        & (boxes[:, X1] <= x1) & (boxes[:, BOTTOM] <= bottom)
+    )
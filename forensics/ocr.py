@@ -0,0 +1,395 @@
+"""
+OCR service for forensic checks
+Keeps tesseract warm between calls and recognizes regions in batches, so
+OCR-based checks don't pay a process start and a traineddata load per crop
+"""
+
+import collections
+import csv
+import io
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .ocr_cache import OcrCache, region_key
+
+# Preferred backend: tesserocr binds libtesseract directly, so an API
+# instance keeps its traineddata loaded for the life of the process
+TESSEROCR_AVAILABLE = False
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+    print("[INFO] tesserocr is available - using in-process OCR workers")
+except ImportError:
+    pass
+
+# Fallback backend: the tesseract binary, one process per batch
+TESSERACT_AVAILABLE = False
+TESSERACT_CMD = 'tesseract'
+try:
+    import pytesseract
+    TESSERACT_CMD = pytesseract.pytesseract.tesseract_cmd
+    # Only check version if tesseract binary is actually available
+    try:
+        pytesseract.get_tesseract_version()
+        TESSERACT_AVAILABLE = True
+        print("[INFO] Tesseract OCR is available")
+    except Exception as e:
+        print(f"[WARNING] Tesseract binary not found: {e}")
+        TESSERACT_AVAILABLE = False
+except ImportError:
+    print("[WARNING] pytesseract package not available")
+    TESSERACT_AVAILABLE = False
+
+OCR_AVAILABLE = TESSEROCR_AVAILABLE or TESSERACT_AVAILABLE
+
+# Most images per task in recognize_iter() with the CLI backend, which starts
+# one tesseract process per task: images are spread over every worker first
+# and only batched once there are more than workers (warm tesserocr workers
+# take one image a task)
+ITER_BATCH_SIZE = 4
+
+
+def _result(words):
+    """
+    Build an OCR result from (line key, text, confidence) word tuples
+
+    Returns:
+        dict with 'text' (words joined per line) and 'confidence' (mean word
+        confidence 0-100, or None when nothing was recognized)
+    """
+    lines = {}
+    confidences = []
+    for line_key, text, confidence in words:
+        lines.setdefault(line_key, []).append(text)
+        if confidence >= 0:
+            confidences.append(confidence)
+
+    return {
+        'text': '\n'.join(' '.join(line) for line in lines.values()),
+        'confidence': round(sum(confidences) / len(confidences), 1) if confidences else None
+    }
+
+
+class TesserocrBackend:
+    """
+    Pool of warm tesserocr API instances
+
+    Instances are created on demand up to `size` and reused; each one loads
+    the language data once.
+    """
+
+    def __init__(self, size, lang='eng'):
+        self.size = size
+        self.lang = lang
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return tesserocr.PyTessBaseAPI(lang=self.lang)
+        return self._idle.get()
+
+    def recognize(self, image, psm):
+        """OCR one image with a pooled API instance"""
+        api = self._acquire()
+        try:
+            api.SetPageSegMode(psm)
+            api.SetImage(image)
+            text = api.GetUTF8Text()
+            confidences = api.AllWordConfidences()
+        finally:
+            self._idle.put(api)
+
+        return {
+            'text': text,
+            'confidence': round(sum(confidences) / len(confidences), 1) if confidences else None
+        }
+
+    def recognize_batch(self, images, psm):
+        return [self.recognize(image, psm) for image in images]
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().End()
+            except queue.Empty:
+                break
+
+
+class TesseractCliBackend:
+    """
+    Runs the tesseract binary once per batch
+
+    The images of a batch are written to a temp directory and passed as a
+    list file, so tesseract starts and loads its data once for all of them.
+    TSV output gives per-word confidences; its page_num column maps words
+    back to the image they came from.
+    """
+
+    def __init__(self, cmd=TESSERACT_CMD, lang='eng'):
+        self.cmd = cmd
+        self.lang = lang
+
+    def recognize_batch(self, images, psm):
+        if not images:
+            return []
+
+        with tempfile.TemporaryDirectory(prefix='forensic_ocr_') as tmp:
+            paths = []
+            for index, image in enumerate(images):
+                path = os.path.join(tmp, f'{index}.png')
+                image.save(path)
+                paths.append(path)
+
+            list_path = os.path.join(tmp, 'images.txt')
+            with open(list_path, 'w') as f:
+                f.write('\n'.join(paths) + '\n')
+
+            completed = subprocess.run(
+                [self.cmd, list_path, 'stdout', '-l', self.lang, '--psm', str(psm), 'tsv'],
+                capture_output=True,
+                check=True
+            )
+
+        words = [[] for _ in images]
+        reader = csv.DictReader(
+            io.StringIO(completed.stdout.decode('utf-8', errors='replace')),
+            delimiter='\t',
+            quoting=csv.QUOTE_NONE
+        )
+        for row in reader:
+            # Level 5 rows are words; page_num is 1-based per input image
+            if row.get('level') != '5' or not (row.get('text') or '').strip():
+                continue
+            page = int(row['page_num']) - 1
+            if 0 <= page < len(words):
+                line_key = (row['block_num'], row['par_num'], row['line_num'])
+                words[page].append((line_key, row['text'], float(row['conf'])))
+
+        return [_result(page_words) for page_words in words]
+
+    def close(self):
+        pass
+
+
+class OcrService:
+    """
+    Batched OCR with long-lived workers
+
+    A batch is split across up to `workers` threads (one per core by
+    default). With tesserocr each thread borrows a warm API instance; with
+    the CLI backend each thread runs one tesseract process for its share of
+    the batch. Results come back in input order. With an OcrCache, regions
+    already recognized under the same config are answered from the cache.
+    """
+
+    def __init__(self, workers=None, cache=None):
+        """
+        Args:
+            workers: Parallel OCR workers (default: CPU count)
+            cache: Optional OcrCache; cached regions skip OCR entirely
+        """
+        if not OCR_AVAILABLE:
+            raise RuntimeError('Tesseract OCR not installed')
+
+        self.workers = workers or os.cpu_count() or 1
+        self.cache = cache
+        if TESSEROCR_AVAILABLE:
+            self.backend = TesserocrBackend(self.workers)
+        else:
+            self.backend = TesseractCliBackend()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix='forensic-ocr'
+        )
+
+    def _config(self, psm):
+        """Tesseract config string the results of a batch depend on"""
+        return f'--psm {psm} -l {self.backend.lang}'
+
+    def _recognize_and_store(self, images, keys, psm):
+        """OCR a batch and cache each result under its key (if caching)"""
+        results = self.backend.recognize_batch(images, psm)
+        if self.cache is not None:
+            self.cache.put_many(list(zip(keys, results)))
+        return results
+
+    def recognize(self, images, psm=6):
+        """
+        OCR a batch of region images
+
+        Args:
+            images: PIL images (crops) to recognize
+            psm: Tesseract page segmentation mode for the whole batch
+
+        Returns:
+            list of dicts with 'text' and 'confidence', one per image
+        """
+        images = list(images)
+        if not images:
+            return []
+
+        # Regions seen before cost a hash and a lookup instead of OCR
+        results = [None] * len(images)
+        keys = None
+        if self.cache is not None:
+            config = self._config(psm)
+            keys = [region_key(image, config) for image in images]
+            results = self.cache.get_many(keys)
+        missing = [index for index, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        if keys is not None:
+            # Identical regions within the batch are recognized once
+            first = {}
+            for index in missing:
+                first.setdefault(keys[index], index)
+            duplicates = [index for index in missing if first[keys[index]] != index]
+            missing = list(first.values())
+
+        chunk_count = min(self.workers, len(missing))
+        chunk_size = -(-len(missing) // chunk_count)
+        chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+
+        position = 0
+        for chunk_results in self._executor.map(
+            lambda chunk: self.backend.recognize_batch([images[i] for i in chunk], psm), chunks
+        ):
+            for result in chunk_results:
+                results[missing[position]] = result
+                position += 1
+
+        if keys is not None:
+            self.cache.put_many([(keys[index], results[index]) for index in missing])
+            for index in duplicates:
+                results[index] = dict(results[first[keys[index]]])
+        return results
+
+    def _iter_batch_size(self, count):
+        """Images per recognize_iter() task for `count` images (None = unknown)"""
+        if isinstance(self.backend, TesserocrBackend) or not count:
+            return 1
+        return max(1, min(ITER_BATCH_SIZE, -(-count // self.workers)))
+
+    def recognize_iter(self, images, psm=6, batch_size=None, count=None):
+        """
+        OCR images in small tasks, yielding results in input order
+
+        `images` may be a generator (e.g. regions rendered on demand): images
+        are submitted as soon as a task's worth is produced, so producing the
+        next ones overlaps OCR of the previous ones. Closing the iterator
+        early cancels the tasks that haven't started, so a caller that stops
+        consuming stops OCR between tasks.
+
+        Args:
+            images: Iterable of PIL images
+            psm: Tesseract page segmentation mode
+            batch_size: Images per task (default: 1 with tesserocr; with the
+                        CLI backend count / workers, at most ITER_BATCH_SIZE)
+            count: Number of images, when `images` is a generator
+
+        Yields:
+            dicts with 'text' and 'confidence', one per image
+        """
+        if batch_size is None:
+            if count is None and hasattr(images, '__len__'):
+                count = len(images)
+            batch_size = self._iter_batch_size(count)
+        config = self._config(psm) if self.cache is not None else None
+
+        # One entry per image: (future of a result list, position in it)
+        pending = collections.deque()
+        batch_images, batch_keys, batch_entries = [], [], []
+
+        def submit_batch():
+            future = self._executor.submit(
+                self._recognize_and_store, list(batch_images), list(batch_keys), psm
+            )
+            for entry in batch_entries:
+                entry[0] = future
+            batch_images.clear()
+            batch_keys.clear()
+            batch_entries.clear()
+
+        try:
+            for image in images:
+                key = region_key(image, config) if config is not None else None
+                cached = self.cache.get(key) if key is not None else None
+                if cached is not None:
+                    future = Future()
+                    future.set_result([cached])
+                    pending.append([future, 0])
+                else:
+                    entry = [None, len(batch_images)]
+                    batch_images.append(image)
+                    batch_keys.append(key)
+                    batch_entries.append(entry)
+                    pending.append(entry)
+                    if len(batch_images) >= batch_size:
+                        submit_batch()
+                while pending and pending[0][0] is not None and pending[0][0].done():
+                    future, position = pending.popleft()
+                    yield future.result()[position]
+            if batch_images:
+                submit_batch()
+            while pending:
+                future, position = pending.popleft()
+                yield future.result()[position]
+        finally:
+            for future, _ in pending:
+                if future is not None:
+                    future.cancel()
+
+    def recognize_one(self, image, psm=6):
+        """OCR a single region image"""
+        return self.recognize([image], psm)[0]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.backend.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+_service = None
+_service_lock = threading.Lock()
+_cache = None
+
+
+def configure_ocr_cache(db_path, memory_items=512, max_entries=50000):
+    """
+    Enable the persistent OCR cache for this process
+
+    Meant as a worker-process initializer; the process-wide OcrService
+    uses the cache whether it already exists or is created later.
+    """
+    global _cache
+    with _service_lock:
+        _cache = OcrCache(db_path, memory_items=memory_items, max_entries=max_entries)
+        if _service is not None:
+            _service.cache = _cache
+
+
+def get_ocr_service():
+    """
+    Process-wide OcrService, created on first use
+
+    Raises:
+        RuntimeError: No tesseract backend is installed
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = OcrService(cache=_cache)
+        return _service
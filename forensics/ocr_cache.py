@@ -0,0 +1,238 @@
+"""
+Persistent cache of OCR results
+Keyed by a hash of the region pixels handed to tesseract plus its config
+string, so regions that repeat across uploads (page-number corners and
+headers of the same templates, resubmitted files) are recognized once.
+An in-memory LRU tier sits in front of a SQLite tier shared by every
+worker process
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds between writes of the hit/miss counters to the shared stats table
+STATS_FLUSH_SECONDS = 5.0
+
+
+def region_key(image, config):
+    """
+    Cache key of one OCR input
+
+    Args:
+        image: PIL image exactly as passed to tesseract
+        config: Tesseract config string, e.g. '--psm 6 -l eng'
+    """
+    digest = hashlib.blake2b(image.tobytes(), digest_size=16)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:{config}".encode())
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """
+    Two-tier LRU cache of OCR results
+
+    The memory tier holds the most recently used entries of this process.
+    The disk tier is a SQLite table bounded by entry count; beyond
+    max_entries the least recently accessed rows are evicted. Hit and miss
+    counts are accumulated per process and added to a shared stats table
+    every STATS_FLUSH_SECONDS, so stats() reports all workers together.
+    """
+
+    def __init__(self, db_path='forensic_ocr_cache.db', memory_items=512, max_entries=50000):
+        """
+        Args:
+            db_path: SQLite file for the disk tier
+            memory_items: Entries kept in the memory tier
+            max_entries: Entries allowed on disk
+        """
+        self.db_path = db_path
+        self.memory_items = memory_items
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._touched = set()     # memory-tier hits whose last_access is stale on disk
+        self._last_flush = time.monotonic()
+        self._create_tables()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _create_tables(self):
+        """Create the cache and stats tables if they don't exist"""
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                cache_key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ocr_cache_last_access
+            ON ocr_cache(last_access)
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _remember(self, key, result):
+        """Put a result in the memory tier, evicting the LRU entry if full"""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        Cached results for keys
+
+        Returns:
+            list: result dict (a copy) or None per key, in order
+        """
+        results = [None] * len(keys)
+        missing = []
+        with self._lock:
+            for position, key in enumerate(keys):
+                result = self._memory.get(key)
+                if result is None:
+                    missing.append(position)
+                    continue
+                self._memory.move_to_end(key)
+                self._touched.add(key)
+                self._pending['memory_hits'] += 1
+                results[position] = dict(result)
+
+        if missing:
+            wanted = list({keys[position] for position in missing})
+            conn = self._connect()
+            try:
+                placeholders = ','.join('?' * len(wanted))
+                rows = dict(conn.execute(
+                    f'SELECT cache_key, result FROM ocr_cache WHERE cache_key IN ({placeholders})',
+                    wanted
+                ).fetchall())
+                if rows:
+                    conn.execute(
+                        f'UPDATE ocr_cache SET last_access = ? WHERE cache_key IN ({",".join("?" * len(rows))})',
+                        [time.time(), *rows]
+                    )
+                    conn.commit()
+            finally:
+                conn.close()
+
+            with self._lock:
+                for position in missing:
+                    payload = rows.get(keys[position])
+                    if payload is None:
+                        self._pending['misses'] += 1
+                        continue
+                    result = json.loads(payload)
+                    self._remember(keys[position], result)
+                    self._pending['disk_hits'] += 1
+                    results[position] = dict(result)
+
+        self._flush_stats()
+        return results
+
+    def get(self, key):
+        """Cached result for key, or None"""
+        return self.get_many([key])[0]
+
+    def put_many(self, items):
+        """Store (key, result) pairs in both tiers"""
+        if not items:
+            return
+        with self._lock:
+            for key, result in items:
+                self._remember(key, dict(result))
+
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.executemany('''
+                INSERT OR REPLACE INTO ocr_cache (cache_key, result, last_access)
+                VALUES (?, ?, ?)
+            ''', [(key, json.dumps(result), now) for key, result in items])
+            self._evict(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def put(self, key, result):
+        """Store one result in both tiers"""
+        self.put_many([(key, result)])
+
+    def _evict(self, conn):
+        """Drop least recently accessed disk entries beyond max_entries"""
+        count = conn.execute('SELECT COUNT(*) FROM ocr_cache').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        conn.execute('''
+            DELETE FROM ocr_cache WHERE cache_key IN (
+                SELECT cache_key FROM ocr_cache ORDER BY last_access ASC LIMIT ?
+            )
+        ''', (count - self.max_entries,))
+
+    def _flush_stats(self, force=False):
+        """Add this process's counters to the shared stats table (rate-limited)"""
+        with self._lock:
+            if not force and time.monotonic() - self._last_flush < STATS_FLUSH_SECONDS:
+                return
+            pending, self._pending = self._pending, dict.fromkeys(self._pending, 0)
+            touched, self._touched = self._touched, set()
+            self._last_flush = time.monotonic()
+
+        conn = self._connect()
+        try:
+            for name, value in pending.items():
+                if value:
+                    conn.execute('''
+                        INSERT INTO ocr_cache_stats (name, value) VALUES (?, ?)
+                        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+                    ''', (name, value))
+            # Memory-tier hits keep their disk rows from being evicted as cold
+            if touched:
+                conn.executemany(
+                    'UPDATE ocr_cache SET last_access = ? WHERE cache_key = ?',
+                    [(time.time(), key) for key in touched]
+                )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def stats(self):
+        """Hit/miss counters of all processes sharing the cache, and disk usage"""
+        self._flush_stats(force=True)
+        conn = self._connect()
+        try:
+            entries = conn.execute('SELECT COUNT(*) FROM ocr_cache').fetchone()[0]
+            counters = dict(conn.execute('SELECT name, value FROM ocr_cache_stats').fetchall())
+        finally:
+            conn.close()
+
+        memory_hits = counters.get('memory_hits', 0)
+        disk_hits = counters.get('disk_hits', 0)
+        misses = counters.get('misses', 0)
+        lookups = memory_hits + disk_hits + misses
+        return {
+            'disk_entries': entries,
+            'max_entries': self.max_entries,
+            'memory_hits': memory_hits,
+            'disk_hits': disk_hits,
+            'misses': misses,
+            'hit_rate': (memory_hits + disk_hits) / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        """Write out this process's pending counters"""
+        self._flush_stats(force=True)
@@ -0,0 +1,153 @@
+"""
+Raster overlay rendering for forensic visualizations
+Highlight boxes are painted straight into NumPy page arrays: every box of a
+layer is accumulated in one difference array and blended in a single
+vectorized pass, and the finished panel grid is encoded once with OpenCV
+"""
+
+import cv2
+import numpy as np
+
+# Colors are RGB
+RED = (255, 0, 0)
+GREEN = (0, 128, 0)
+ORANGE = (255, 165, 0)
+BLUE = (0, 0, 255)
+YELLOW = (255, 255, 0)
+
+# Panel grid geometry in pixels
+TITLE_HEIGHT = 36
+GUTTER = 12
+
+# Encoder name and OpenCV parameters per output format
+ENCODERS = {
+    'png': ('.png', [cv2.IMWRITE_PNG_COMPRESSION, 3]),
+    'webp': ('.webp', [cv2.IMWRITE_WEBP_QUALITY, 85]),
+}
+
+
+def box_mask(shape, boxes):
+    """
+    Union of axis-aligned boxes as a boolean mask
+
+    Each box adds +1/-1 at its four corners of a difference array; two
+    cumulative sums turn that into per-pixel coverage counts, so the cost
+    is one pass over the covered window however many boxes there are.
+
+    Args:
+        shape: (height, width) of the target
+        boxes: (n, 4) pixel boxes x0, y0, x1, y1 (x1/y1 exclusive)
+
+    Returns:
+        tuple: (mask, (y0, x0)) mask of the window spanned by the boxes and
+               its offset in the target, or (None, None) if nothing is covered
+    """
+    height, width = shape
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+    boxes = boxes[(boxes[:, 2] > boxes[:, 0]) & (boxes[:, 3] > boxes[:, 1])]
+    if not len(boxes):
+        return None, None
+
+    # Work only inside the window the boxes span
+    left, top = boxes[:, 0].min(), boxes[:, 1].min()
+    right, bottom = boxes[:, 2].max(), boxes[:, 3].max()
+    x0, y0, x1, y1 = (boxes - [left, top, left, top]).T
+
+    diff = np.zeros((bottom - top + 1, right - left + 1), dtype=np.int32)
+    np.add.at(diff, (y0, x0), 1)
+    np.add.at(diff, (y0, x1), -1)
+    np.add.at(diff, (y1, x0), -1)
+    np.add.at(diff, (y1, x1), 1)
+    coverage = diff.cumsum(axis=0).cumsum(axis=1)
+    return coverage[:-1, :-1] > 0, (top, left)
+
+
+def edge_boxes(boxes, thickness):
+    """The four edges of each box as thin boxes of the given thickness"""
+    x0, y0, x1, y1 = np.asarray(boxes, dtype=np.int64).reshape(-1, 4).T
+    x0_in = np.minimum(x0 + thickness, x1)
+    y0_in = np.minimum(y0 + thickness, y1)
+    x1_in = np.maximum(x1 - thickness, x0)
+    y1_in = np.maximum(y1 - thickness, y0)
+    return np.concatenate([
+        np.stack([x0, y0, x1, y0_in], axis=1),   # top
+        np.stack([x0, y1_in, x1, y1], axis=1),   # bottom
+        np.stack([x0, y0, x0_in, y1], axis=1),   # left
+        np.stack([x1_in, y0, x1, y1], axis=1),   # right
+    ])
+
+
+def blend(canvas, boxes, color, alpha):
+    """Blend color into canvas (H, W, 3 uint8, in place) wherever boxes cover it"""
+    mask, offset = box_mask(canvas.shape[:2], boxes)
+    if mask is None:
+        return
+    top, left = offset
+    window = canvas[top:top + mask.shape[0], left:left + mask.shape[1]]
+    covered = window[mask].astype(np.float32)
+    covered += (np.asarray(color, dtype=np.float32) - covered) * alpha
+    window[mask] = covered.round().astype(np.uint8)
+
+
+def draw_boxes(canvas, boxes, scale, face, edge, alpha, edge_width=1):
+    """
+    Paint highlight boxes given in PDF points onto a page array
+
+    Args:
+        canvas: (H, W, 3) uint8 RGB page, modified in place
+        boxes: (n, 4) boxes x0, top, x1, bottom in PDF points
+        scale: Pixels per point
+        face: Fill color
+        edge: Outline color
+        alpha: Opacity of fill and outline
+        edge_width: Outline thickness in pixels
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if not len(boxes):
+        return
+    pixels = np.empty(boxes.shape, dtype=np.int64)
+    pixels[:, :2] = np.floor(boxes[:, :2] * scale)
+    # Keep boxes narrower than a pixel visible
+    pixels[:, 2:] = np.maximum(np.ceil(boxes[:, 2:] * scale), pixels[:, :2] + 1)
+    blend(canvas, pixels, face, alpha)
+    blend(canvas, edge_boxes(pixels, edge_width), edge, alpha)
+
+
+def compose_panels(page, titles):
+    """
+    Grid of titled copies of a page image, two panels per row
+
+    Args:
+        page: (H, W, 3) uint8 RGB page
+        titles: Panel titles, in reading order
+
+    Returns:
+        tuple: (grid array, list of per-panel page views to draw into)
+    """
+    height, width = page.shape[:2]
+    rows = (len(titles) + 1) // 2
+    cell_width = width + GUTTER
+    cell_height = height + TITLE_HEIGHT + GUTTER
+    grid = np.full((rows * cell_height + GUTTER, 2 * cell_width + GUTTER, 3), 255, dtype=np.uint8)
+
+    panels = []
+    for index, title in enumerate(titles):
+        left = GUTTER + (index % 2) * cell_width
+        top = GUTTER + (index // 2) * cell_height
+        cv2.putText(grid, title, (left, top + TITLE_HEIGHT - 12), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.7, (0, 0, 0), 2, cv2.LINE_AA)
+        panel = grid[top + TITLE_HEIGHT:top + TITLE_HEIGHT + height, left:left + width]
+        panel[:] = page
+        panels.append(panel)
+    return grid, panels
+
+
+def encode_image(image, image_format='png'):
+    """Encode an RGB array as PNG or WebP bytes"""
+    extension, params = ENCODERS[image_format]
+    ok, encoded = cv2.imencode(extension, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), params)
+    if not ok:
+        raise ValueError(f"Could not encode {image_format} image")
+    return encoded.tobytes()
@@ -0,0 +1,108 @@
+"""
+Per-page scanned vs digital classification
+A cheap prepass over the cached layout tables (no rendering) that tells the
+analyzer which checks can produce signal for a document
+"""
+
+import numpy as np
+
+from .layout import X0, TOP, X1, BOTTOM
+
+# Page types
+DIGITAL = 'digital'     # Born-digital text layer
+SCANNED = 'scanned'     # Page image without a text layer
+HYBRID = 'hybrid'       # Page image under an OCR text layer
+BLANK = 'blank'         # Neither text nor images (vector art or empty)
+
+# Pages with fewer extracted chars are treated as having no text layer
+MIN_TEXT_LAYER_CHARS = 20
+# Share of the page an image must cover for the page to count as a scan
+SCAN_IMAGE_COVERAGE = 0.5
+# Cells per side of the grid used to measure image coverage
+COVERAGE_GRID = 64
+
+
+def has_text_layer(document, page_index):
+    """Whether a page has enough extractable text to skip OCR"""
+    return len(document.char_table(page_index)) >= MIN_TEXT_LAYER_CHARS
+
+
+def _image_coverage(boxes, width, height):
+    """Share of the page covered by the union of image boxes, on a coarse grid"""
+    if not len(boxes) or width <= 0 or height <= 0:
+        return 0.0
+
+    grid = np.zeros((COVERAGE_GRID, COVERAGE_GRID), dtype=bool)
+    cols = np.clip(boxes[:, [X0, X1]] / width * COVERAGE_GRID, 0, COVERAGE_GRID)
+    rows = np.clip(boxes[:, [TOP, BOTTOM]] / height * COVERAGE_GRID, 0, COVERAGE_GRID)
+    for (left, right), (top, bottom) in zip(cols, rows):
+        grid[int(top):int(np.ceil(bottom)), int(left):int(np.ceil(right))] = True
+    return float(grid.mean())
+
+
+def classify_page(document, page_index):
+    """
+    Classify one page from its text layer, embedded images and fonts
+
+    Args:
+        document: DocumentContext
+        page_index: 0-indexed page
+
+    Returns:
+        dict with page (1-indexed), type, char_count, font_count,
+        text_coverage and image_coverage (0-1)
+    """
+    page = document.pages[page_index]
+    width, height = float(page.width), float(page.height)
+    chars = document.char_table(page_index)
+    images = document.image_table(page_index)
+
+    # Glyph boxes barely overlap, so their summed area is a good estimate
+    char_area = float(np.sum(
+        (chars.boxes[:, X1] - chars.boxes[:, X0]) * (chars.boxes[:, BOTTOM] - chars.boxes[:, TOP])
+    ))
+    text_coverage = min(1.0, char_area / (width * height)) if width and height else 0.0
+    image_coverage = _image_coverage(images.boxes, width, height)
+    font_count = len(np.unique(chars.font_codes))
+
+    if len(chars) < MIN_TEXT_LAYER_CHARS:
+        page_type = SCANNED if image_coverage >= SCAN_IMAGE_COVERAGE else BLANK
+    elif image_coverage >= SCAN_IMAGE_COVERAGE and font_count <= 1:
+        # Scanners put a single invisible font over the page image
+        page_type = HYBRID
+    else:
+        page_type = DIGITAL
+
+    return {
+        'page': page_index + 1,
+        'type': page_type,
+        'char_count': len(chars),
+        'font_count': font_count,
+        'text_coverage': round(text_coverage, 4),
+        'image_coverage': round(image_coverage, 4)
+    }
+
+
+def classify_document(document):
+    """
+    Classify every page of a document
+
+    Returns: {
+        'pages': [classify_page() dicts],
+        'counts': {page type: number of pages},
+        'has_digital_text': bool (any born-digital page),
+        'has_images': bool (any page draws an embedded image)
+    }
+    """
+    pages = [classify_page(document, i) for i in range(document.page_count)]
+
+    counts = {}
+    for page in pages:
+        counts[page['type']] = counts.get(page['type'], 0) + 1
+
+    return {
+        'pages': pages,
+        'counts': counts,
+        'has_digital_text': counts.get(DIGITAL, 0) > 0,
+        'has_images': any(page['image_coverage'] > 0 for page in pages)
+    }
@@ -0,0 +1,527 @@
+"""
+Trailer-only PDF reader
+Reads the trailer, the xref chain and the objects it points to directly from
+the end of the file, without building a page tree. Used for metadata and
+incremental-update (revision) analysis, which only need a handful of objects
+"""
+
+import mmap
+import re
+import zlib
+
+
+class TrailerError(ValueError):
+    """The file's trailer or xref structure could not be read"""
+
+
+class Ref:
+    """Indirect object reference (N G R)"""
+
+    __slots__ = ('number', 'generation')
+
+    def __init__(self, number, generation):
+        self.number = number
+        self.generation = generation
+
+    def __repr__(self):
+        return f"Ref({self.number}, {self.generation})"
+
+
+class Name(str):
+    """PDF name object (/Name), kept distinct from strings"""
+
+
+# ---------------------------------------------------------------------------
+# Object parser
+# ---------------------------------------------------------------------------
+
+WHITESPACE = b' \t\r\n\x0c\x00'
+DELIMITERS = b'()<>[]{}/%'
+TOKEN_END = WHITESPACE + DELIMITERS
+
+_NUMBER = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
+_REF = re.compile(rb'(\d+)\s+(\d+)\s+R(?![^\s()<>\[\]{}/%])')
+_ESCAPES = {
+    ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b',
+    ord('f'): b'\x0c', ord('('): b'(', ord(')'): b')', ord('\\'): b'\\'
+}
+
+
+class _Parser:
+    """Minimal recursive-descent parser for PDF objects in a buffer"""
+
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+
+    def skip_whitespace(self):
+        data = self.data
+        while self.pos < len(data):
+            byte = data[self.pos]
+            if byte in WHITESPACE:
+                self.pos += 1
+            elif byte == ord('%'):
+                # Comment runs to end of line
+                while self.pos < len(data) and data[self.pos] not in b'\r\n':
+                    self.pos += 1
+            else:
+                break
+
+    def keyword(self):
+        """Next bare token (true, obj, stream, ...) without consuming it"""
+        self.skip_whitespace()
+        end = self.pos
+        while end < len(self.data) and self.data[end] not in TOKEN_END:
+            end += 1
+        return bytes(self.data[self.pos:end])
+
+    def parse(self):
+        """Parse one object at the current position"""
+        self.skip_whitespace()
+        if self.pos >= len(self.data):
+            raise TrailerError("Unexpected end of file")
+
+        data = self.data
+        byte = data[self.pos]
+
+        if data[self.pos:self.pos + 2] == b'<<':
+            return self._dict()
+        if byte == ord('<'):
+            return self._hex_string()
+        if byte == ord('('):
+            return self._literal_string()
+        if byte == ord('['):
+            return self._array()
+        if byte == ord('/'):
+            return self._name()
+
+        match = _REF.match(data, self.pos)
+        if match:
+            self.pos = match.end()
+            return Ref(int(match.group(1)), int(match.group(2)))
+
+        match = _NUMBER.match(data, self.pos)
+        if match:
+            self.pos = match.end()
+            text = match.group(0)
+            return float(text) if b'.' in text else int(text)
+
+        token = self.keyword()
+        self.pos += len(token)
+        if token == b'true':
+            return True
+        if token == b'false':
+            return False
+        if token == b'null':
+            return None
+        raise TrailerError(f"Unexpected token {token[:20]!r} at offset {self.pos}")
+
+    def _dict(self):
+        self.pos += 2
+        result = {}
+        while True:
+            self.skip_whitespace()
+            if self.data[self.pos:self.pos + 2] == b'>>':
+                self.pos += 2
+                return result
+            key = self.parse()
+            if not isinstance(key, Name):
+                raise TrailerError(f"Dictionary key is not a name at offset {self.pos}")
+            result[str(key)] = self.parse()
+
+    def _array(self):
+        self.pos += 1
+        result = []
+        while True:
+            self.skip_whitespace()
+            if self.data[self.pos:self.pos + 1] == b']':
+                self.pos += 1
+                return result
+            result.append(self.parse())
+
+    def _name(self):
+        self.pos += 1
+        end = self.pos
+        while end < len(self.data) and self.data[end] not in TOKEN_END:
+            end += 1
+        raw = bytes(self.data[self.pos:end])
+        self.pos = end
+        # #xx escapes
+        name = re.sub(rb'#([0-9A-Fa-f]{2})', lambda m: bytes([int(m.group(1), 16)]), raw)
+        return Name(name.decode('latin-1'))
+
+    def _hex_string(self):
+        end = self.data.find(b'>', self.pos)
+        if end < 0:
+            raise TrailerError("Unterminated hex string")
+        digits = re.sub(rb'\s', b'', bytes(self.data[self.pos + 1:end]))
+        self.pos = end + 1
+        if len(digits) % 2:
+            digits += b'0'
+        return bytes.fromhex(digits.decode('ascii'))
+
+    def _literal_string(self):
+        data = self.data
+        self.pos += 1
+        depth = 1
+        out = bytearray()
+        while self.pos < len(data):
+            byte = data[self.pos]
+            self.pos += 1
+            if byte == ord('\\'):
+                escaped = data[self.pos]
+                self.pos += 1
+                if escaped in _ESCAPES:
+                    out += _ESCAPES[escaped]
+                elif ord('0') <= escaped <= ord('7'):
+                    digits = bytes([escaped])
+                    while len(digits) < 3 and ord('0') <= data[self.pos] <= ord('7'):
+                        digits += bytes([data[self.pos]])
+                        self.pos += 1
+                    out.append(int(digits, 8) & 0xFF)
+                elif escaped == ord('\r'):
+                    # Line continuation
+                    if data[self.pos] == ord('\n'):
+                        self.pos += 1
+                elif escaped != ord('\n'):
+                    out.append(escaped)
+            elif byte == ord('('):
+                depth += 1
+                out.append(byte)
+            elif byte == ord(')'):
+                depth -= 1
+                if depth == 0:
+                    return bytes(out)
+                out.append(byte)
+            else:
+                out.append(byte)
+        raise TrailerError("Unterminated string")
+
+
+def decode_text(value):
+    """Decode a PDF text string (UTF-16 with BOM, otherwise PDFDocEncoding)"""
+    if not isinstance(value, bytes):
+        return value
+    if value.startswith(b'\xfe\xff'):
+        return value[2:].decode('utf-16-be', errors='replace')
+    if value.startswith(b'\xff\xfe'):
+        return value[2:].decode('utf-16-le', errors='replace')
+    # PDFDocEncoding matches Latin-1 for every printable character that matters here
+    return value.decode('latin-1')
+
+
+# ---------------------------------------------------------------------------
+# Xref chain
+# ---------------------------------------------------------------------------
+
+_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+# Only a %%EOF right after a startxref ends a revision; the bytes "%%EOF"
+# can also appear in page content or embedded streams
+_EOF_MARKER = re.compile(rb'startxref\s+\d+\s*%%EOF')
+_OBJ_HEADER = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj')
+_XREF_ENTRY = re.compile(rb'(\d{10})\s(\d{5})\s([nf])')
+_SUBSECTION = re.compile(rb'\s*(\d+)\s+(\d+)\s*[\r\n]')
+
+# Trailer lookups only need the end of the file
+TAIL_BYTES = 2048
+# Linearized files announce themselves in the first object
+HEAD_BYTES = 1024
+
+
+class TrailerInfo:
+    """
+    Trailer, xref chain and Info dictionary of a PDF
+
+    Attributes:
+        info: Info dictionary with decoded string values, {} if the file has
+              none, or None if it exists but can't be read without a full
+              parser (encrypted, or stored in an object stream)
+        page_count: /Count of the page tree root, or None if unreadable
+        xref_sections: Xref sections in the /Prev chain (newest first)
+        eof_markers: %%EOF markers ending a revision (right after startxref)
+        linearized: Whether the file is linearized ("fast web view")
+        revisions: Estimated number of saves (1 for an untouched file)
+    """
+
+    def __init__(self, data):
+        """
+        Args:
+            data: Whole file as bytes, bytearray or mmap
+        """
+        self.data = data
+        self.offsets = {}         # object number -> byte offset
+        self.compressed = set()   # object numbers stored in object streams
+        self.trailer = {}
+        self.xref_sections = 0
+
+        self._read_xref_chain()
+
+        self.eof_markers = sum(1 for _ in _EOF_MARKER.finditer(data))
+        self.linearized = b'/Linearized' in bytes(data[:HEAD_BYTES])
+
+        # A linearized file has a first-page xref section and its own %%EOF
+        # without having been saved twice
+        extra = 1 if self.linearized else 0
+        self.revisions = max(1, self.xref_sections - extra, self.eof_markers - extra)
+
+        self.info = self._read_info()
+        self.page_count = self._read_page_count()
+
+    @property
+    def incremental_updates(self):
+        """Saves after the original one"""
+        return self.revisions - 1
+
+    def _read_xref_chain(self):
+        """Follow startxref and every /Prev link, newest section first"""
+        tail_start = max(0, len(self.data) - TAIL_BYTES)
+        matches = list(_STARTXREF.finditer(self.data, tail_start))
+        if not matches:
+            raise TrailerError("startxref not found")
+
+        offset = int(matches[-1].group(1))
+        visited = set()
+        while offset is not None:
+            if offset in visited or offset >= len(self.data):
+                raise TrailerError(f"Broken xref chain at offset {offset}")
+            visited.add(offset)
+
+            trailer = self._read_xref_section(offset)
+            self.xref_sections += 1
+            for key, value in trailer.items():
+                # Newer trailers take precedence
+                self.trailer.setdefault(key, value)
+
+            # Hybrid files keep compressed entries in an extra xref stream
+            if isinstance(trailer.get('XRefStm'), int):
+                self._read_xref_section(trailer['XRefStm'])
+
+            prev = trailer.get('Prev')
+            offset = int(prev) if isinstance(prev, (int, float)) else None
+
+    def _read_xref_section(self, offset):
+        """Read one xref table or xref stream; returns its trailer dictionary"""
+        parser = _Parser(self.data, offset)
+        if parser.keyword() == b'xref':
+            return self._read_xref_table(parser)
+        return self._read_xref_stream(offset)
+
+    def _read_xref_table(self, parser):
+        parser.pos += len(b'xref')
+        data = self.data
+        while True:
+            parser.skip_whitespace()
+            if parser.keyword() == b'trailer':
+                parser.pos += len(b'trailer')
+                trailer = parser.parse()
+                if not isinstance(trailer, dict):
+                    raise TrailerError("Trailer is not a dictionary")
+                return trailer
+
+            header = _SUBSECTION.match(data, parser.pos)
+            if not header:
+                raise TrailerError(f"Malformed xref table at offset {parser.pos}")
+            first, count = int(header.group(1)), int(header.group(2))
+            parser.pos = header.end()
+
+            for number in range(first, first + count):
+                parser.skip_whitespace()
+                entry = _XREF_ENTRY.match(data, parser.pos)
+                if not entry:
+                    raise TrailerError(f"Malformed xref entry at offset {parser.pos}")
+                parser.pos = entry.end()
+                if entry.group(3) == b'n':
+                    self.offsets.setdefault(number, int(entry.group(1)))
+
+    def _read_xref_stream(self, offset):
+        obj, stream = self._object_at(offset)
+        if not isinstance(obj, dict) or obj.get('Type') != 'XRef' or stream is None:
+            raise TrailerError(f"No xref table or stream at offset {offset}")
+
+        raw = _decode_stream(obj, stream)
+        widths = obj['W']
+        row_size = sum(widths)
+        index = obj.get('Index', [0, obj['Size']])
+
+        position = 0
+        for first, count in zip(index[0::2], index[1::2]):
+            for number in range(first, first + count):
+                row = raw[position:position + row_size]
+                position += row_size
+                if len(row) < row_size:
+                    raise TrailerError("Truncated xref stream")
+
+                fields = []
+                start = 0
+                for width in widths:
+                    fields.append(int.from_bytes(row[start:start + width], 'big'))
+                    start += width
+                # A zero-width type field defaults to 1 (in use)
+                entry_type = fields[0] if widths[0] else 1
+
+                if number in self.offsets or number in self.compressed:
+                    continue
+                if entry_type == 1:
+                    self.offsets[number] = fields[1]
+                elif entry_type == 2:
+                    self.compressed.add(number)
+        return obj
+
+    # -----------------------------------------------------------------------
+    # Objects
+    # -----------------------------------------------------------------------
+
+    def _object_at(self, offset):
+        """
+        Parse the indirect object at a byte offset
+
+        Returns:
+            tuple: (object, raw stream bytes or None)
+        """
+        header = _OBJ_HEADER.match(self.data, offset)
+        if not header:
+            raise TrailerError(f"No object at offset {offset}")
+
+        parser = _Parser(self.data, header.end())
+        obj = parser.parse()
+
+        stream = None
+        if isinstance(obj, dict) and parser.keyword() == b'stream':
+            start = parser.pos + len(b'stream')
+            # The keyword is followed by CRLF or LF
+            if self.data[start:start + 2] == b'\r\n':
+                start += 2
+            elif self.data[start:start + 1] in (b'\n', b'\r'):
+                start += 1
+
+            length = obj.get('Length')
+            if isinstance(length, Ref):
+                try:
+                    length = self.resolve(length)
+                except TrailerError:
+                    length = None
+            if not isinstance(length, int):
+                end = self.data.find(b'endstream', start)
+                if end < 0:
+                    raise TrailerError("Unterminated stream")
+                length = end - start
+            stream = bytes(self.data[start:start + length])
+        return obj, stream
+
+    def resolve(self, value):
+        """
+        Resolve an indirect reference (other values are returned unchanged)
+
+        Raises:
+            TrailerError: The object is in an object stream or missing
+        """
+        if not isinstance(value, Ref):
+            return value
+        if value.number in self.compressed:
+            raise TrailerError(f"Object {value.number} is in an object stream")
+        if value.number not in self.offsets:
+            raise TrailerError(f"Object {value.number} not in xref")
+        obj, _ = self._object_at(self.offsets[value.number])
+        return obj
+
+    def _read_info(self):
+        if 'Info' not in self.trailer:
+            return {}
+        if 'Encrypt' in self.trailer:
+            return None
+        try:
+            info = self.resolve(self.trailer['Info'])
+            if not isinstance(info, dict):
+                return None
+            return {
+                key: decode_text(self.resolve(value))
+                for key, value in info.items()
+            }
+        except TrailerError:
+            return None
+
+    def _read_page_count(self):
+        try:
+            root = self.resolve(self.trailer.get('Root'))
+            pages = self.resolve(root.get('Pages'))
+            count = self.resolve(pages.get('Count'))
+            return count if isinstance(count, int) else None
+        except (TrailerError, AttributeError):
+            return None
+
+
+def _decode_stream(obj, stream):
+    """Apply FlateDecode and PNG predictors to a stream's bytes"""
+    filters = obj.get('Filter')
+    if filters is None:
+        filters = []
+    elif not isinstance(filters, list):
+        filters = [filters]
+
+    data = stream
+    for name in filters:
+        if name != 'FlateDecode':
+            raise TrailerError(f"Unsupported xref stream filter /{name}")
+        data = zlib.decompress(data)
+
+    params = obj.get('DecodeParms') or {}
+    if isinstance(params, list):
+        params = params[0] or {}
+    predictor = params.get('Predictor', 1)
+    if predictor >= 10:
+        data = _png_unpredict(data, params.get('Columns', 1))
+    elif predictor != 1:
+        raise TrailerError(f"Unsupported predictor {predictor}")
+    return data
+
+
+def _png_unpredict(data, columns):
+    """Undo PNG row filters (one filter-type byte per row, 1 byte per pixel)"""
+    out = bytearray()
+    previous = bytearray(columns)
+    row_size = columns + 1
+    for start in range(0, len(data) - columns, row_size):
+        filter_type = data[start]
+        row = bytearray(data[start + 1:start + row_size])
+        for i in range(len(row)):
+            left = row[i - 1] if i else 0
+            up = previous[i]
+            if filter_type == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif filter_type == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif filter_type == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif filter_type == 4:
+                up_left = previous[i - 1] if i else 0
+                estimate = left + up - up_left
+                distances = (abs(estimate - left), abs(estimate - up), abs(estimate - up_left))
+                nearest = (left, up, up_left)[distances.index(min(distances))]
+                row[i] = (row[i] + nearest) & 0xFF
+        out += row
+        previous = row
+    return bytes(out)
+
+
+def read_trailer(source):
+    """
+    Read a PDF's trailer information
+
+    Args:
+        source: File path (memory-mapped) or the file's bytes
+
+    Returns:
+        TrailerInfo
+
+    Raises:
+        TrailerError: The file's xref structure is unreadable
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return TrailerInfo(source)
+
+    with open(source, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            info = TrailerInfo(mapped)
+            # Don't keep a reference to the closed map
+            info.data = None
+            return info
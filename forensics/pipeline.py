@@ -0,0 +1,42 @@
+"""
+End-to-end forensic pipeline for a single upload
+Analysis over one shared DocumentContext; this is the unit of work the API
+hands to its worker processes. Visualizations are rendered separately, on
+demand (see visualizer_api.render_visualization)
+"""
+
+from .document import load_document
+from .forensic_analyzer import analyze_document_forensics
+
+
+def run_forensic_pipeline(file_bytes, file_name='unknown', doc_type='unknown',
+                          max_workers=None, visualization_pages=2):
+    """
+    Analyze an uploaded document and list the pages that can be visualized
+    
+    Module-level and argument-picklable so it can run in a process pool.
+    
+    Args:
+        file_bytes: Uploaded file content
+        file_name: Original file name for tracking
+        doc_type: Document type ('noa', 't1', or 'unknown')
+        max_workers: Threads used to run checks concurrently
+        visualization_pages: Number of pages to offer visualizations for
+    
+    Returns:
+        dict: analyze_document_forensics results plus 'visualization_pages'
+              (page numbers, 1-based)
+    """
+    # PDFs and JPEG/PNG uploads (ImageDocument) share one interface
+    with load_document(file_bytes) as document:
+        results = analyze_document_forensics(
+            pdf_file=document,
+            pdf_bytes=file_bytes,
+            file_name=file_name,
+            doc_type=doc_type,
+            max_workers=max_workers
+        )
+        page_count = document.page_count
+    
+    results['visualization_pages'] = list(range(1, min(visualization_pages, page_count) + 1))
+    return results
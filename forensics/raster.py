@@ -0,0 +1,422 @@
+"""
+Shared page rasters for image-based forensic checks
+Renders pages on demand, once, at the highest DPI any consumer needs and
+derives lower resolutions by downsampling instead of calling poppler again.
+OCR consumers ask for a region of a page, which is rendered on its own
+"""
+
+import io
+import math
+import threading
+
+from pdf2image import convert_from_bytes, pdfinfo_from_bytes
+from PIL import Image, ImageOps
+
+# In-process renderer for page regions: pdfium renders just the cropped
+# area, where poppler (pdf2image) can only render whole pages
+PDFIUM_AVAILABLE = False
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+    print("[INFO] pypdfium2 is available - OCR regions render in-process")
+except ImportError:
+    print("[WARNING] pypdfium2 not installed (see requirements.txt) - OCR regions are cropped from full-page renders")
+
+# pdfium is not thread-safe, even across documents
+_pdfium_lock = threading.Lock()
+
+# DPI each raster consumer works at
+IMAGE_QUALITY_DPI = 150
+PAGE_NUMBER_DPI = 200
+NOA_ID_DPI = 300
+VISUALIZATION_DPI = 100
+THUMBNAIL_DPI = 72   # one pixel per point, so vector overlays map 1:1
+
+# Physical size assumed for images without a usable DPI tag: the long side
+# spans a letter page (11 in)
+IMAGE_LONG_SIDE_INCHES = 11
+# DPI tags below this are treated as missing (screen defaults like 72)
+MIN_TAGGED_DPI = 100
+
+
+class PageRasterProvider:
+    """
+    Renders document pages lazily and hands them to every raster consumer
+
+    Consumers declare the DPI they need, for the pages they will touch,
+    with require() before the first render. A page is only rendered when
+    some consumer asks for it, and then a single time at the highest DPI
+    declared for that page. Asking for a lower DPI returns a downsampled
+    copy (cached); asking for a higher one than that page was rendered at
+    re-renders just that page. Safe to share between threads.
+
+    region() serves OCR crops: from a cached full page when one is already
+    rendered at a high enough DPI, otherwise by rendering only the region
+    with pdfium, so the cost scales with the region's area.
+    """
+
+    def __init__(self, pdf_bytes, dpi=None, page_count=None):
+        """
+        Args:
+            pdf_bytes: PDF file as bytes
+            dpi: Initial render DPI of every page (raised by require())
+            page_count: Page count if already known (saves a pdfinfo call)
+        """
+        self.pdf_bytes = pdf_bytes
+        self.render_dpi = dpi or 0
+        self._page_count = page_count
+        self._required = {}   # index -> highest DPI declared for that page
+        self._pages = {}      # index -> (rendered_dpi, image)
+        self._derived = {}    # (index, dpi) -> image
+        self._regions = {}    # (index, dpi, box) -> image
+        self._pdfium = None
+        self._lock = threading.RLock()
+
+    def require(self, dpi, regions_only=False, indices=None):
+        """
+        Declare that a consumer will need pages at this DPI
+
+        Args:
+            dpi: Resolution the consumer works at
+            regions_only: The consumer only calls region(); when regions
+                          render on their own its DPI doesn't raise the
+                          full-page render
+            indices: 0-indexed pages the consumer touches (None = every page)
+        """
+        if regions_only and PDFIUM_AVAILABLE:
+            return
+        with self._lock:
+            if indices is None:
+                self.render_dpi = max(self.render_dpi, dpi)
+                return
+            for index in indices:
+                self._required[index] = max(self._required.get(index, 0), dpi)
+
+    def _target_dpi(self, index, dpi):
+        """DPI to render a page at: the request or the page's declared need"""
+        return max(dpi, self.render_dpi, self._required.get(index, 0))
+
+    @property
+    def page_count(self):
+        """Number of pages, read from the PDF info (no rendering)"""
+        with self._lock:
+            if self._page_count is None:
+                self._page_count = pdfinfo_from_bytes(self.pdf_bytes)['Pages']
+            return self._page_count
+
+    def _render_range(self, first, last, dpi):
+        """Rasterize pages first..last (0-indexed, inclusive) in one poppler call"""
+        images = convert_from_bytes(
+            self.pdf_bytes,
+            dpi=dpi,
+            first_page=first + 1,
+            last_page=last + 1
+        )
+        for offset, image in enumerate(images):
+            index = first + offset
+            self._pages[index] = (dpi, image)
+            self._derived = {
+                key: value for key, value in self._derived.items() if key[0] != index
+            }
+
+    def _ensure_rendered(self, indices, dpi):
+        """Render any of the given pages that are missing or too coarse for dpi"""
+        missing = [
+            index for index in indices
+            if index not in self._pages or self._pages[index][0] < dpi
+        ]
+
+        # Group consecutive pages rendered at the same DPI so each run costs
+        # one poppler call
+        start = None
+        for position, index in enumerate(missing):
+            if start is None:
+                start = index
+            target = self._target_dpi(index, dpi)
+            is_last = position == len(missing) - 1
+            if (is_last or missing[position + 1] != index + 1
+                    or self._target_dpi(index + 1, dpi) != target):
+                self._render_range(start, index, target)
+                start = None
+
+    def _at_dpi(self, index, dpi):
+        """Cached page at dpi, downsampling from the rendered raster if needed"""
+        rendered_dpi, image = self._pages[index]
+        if dpi == rendered_dpi:
+            return image
+
+        key = (index, dpi)
+        if key not in self._derived:
+            self._derived[key] = downsample(image, rendered_dpi, dpi)
+        return self._derived[key]
+
+    def page(self, index, dpi):
+        """
+        Page raster (0-indexed) at the requested DPI, rendering only that page
+
+        Args:
+            index: 0-indexed page number
+            dpi: Resolution the consumer works at
+
+        Returns:
+            PIL.Image
+        """
+        with self._lock:
+            if index < 0 or index >= self.page_count:
+                raise IndexError(f"Page {index + 1} out of range (document has {self.page_count})")
+            self._ensure_rendered([index], dpi)
+            return self._at_dpi(index, dpi)
+
+    def _render_region(self, index, dpi, box):
+        """Render only box (page fractions) of one page with pdfium"""
+        with _pdfium_lock:
+            if self._pdfium is None:
+                self._pdfium = pdfium.PdfDocument(self.pdf_bytes)
+            page = self._pdfium[index]
+            try:
+                width, height = page.get_size()
+                if page.get_rotation() in (90, 270):
+                    width, height = height, width
+                x0, top, x1, bottom = box
+                # Crop is the amount cut from (left, bottom, right, top), in points
+                crop = (x0 * width, (1 - bottom) * height, (1 - x1) * width, top * height)
+                return page.render(scale=dpi / 72, crop=crop).to_pil().convert('RGB')
+            finally:
+                page.close()
+
+    def region(self, index, dpi, box):
+        """
+        Part of a page (0-indexed) at the requested DPI
+
+        Args:
+            index: 0-indexed page number
+            dpi: Resolution the consumer works at
+            box: (x0, top, x1, bottom) as fractions of the page size
+
+        Returns:
+            PIL.Image
+        """
+        with self._lock:
+            if index < 0 or index >= self.page_count:
+                raise IndexError(f"Page {index + 1} out of range (document has {self.page_count})")
+
+            key = (index, dpi, tuple(box))
+            if key not in self._regions:
+                rendered = self._pages.get(index)
+                if PDFIUM_AVAILABLE and (rendered is None or rendered[0] < dpi):
+                    self._regions[key] = self._render_region(index, dpi, box)
+                else:
+                    self._ensure_rendered([index], dpi)
+                    self._regions[key] = crop_fraction(self._at_dpi(index, dpi), box)
+            return self._regions[key]
+
+    def pages(self, dpi, max_pages=None, indices=None):
+        """
+        Page rasters at the requested DPI
+
+        Args:
+            dpi: Resolution the consumer works at
+            max_pages: Only the first max_pages pages
+            indices: Explicit 0-indexed pages to return (overrides max_pages)
+
+        Returns:
+            list of PIL.Image, in the order requested
+        """
+        with self._lock:
+            if indices is None:
+                count = self.page_count
+                if max_pages is not None:
+                    count = min(count, max_pages)
+                indices = range(count)
+
+            indices = [index for index in indices if 0 <= index < self.page_count]
+            self._ensure_rendered(sorted(set(indices)), dpi)
+            return [self._at_dpi(index, dpi) for index in indices]
+
+    def close(self):
+        """Drop all cached rasters"""
+        with self._lock:
+            self._pages.clear()
+            self._derived.clear()
+            self._regions.clear()
+            if self._pdfium is not None:
+                with _pdfium_lock:
+                    self._pdfium.close()
+                self._pdfium = None
+
+
+class ImageRasterProvider:
+    """
+    Page raster of a single-image upload (JPEG/PNG), decoded straight from the file
+
+    Same interface as PageRasterProvider for one page. The image is decoded
+    once, at the highest declared DPI: JPEGs larger than that are decoded
+    at a reduced DCT scale (PIL draft), so a 12 MP photo needed at 150 dpi
+    never materializes at full size. Lower DPIs are downsampled from it.
+    """
+
+    page_count = 1
+
+    def __init__(self, image_bytes, dpi=None):
+        """
+        Args:
+            image_bytes: Image file as bytes
+            dpi: Initial decode DPI (raised by require())
+        """
+        self.image_bytes = image_bytes
+        self.render_dpi = dpi or 0
+        self._decoded = None   # (dpi, image)
+        self._derived = {}     # dpi -> image
+        self._lock = threading.RLock()
+
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            self.source_size = image.size
+            tagged = image.info.get('dpi', (0, 0))[0]
+            # EXIF orientation swaps the axes of rotated phone photos
+            orientation = image.getexif().get(0x0112, 1)
+        self.transposed = orientation in (5, 6, 7, 8)
+        self.native_dpi = (
+            float(tagged) if tagged >= MIN_TAGGED_DPI
+            else max(self.source_size) / IMAGE_LONG_SIDE_INCHES
+        )
+
+    @property
+    def size_points(self):
+        """(width, height) of the page in PDF points, after EXIF orientation"""
+        width, height = self.source_size
+        if self.transposed:
+            width, height = height, width
+        return width * 72 / self.native_dpi, height * 72 / self.native_dpi
+
+    def require(self, dpi, regions_only=False, indices=None):
+        """Declare that a consumer will need the page at this DPI"""
+        if indices is None or 0 in indices:
+            self.render_dpi = max(self.render_dpi, dpi)
+
+    def _decode(self, dpi):
+        """
+        Decode at no less than dpi (capped at native), reducing JPEGs in the decoder
+
+        Returns:
+            tuple: (effective dpi, upright PIL.Image)
+        """
+        image = Image.open(io.BytesIO(self.image_bytes))
+        if dpi < self.native_dpi:
+            scale = dpi / self.native_dpi
+            width, height = self.source_size
+            # No-op for formats without draft support (PNG)
+            image.draft(image.mode, (math.ceil(width * scale), math.ceil(height * scale)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        upright_width = self.source_size[1] if self.transposed else self.source_size[0]
+        return self.native_dpi * image.width / upright_width, image
+
+    def scan(self, target_dpi=None):
+        """
+        The image at (close to) native resolution, in grayscale
+
+        Args:
+            target_dpi: Resolution the consumer needs; JPEGs above it are
+                        decoded at a reduced DCT scale that stays at or above it
+
+        Returns:
+            tuple: (PIL.Image in mode 'L', effective dpi)
+        """
+        with self._lock:
+            if self._decoded is not None and (not target_dpi or self._decoded[0] >= target_dpi):
+                dpi, image = self._decoded
+            else:
+                dpi, image = self._decode(target_dpi or self.native_dpi)
+        return image.convert('L'), dpi
+
+    def page(self, index, dpi):
+        """
+        The image resampled to the requested DPI
+
+        Args:
+            index: Must be 0
+            dpi: Resolution the consumer works at
+
+        Returns:
+            PIL.Image
+        """
+        with self._lock:
+            if index != 0:
+                raise IndexError(f"Page {index + 1} out of range (document has 1)")
+            decoded_dpi, image = self._ensure_decoded(dpi)
+            if dpi not in self._derived:
+                self._derived[dpi] = _resample(image, decoded_dpi, dpi)
+            return self._derived[dpi]
+
+    def _ensure_decoded(self, dpi):
+        """The decoded (dpi, image), decoding again if it is too coarse for dpi"""
+        self.require(dpi)
+        if self._decoded is None or self._decoded[0] < min(dpi, self.native_dpi):
+            self._decoded = self._decode(self.render_dpi)
+            self._derived.clear()
+        return self._decoded
+
+    def region(self, index, dpi, box):
+        """
+        Part of the image at the requested DPI, cropped before resampling
+
+        Args:
+            index: Must be 0
+            dpi: Resolution the consumer works at
+            box: (x0, top, x1, bottom) as fractions of the page size
+
+        Returns:
+            PIL.Image
+        """
+        with self._lock:
+            if index != 0:
+                raise IndexError(f"Page {index + 1} out of range (document has 1)")
+            decoded_dpi, image = self._ensure_decoded(dpi)
+            return _resample(crop_fraction(image, box), decoded_dpi, dpi)
+
+    def pages(self, dpi, max_pages=None, indices=None):
+        """Rasters at the requested DPI (see PageRasterProvider.pages)"""
+        if indices is None:
+            indices = [0] if max_pages is None or max_pages > 0 else []
+        return [self.page(index, dpi) for index in indices if index == 0]
+
+    def close(self):
+        """Drop the decoded image"""
+        with self._lock:
+            self._decoded = None
+            self._derived.clear()
+
+
+def crop_fraction(image, box):
+    """Crop (x0, top, x1, bottom), given as fractions of the image size"""
+    width, height = image.size
+    x0, top, x1, bottom = box
+    return image.crop((round(width * x0), round(height * top), round(width * x1), round(height * bottom)))
+
+
+def _resample(image, from_dpi, to_dpi):
+    """Downsample, or enlarge small images so consumers get the scale they asked for"""
+    if to_dpi < from_dpi:
+        return downsample(image, from_dpi, to_dpi)
+    if to_dpi > from_dpi:
+        ratio = to_dpi / from_dpi
+        size = (round(image.width * ratio), round(image.height * ratio))
+        return image.resize(size, Image.LANCZOS)
+    return image
+
+
+def downsample(image, from_dpi, to_dpi):
+    """
+    Resample a raster rendered at from_dpi down to to_dpi
+
+    Integer ratios use Image.reduce (block averaging); other ratios use a box
+    filter, which matches poppler's own output closely for downscaling.
+    """
+    ratio = from_dpi / to_dpi
+    if ratio == int(ratio):
+        return image.reduce(int(ratio))
+
+    width, height = image.size
+    size = (max(1, round(width / ratio)), max(1, round(height / ratio)))
+    return image.resize(size, Image.BOX)
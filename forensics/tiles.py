@@ -0,0 +1,122 @@
+"""
+Tile-based local sharpness and noise map
+Splits a grayscale page raster into fixed-size tiles and measures each
+tile's Laplacian energy (sharpness) and high-pass residual (noise) with box
+averages, then flags tiles that disagree with the rest of the page. A region
+pasted from another source usually differs from its surroundings in
+sharpness, noise or both
+"""
+
+import cv2
+import numpy as np
+
+# Resolution the map is computed at; higher-resolution inputs are downscaled
+TILE_DPI = 150
+# Tile edge in pixels at TILE_DPI (about 5.4 mm)
+TILE_SIZE = 32
+# Robust z-score beyond which a tile is inconsistent with its page
+OUTLIER_Z = 4.0
+# Intensity std above which a tile has content (text, lines) to be sharp
+TEXTURE_STD = 12.0
+# Intensity std below which a tile is bare paper, where only noise remains
+FLAT_STD = 6.0
+# Floors for the robust spread, so clean digital pages don't flag rounding noise
+MIN_LOG_SPREAD = 0.15
+# Connected outlier tiles needed to report a region
+MIN_REGION_TILES = 2
+# Regions reported per page
+MAX_REGIONS = 20
+
+
+def _robust_z(values):
+    """Robust z-scores (median / MAD) of a 1-D array"""
+    median = np.median(values)
+    spread = 1.4826 * np.median(np.abs(values - median))
+    return (values - median) / max(spread, MIN_LOG_SPREAD)
+
+
+def _tile_means(image, rows, cols):
+    """Mean of each TILE_SIZE x TILE_SIZE block (exact box average via INTER_AREA)"""
+    return cv2.resize(image, (cols, rows), interpolation=cv2.INTER_AREA)
+
+
+def tile_map(gray, dpi=TILE_DPI):
+    """
+    Local sharpness/noise map of one page
+
+    Args:
+        gray: 2-D uint8 array (grayscale page)
+        dpi: Resolution of gray
+
+    Returns: {
+        'laplacian_var': float (whole-page Laplacian variance at TILE_DPI),
+        'tiles': int,
+        'regions': [{'bbox': [x0, top, x1, bottom] in PDF points,
+                     'metric': 'sharpness' | 'noise', 'tiles': int,
+                     'score': mean |z| of the region}]
+    }
+    """
+    if dpi > TILE_DPI:
+        scale = TILE_DPI / dpi
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        dpi = TILE_DPI
+
+    image = gray.astype(np.float32)
+    laplacian = cv2.Laplacian(image, cv2.CV_32F)
+    # High-pass residual: pixel minus its 3x3 neighbourhood mean
+    residual = np.abs(image - cv2.blur(image, (3, 3)))
+
+    _, std = cv2.meanStdDev(laplacian)
+    laplacian_var = float(std[0][0] ** 2)
+
+    rows, cols = image.shape[0] // TILE_SIZE, image.shape[1] // TILE_SIZE
+    if rows == 0 or cols == 0:
+        return {'laplacian_var': laplacian_var, 'tiles': 0, 'regions': []}
+    height, width = rows * TILE_SIZE, cols * TILE_SIZE
+
+    # One box-average pass per statistic over the tiled area
+    mean = _tile_means(image[:height, :width], rows, cols)
+    mean_sq = _tile_means(image[:height, :width] ** 2, rows, cols)
+    energy = _tile_means(laplacian[:height, :width] ** 2, rows, cols)
+    noise = _tile_means(residual[:height, :width], rows, cols)
+
+    contrast = np.sqrt(np.maximum(mean_sq - mean ** 2, 0))
+    textured = contrast >= TEXTURE_STD
+    flat = contrast < FLAT_STD
+
+    outliers = {}
+    # Sharpness is only comparable where there is content to be sharp
+    if textured.sum() >= 8:
+        z = np.zeros_like(energy)
+        z[textured] = _robust_z(np.log1p(energy[textured]))
+        outliers['sharpness'] = (np.abs(z) > OUTLIER_Z) & textured, z
+    # Noise is measured on paper, where the residual is sensor/compression noise
+    if flat.sum() >= 8:
+        z = np.zeros_like(noise)
+        z[flat] = _robust_z(np.log1p(noise[flat]))
+        outliers['noise'] = (np.abs(z) > OUTLIER_Z) & flat, z
+
+    regions = []
+    points_per_tile = TILE_SIZE * 72.0 / dpi
+    for metric, (mask, z) in outliers.items():
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+        for label in range(1, count):
+            left, top, w, h, area = stats[label]
+            if area < MIN_REGION_TILES:
+                continue
+            regions.append({
+                'bbox': [
+                    round(left * points_per_tile, 1), round(top * points_per_tile, 1),
+                    round((left + w) * points_per_tile, 1), round((top + h) * points_per_tile, 1)
+                ],
+                'metric': metric,
+                'tiles': int(area),
+                'score': round(float(np.abs(z[labels == label]).mean()), 2)
+            })
+
+    regions.sort(key=lambda region: region['tiles'] * region['score'], reverse=True)
+    return {
+        'laplacian_var': laplacian_var,
+        'tiles': rows * cols,
+        'regions': regions[:MAX_REGIONS]
+    }
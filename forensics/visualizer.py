@@ -96,11 +96,11 @@ def create_forensic_visualizations(pdf_file, pdf_bytes, forensic_results, max_pa
             if alignment_data and alignment_data.get('issues'):
                 for issue in alignment_data['issues']:
                     if issue['page'] == page_num + 1:
-                        for word in issue.get('words', []):
-                            x0 = word['x0'] * scale
-                            y0 = word['top'] * scale
-                            w = (word['x1'] - word['x0']) * scale
-                            h = (word['bottom'] - word['top']) * scale
+                        for box_x0, box_top, box_x1, box_bottom in issue.get('boxes', []):
+                            x0 = box_x0 * scale
+                            y0 = box_top * scale
+                            w = (box_x1 - box_x0) * scale
+                            h = (box_bottom - box_top) * scale
                             rect = Rectangle((x0, y0), w, h,
                                             linewidth=2, edgecolor='red',
                                             facecolor='yellow', alpha=0.4)
@@ -1,137 +1,298 @@
 """
 API-friendly forensic visualizations
-Returns base64-encoded images instead of displaying them
+Returns encoded images instead of displaying them, or the highlight boxes
+themselves as vector layers for clients that draw them over a thumbnail
 """
 
-import io
 import base64
-import pdfplumber
-from pdf2image import convert_from_bytes
-import matplotlib
-matplotlib.use('Agg')  # Non-interactive backend for API
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle
+import json
+import cv2
 import numpy as np
+from .document import load_document, open_document
+from .overlay import BLUE, GREEN, ORANGE, RED, YELLOW, compose_panels, draw_boxes, encode_image
+from .raster import THUMBNAIL_DPI, VISUALIZATION_DPI
 
+PANEL_TITLES = (
+    'Original Document',
+    'Font Inconsistencies (Red)',
+    'Numbers (Green=2dp, Orange=Other)',
+    'Alignment Issues (Red/Yellow)',
+)
 
-def create_forensic_visualizations_api(pdf_file, pdf_bytes, forensic_results, max_pages=2):
+# Highlight layers in drawing order: panel, fill, outline, opacity and
+# outline width in points
+LAYER_STYLES = {
+    'odd_fonts': (1, RED, RED, 0.3, 0.5),
+    'numbers_integer': (2, BLUE, BLUE, 0.15, 1),
+    'numbers_2dp': (2, GREEN, GREEN, 0.2, 1),
+    'numbers_other': (2, ORANGE, ORANGE, 0.4, 1),
+    'alignment': (3, YELLOW, RED, 0.4, 2),
+}
+
+
+def _boxes(boxes):
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def page_highlights(document, forensic_results, page_index):
+    """
+    Boxes the visualizations highlight on one page, in PDF points
+
+    Args:
+        document: DocumentContext the results were computed on
+        forensic_results: Results from forensic_analyzer
+        page_index: Page (0-indexed)
+
+    Returns:
+        dict: (n, 4) arrays of x0, top, x1, bottom per layer ('odd_fonts',
+              'numbers_2dp', 'numbers_other', 'numbers_integer', 'alignment')
+    """
+    page_num = page_index + 1
+
+    odd_fonts = _boxes([])
+    dominant = (forensic_results.get('fonts') or {}).get('dominant_font')
+    if dominant:
+        chars = document.char_table(page_index)
+        odd_fonts = _boxes(chars.boxes[chars.font_codes != document.fonts.lookup(dominant)])
+
+    numbers = {'numbers_2dp': [], 'numbers_other': [], 'numbers_integer': []}
+    for position in (forensic_results.get('numbers') or {}).get('positions', []):
+        if position['page'] != page_num:
+            continue
+        if position['precision'] == 2:
+            numbers['numbers_2dp'].append(position['box'])
+        elif position['precision']:
+            numbers['numbers_other'].append(position['box'])
+        else:
+            numbers['numbers_integer'].append(position['box'])
+
+    alignment = [
+        box
+        for issue in (forensic_results.get('alignment') or {}).get('issues', [])
+        if issue['page'] == page_num
+        for box in issue.get('boxes', [])
+    ]
+
+    highlights = {'odd_fonts': odd_fonts, 'alignment': _boxes(alignment)}
+    highlights.update({layer: _boxes(boxes) for layer, boxes in numbers.items()})
+    return highlights
+
+
+def render_page_panels(image, page_height, highlights):
+    """
+    The four annotated panels of one page as a single RGB array
+
+    Args:
+        image: Page raster (PIL.Image)
+        page_height: Page height in PDF points
+        highlights: page_highlights() of the page
+
+    Returns:
+        np.ndarray: (H, W, 3) uint8 panel grid
+    """
+    page = np.asarray(image.convert('RGB'))
+    scale = page.shape[0] / page_height
+    grid, panels = compose_panels(page, PANEL_TITLES)
+
+    for layer, (panel, face, edge, alpha, edge_points) in LAYER_STYLES.items():
+        edge_width = max(1, round(edge_points * scale))
+        draw_boxes(panels[panel], highlights[layer], scale, face, edge, alpha, edge_width)
+    return grid
+
+
+def create_forensic_visualizations_api(pdf_file, pdf_bytes, forensic_results, max_pages=2,
+                                       image_format='png'):
     """
     Generate annotated images showing forensic issues
     Returns base64-encoded images for API response
-    
+
     Args:
-        pdf_file: File path
+        pdf_file: File path or shared DocumentContext
         pdf_bytes: PDF bytes for image conversion
         forensic_results: Results from forensic_analyzer
         max_pages: Number of pages to visualize
-        
+        image_format: 'png' or 'webp'
+
     Returns:
         list: List of dicts with page_num and base64_image
     """
-    
+
     visualizations = []
-    
-    try:
-        images = convert_from_bytes(pdf_bytes, dpi=200)
-    except Exception as e:
-        return {"error": f"Could not generate visualizations: {str(e)}"}
-    
-    with pdfplumber.open(pdf_file) as pdf:
-        for page_num in range(min(max_pages, len(pdf.pages))):
-            page = pdf.pages[page_num]
-            img = images[page_num]
-            
-            # Create 2x2 grid
-            fig, axes = plt.subplots(2, 2, figsize=(16, 20))
-            
-            scale = img.size[1] / page.height
-            
-            # 1. Original
-            axes[0, 0].imshow(img)
-            axes[0, 0].set_title('Original Document', fontweight='bold', fontsize=12)
-            axes[0, 0].axis('off')
-            
-            # 2. Font highlighting
-            axes[0, 1].imshow(img)
-            font_data = forensic_results.get('fonts', {})
-            
-            if font_data and font_data.get('dominant_font'):
-                dominant = font_data['dominant_font']
-                
-                for char in page.chars:
-                    if char.get('fontname', '') != dominant:
-                        x0 = char['x0'] * scale
-                        y0 = char['top'] * scale
-                        w = (char['x1'] - char['x0']) * scale
-                        h = (char['bottom'] - char['top']) * scale
-                        rect = Rectangle((x0, y0), w, h,
-                                        linewidth=0.5, edgecolor='red',
-                                        facecolor='red', alpha=0.3)
-                        axes[0, 1].add_patch(rect)
-            
-            axes[0, 1].set_title('Font Inconsistencies (Red)', fontweight='bold', fontsize=12)
-            axes[0, 1].axis('off')
-            
-            # 3. Number patterns
-            axes[1, 0].imshow(img)
-            words = page.extract_words()
-            
-            for word in words:
-                if any(c.isdigit() for c in word['text']):
-                    if '.' in word['text']:
-                        decimals = len(word['text'].split('.')[-1])
-                        color = 'green' if decimals == 2 else 'orange'
-                        alpha = 0.2 if decimals == 2 else 0.4
-                    else:
-                        color = 'blue'
-                        alpha = 0.15
-                    
-                    x0 = word['x0'] * scale
-                    y0 = word['top'] * scale
-                    w = (word['x1'] - word['x0']) * scale
-                    h = (word['bottom'] - word['top']) * scale
-                    rect = Rectangle((x0, y0), w, h,
-                                    linewidth=1, edgecolor=color,
-                                    facecolor=color, alpha=alpha)
-                    axes[1, 0].add_patch(rect)
-            
-            axes[1, 0].set_title('Numbers (Green=2dp, Orange=Other)', fontweight='bold', fontsize=12)
-            axes[1, 0].axis('off')
-            
-            # 4. Alignment issues
-            axes[1, 1].imshow(img)
-            alignment_data = forensic_results.get('alignment', {})
-            
-            if alignment_data and alignment_data.get('issues'):
-                for issue in alignment_data['issues']:
-                    if issue['page'] == page_num + 1:
-                        for word in issue.get('words', []):
-                            x0 = word['x0'] * scale
-                            y0 = word['top'] * scale
-                            w = (word['x1'] - word['x0']) * scale
-                            h = (word['bottom'] - word['top']) * scale
-                            rect = Rectangle((x0, y0), w, h,
-                                            linewidth=2, edgecolor='red',
-                                            facecolor='yellow', alpha=0.4)
-                            axes[1, 1].add_patch(rect)
-            
-            axes[1, 1].set_title('Alignment Issues (Red/Yellow)', fontweight='bold', fontsize=12)
-            axes[1, 1].axis('off')
-            
-            plt.tight_layout()
-            
-            # Save to bytes and convert to base64
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=150, bbox_inches='tight')
-            buf.seek(0)
-            img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-            buf.close()
-            plt.close(fig)
-            
+
+    with open_document(pdf_file, pdf_bytes) as document:
+        # Page rasters come from the shared provider (rendered once per document)
+        try:
+            images = document.rasters.pages(VISUALIZATION_DPI, max_pages)
+        except Exception as e:
+            return {"error": f"Could not generate visualizations: {str(e)}"}
+
+        for page_num in range(min(max_pages, document.page_count)):
+            grid = render_page_panels(
+                images[page_num],
+                document.pages[page_num].height,
+                page_highlights(document, forensic_results, page_num)
+            )
+            img_base64 = base64.b64encode(encode_image(grid, image_format)).decode('utf-8')
+
             visualizations.append({
                 "page": str(page_num + 1),
                 "image_base64": img_base64,
-                "format": "png"
+                "format": image_format
             })
-    
-    return visualizations
\ No newline at end of file
+
+    return visualizations
+
+
+def _page_index(document, page_num):
+    """0-based index of a 1-based page number, or IndexError"""
+    if not 1 <= page_num <= document.page_count:
+        raise IndexError(f"Page {page_num} out of range (document has {document.page_count})")
+    return page_num - 1
+
+
+def render_visualization(file_bytes, forensic_results, page_num, image_format='png'):
+    """
+    Encoded panels of one page, for serving visualizations on demand
+
+    Module-level and argument-picklable so it can run in a process pool.
+
+    Args:
+        file_bytes: Uploaded file content (PDF or image)
+        forensic_results: Results (or their fonts/numbers/alignment subset)
+        page_num: Page number (1-based)
+        image_format: 'png' or 'webp'
+
+    Returns:
+        bytes: Encoded image
+
+    Raises:
+        IndexError: if the document has no such page
+    """
+    with load_document(file_bytes) as document:
+        page_index = _page_index(document, page_num)
+        grid = render_page_panels(
+            document.rasters.page(page_index, VISUALIZATION_DPI),
+            document.pages[page_index].height,
+            page_highlights(document, forensic_results, page_index)
+        )
+    return encode_image(grid, image_format)
+
+
+def _hex(color):
+    return '#%02x%02x%02x' % color
+
+
+def page_overlay(document, forensic_results, page_index):
+    """
+    Highlights of one page as vector layers, for clients that draw them
+
+    Returns:
+        dict: {'page', 'width', 'height', 'layers'}; sizes and boxes
+              (x0, top, x1, bottom) are in PDF points from the top-left
+              corner, each layer carries its fill/stroke/opacity/stroke_width
+    """
+    page = document.pages[page_index]
+    highlights = page_highlights(document, forensic_results, page_index)
+    return {
+        'page': page_index + 1,
+        'width': round(float(page.width), 1),
+        'height': round(float(page.height), 1),
+        'layers': {
+            layer: {
+                'fill': _hex(face),
+                'stroke': _hex(edge),
+                'opacity': alpha,
+                'stroke_width': edge_points,
+                'boxes': highlights[layer].round(1).tolist(),
+            }
+            for layer, (_, face, edge, alpha, edge_points) in LAYER_STYLES.items()
+        }
+    }
+
+
+def overlay_svg(overlay):
+    """
+    SVG document of a page_overlay(): one group per non-empty layer, its
+    boxes drawn as a single path in a page-sized viewBox
+    """
+    width, height = overlay['width'], overlay['height']
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width:g} {height:g}" '
+        f'width="{width:g}" height="{height:g}">'
+    ]
+    for layer, style in overlay['layers'].items():
+        if not style['boxes']:
+            continue
+        path = ''.join(
+            f'M{x0:g} {top:g}h{round(x1 - x0, 1):g}v{round(bottom - top, 1):g}h{round(x0 - x1, 1):g}z'
+            for x0, top, x1, bottom in style['boxes']
+        )
+        parts.append(
+            f'<g id="{layer}" fill="{style["fill"]}" fill-opacity="{style["opacity"]:g}" '
+            f'stroke="{style["stroke"]}" stroke-opacity="{style["opacity"]:g}" '
+            f'stroke-width="{style["stroke_width"]:g}"><path d="{path}"/></g>'
+        )
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def render_overlay(file_bytes, forensic_results, page_num, overlay_format='json'):
+    """
+    Vector highlights of one page, for serving overlays on demand
+
+    Module-level and argument-picklable so it can run in a process pool.
+
+    Args:
+        file_bytes: Uploaded file content (PDF or image)
+        forensic_results: Results (or their fonts/numbers/alignment subset)
+        page_num: Page number (1-based)
+        overlay_format: 'json' (compact page_overlay()) or 'svg'
+
+    Returns:
+        bytes: UTF-8 JSON or SVG
+
+    Raises:
+        IndexError: if the document has no such page
+    """
+    with load_document(file_bytes) as document:
+        overlay = page_overlay(document, forensic_results, _page_index(document, page_num))
+    if overlay_format == 'svg':
+        return overlay_svg(overlay).encode()
+    return json.dumps(overlay, separators=(',', ':')).encode()
+
+
+def render_thumbnail(file_bytes, page_num, image_format='png'):
+    """
+    Encoded page raster at THUMBNAIL_DPI, the backdrop for vector overlays
+
+    Module-level and argument-picklable so it can run in a process pool.
+
+    Raises:
+        IndexError: if the document has no such page
+    """
+    with load_document(file_bytes) as document:
+        image = document.rasters.page(_page_index(document, page_num), THUMBNAIL_DPI)
+        page = np.asarray(image.convert('RGB'))
+    return encode_image(page, image_format)
+
+
+def convert_artifact(data, source_format, target_format):
+    """
+    Rendered artifact in another format, for uploads no longer retained
+
+    Module-level and argument-picklable so it can run in a process pool.
+
+    Args:
+        data: Artifact bytes ('png'/'webp' image or 'json' overlay)
+        source_format: Format of data
+        target_format: 'png' or 'webp' for images, 'svg' for a JSON overlay
+
+    Returns:
+        bytes: The artifact encoded as target_format
+    """
+    if source_format == 'json':
+        return overlay_svg(json.loads(data)).encode()
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Could not decode {source_format} image")
+    return encode_image(cv2.cvtColor(image, cv2.COLOR_BGR2RGB), target_format)
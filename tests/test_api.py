@@ -44,3 +44,167 @@ def test_get_forensic_checks():
 
 
 
+
+def make_pdf_upload():
+    """Small text PDF for upload tests"""
+    from reportlab.pdfgen import canvas
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf)
+    c.drawString(72, 700, "Total income 1234.56")
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+def use_tmp_storage(monkeypatch, tmp_path):
+    """Point the caches, visualization store and job queue at a temporary directory"""
+    from app.config import settings
+    monkeypatch.setattr(settings, "RESULT_CACHE_PATH", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(settings, "OCR_CACHE_PATH", str(tmp_path / "ocr_cache.db"))
+    monkeypatch.setattr(settings, "VISUALIZATION_DIR", str(tmp_path / "visualizations"))
+    monkeypatch.setattr(settings, "JOB_DB_PATH", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(settings, "JOB_STORAGE_DIR", str(tmp_path / "uploads"))
+
+def test_analyze_document_runs_in_worker_pool(monkeypatch, tmp_path):
+    """Analysis is served from the worker pool, then from the result cache"""
+    use_tmp_storage(monkeypatch, tmp_path)
+    upload = make_pdf_upload()
+    
+    with TestClient(app) as pool_client:
+        assert pool_client.get("/health").json()["analysis_pool"]["running"]
+        first = pool_client.post(
+            "/api/v1/forensics/analyze",
+            files={"file": ("doc.pdf", upload, "application/pdf")}
+        )
+        second = pool_client.post(
+            "/api/v1/forensics/analyze",
+            files={"file": ("copy.pdf", upload, "application/pdf")}
+        )
+    
+    assert first.status_code == 200
+    data = first.json()
+    assert data["file_name"] == "doc.pdf"
+    assert "timings" in data
+    assert data["cached"] is False
+    
+    assert second.status_code == 200
+    assert second.json()["cached"] is True
+    assert second.json()["file_name"] == "copy.pdf"
+    assert second.json()["fonts"] == data["fonts"]
+
+def test_analyze_batch_streams_ndjson(monkeypatch, tmp_path):
+    """Each file in a batch gets its own NDJSON line"""
+    import json
+    use_tmp_storage(monkeypatch, tmp_path)
+    
+    with TestClient(app) as pool_client:
+        response = pool_client.post(
+            "/api/v1/forensics/analyze-batch",
+            files=[
+                ("files", ("a.pdf", make_pdf_upload(), "application/pdf")),
+                ("files", ("notes.txt", b"hello", "text/plain")),
+            ]
+        )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = {r["index"]: r for r in map(json.loads, response.text.splitlines())}
+    assert records[0]["status"] == "ok"
+    assert records[0]["result"]["file_name"] == "a.pdf"
+    assert records[0]["result"]["visualizations"] is None
+    assert records[1]["status"] == "error"
+
+def test_analysis_job_lifecycle(monkeypatch, tmp_path):
+    """A queued job runs in the background and its result can be fetched"""
+    import time
+    use_tmp_storage(monkeypatch, tmp_path)
+    
+    with TestClient(app) as pool_client:
+        submitted = pool_client.post(
+            "/api/v1/forensics/jobs",
+            files={"file": ("doc.pdf", make_pdf_upload(), "application/pdf")}
+        )
+        assert submitted.status_code == 202
+        job = submitted.json()
+        assert job["status"] in ("queued", "running")
+        
+        deadline = time.time() + 60
+        while job["status"] in ("queued", "running") and time.time() < deadline:
+            time.sleep(0.2)
+            job = pool_client.get(job["status_url"]).json()
+        
+        result = pool_client.get(job["result_url"])
+        cancel = pool_client.delete(job["status_url"])
+        missing = pool_client.get("/api/v1/forensics/jobs/unknown")
+    
+    assert job["status"] == "completed"
+    assert result.status_code == 200
+    assert result.json()["file_name"] == "doc.pdf"
+    assert cancel.status_code == 409
+    assert missing.status_code == 404
+
+def test_visualizations_render_on_first_request(monkeypatch, tmp_path):
+    """Analysis returns artifact references; pages, overlays and thumbnails render once"""
+    from PIL import Image
+    use_tmp_storage(monkeypatch, tmp_path)
+    buf = io.BytesIO()
+    Image.new("RGB", (850, 1100), "white").save(buf, format="PNG", dpi=(100, 100))
+    
+    with TestClient(app) as pool_client:
+        analyzed = pool_client.post(
+            "/api/v1/forensics/analyze",
+            files={"file": ("scan.png", buf.getvalue(), "image/png")}
+        ).json()
+        (reference,) = analyzed["visualizations"]
+        first = pool_client.get(reference["url"])
+        again = pool_client.get(reference["url"], headers={"If-None-Match": first.headers["etag"]})
+        webp = pool_client.get(reference["url"], headers={"Accept": "image/webp,*/*"})
+        missing = pool_client.get(reference["url"][:-1] + "2")
+        overlay = pool_client.get(reference["overlay_url"])
+        svg = pool_client.get(reference["overlay_url"], params={"format": "svg"})
+        thumbnail = pool_client.get(reference["thumbnail_url"], params={"format": "png"})
+        converted = pool_client.get(reference["thumbnail_url"], params={"format": "webp"})
+    
+    doc_hash = reference["artifact_id"].split("/")[0]
+    assert reference["page"] == "1"
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/png"
+    assert first.content.startswith(b"\x89PNG")
+    assert again.status_code == 304
+    assert webp.headers["content-type"] == "image/webp"
+    assert missing.status_code == 404
+    assert overlay.headers["content-type"] == "application/json"
+    assert overlay.json()["width"] == 612 and set(overlay.json()["layers"]) >= {"odd_fonts", "alignment"}
+    assert svg.headers["content-type"] == "image/svg+xml"
+    assert svg.text.startswith("<svg")
+    assert Image.open(io.BytesIO(thumbnail.content)).size == (612, 792)
+    assert converted.headers["content-type"] == "image/webp"
+    assert sorted(p.name for p in (tmp_path / "visualizations" / doc_hash).glob("*-1.*")) == [
+        "overlay-1.json", "overlay-1.svg", "page-1.png", "page-1.webp",
+        "thumbnail-1.png", "thumbnail-1.webp"
+    ]
+    # Every artifact rendered: other formats are converted without the upload
+    assert not (tmp_path / "visualizations" / doc_hash / "upload").exists()
+
+def test_visualization_store_purges_and_evicts(tmp_path):
+    """Documents expire after the TTL; eviction never removes the document being written"""
+    import os
+    import time
+    from app.services.visualizations import PANELS, VisualizationStore
+    store = VisualizationStore(str(tmp_path), max_bytes=1500, ttl=3600)
+    store.save("old", b"x" * 1000, {}, [1])
+    store.save("new", b"y" * 1000, {}, [1])
+    stale = time.time() - 7200
+    for name in ("old", "new"):
+        for path in (tmp_path / name / "inputs.json", tmp_path / name):
+            os.utime(path, (stale, stale))
+    
+    # Over budget: the least recently used document goes, never the caller's
+    store.store_rendered("new", PANELS, 1, "png", b"z" * 100)
+    assert not (tmp_path / "old").exists()
+    assert store.load("new") is not None
+    
+    # Analyzed longer than the TTL ago and not used since
+    os.utime(tmp_path / "new", (stale, stale))
+    assert store.purge_expired() == 1
+    assert store.load("new") is None
+    assert store.rendered("new", PANELS, 1, "png") is None
@@ -0,0 +1,729 @@
+import io
+
+import pytest
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from forensics import analyze_document_forensics
+from forensics.checks import check_font_consistency, check_number_patterns, check_text_alignment
+from forensics.document import DocumentContext
+
+
+def make_pdf(pages=2, producer=None):
+    """Build a small text PDF in memory"""
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    if producer:
+        c.setProducer(producer)
+    for page in range(pages):
+        c.setFont("Helvetica", 11)
+        c.drawString(480, 760, f"Page {page + 1}")
+        for i in range(10):
+            c.drawString(72, 600 - i * 20, f"Line {i} amount 1234.56 rate 0.125")
+        c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+@pytest.fixture
+def pdf_bytes():
+    return make_pdf()
+
+
+def test_document_context_caches_columnar_layout(pdf_bytes):
+    """Chars and words are extracted once per page into columnar tables"""
+    with DocumentContext(pdf_bytes=pdf_bytes) as document:
+        assert document.page_count == 2
+        words = document.word_table(0)
+        assert len(words) and words.boxes.dtype.name == 'float32'
+        assert document.word_table(0) is words
+        assert 'amount' in words.text
+        
+        chars = document.char_table(0)
+        histogram = document.font_histogram()
+        assert document.fonts.names == ['Helvetica']
+        assert histogram[0] == 2 * len(chars)
+        assert chars.within((0, 0, 200, 792)).sum() < len(chars)
+
+
+def test_checks_accept_shared_context(pdf_bytes):
+    """Checks give the same answer for raw bytes and a shared context"""
+    with DocumentContext(pdf_bytes=pdf_bytes) as document:
+        shared = check_number_patterns(document)
+        fonts = check_font_consistency(document)
+    assert shared == check_number_patterns(pdf_bytes)
+    assert fonts['dominant_font'] == 'Helvetica'
+
+
+def test_alignment_flags_baseline_drift():
+    """A word pasted a few points off its row's baseline is reported compactly"""
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    c.setFont("Helvetica", 11)
+    for i in range(5):
+        c.drawString(72, 600 - i * 20, f"Line {i} total")
+    c.drawString(200, 600, "Amount")
+    c.drawString(260, 597, "9876.54")       # 3pt below the row's baseline
+    c.showPage()
+    c.save()
+    
+    result = check_text_alignment(buf.getvalue())
+    assert result['count'] == 1
+    issue = result['issues'][0]
+    assert issue['page'] == 1
+    assert issue['num_words'] == 5
+    assert 2.5 < issue['deviation'] < 3.5
+    assert len(issue['boxes']) == 5 and len(issue['boxes'][0]) == 4
+    assert check_text_alignment(make_pdf())['count'] == 0
+
+
+def test_alignment_keeps_columns_apart():
+    """Lines of side-by-side columns with different pitches are not one row"""
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    c.setFont("Helvetica", 11)
+    for i in range(20):
+        c.drawString(72, 700 - i * 14, f"Line {i} amount 1234.56")
+    c.setFont("Helvetica", 9)
+    for i in range(25):
+        c.drawString(340, 700 - i * 11, f"Box line {i} value 78.90")
+    c.drawString(480, 700 - 3 * 11 - 2, "12.34")    # 2pt below its row in the side box
+    c.showPage()
+    c.save()
+    
+    result = check_text_alignment(buf.getvalue())
+    assert result['count'] == 1
+    assert result['issues'][0]['num_words'] == 6
+    assert result['issues'][0]['boxes'][0][0] == 340
+
+
+def test_number_patterns_counts_with_bounded_sample(pdf_bytes):
+    """Every decimal is counted but only a few examples are kept"""
+    from forensics.checks import NUMBER_SAMPLE_SIZE
+    
+    result = check_number_patterns(pdf_bytes)
+    # 10 lines x 2 pages, each with a 2dp and a 3dp number
+    assert result['precision_counts'] == {2: 20, 3: 20}
+    assert result['total_numbers'] == 40
+    assert len(result['precision_map'][2]) == NUMBER_SAMPLE_SIZE
+    first = result['positions'][0]
+    assert first['page'] == 1 and len(first['box']) == 4
+    assert {p['precision'] for p in result['positions']} == {0, 2, 3}
+
+
+def append_incremental_update(pdf_bytes, producer):
+    """Append an incremental save that replaces the Info dictionary"""
+    import re
+    from forensics.pdf_trailer import read_trailer
+    
+    trailer = read_trailer(pdf_bytes).trailer
+    prev = int(re.findall(rb'startxref\s+(\d+)', pdf_bytes)[-1])
+    number = trailer['Size']
+    update = f"\n{number} 0 obj\n<< /Producer ({producer}) >>\nendobj\n".encode()
+    xref_offset = len(pdf_bytes) + len(update)
+    update += (
+        f"xref\n0 1\n0000000000 65535 f \n{number} 1\n{len(pdf_bytes) + 1:010d} 00000 n \n"
+        f"trailer\n<< /Size {number + 1} /Root {trailer['Root'].number} 0 R "
+        f"/Info {number} 0 R /Prev {prev} >>\nstartxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    return pdf_bytes + update
+
+
+def test_metadata_reads_trailer_and_counts_revisions(pdf_bytes):
+    """Info comes from the newest trailer and each incremental save is counted"""
+    from forensics.checks import check_metadata
+    
+    original = check_metadata(pdf_bytes)
+    assert original['revisions']['count'] == 1
+    assert original['metadata']['pages'] == 2
+    
+    edited = check_metadata(append_incremental_update(pdf_bytes, 'Smallpdf'))
+    assert edited['revisions']['incremental_updates'] == 1
+    assert edited['metadata']['producer'] == 'Smallpdf'
+    assert edited['risk_score'] > original['risk_score']
+    assert "Document has 1 incremental update(s)" in edited['flags']
+    
+    # "%%EOF" drawn as page text is not a revision boundary
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter, pageCompression=0)
+    c.drawString(72, 700, "%%EOF")
+    c.showPage()
+    c.save()
+    assert b'(%%EOF) Tj' in buf.getvalue()
+    assert check_metadata(buf.getvalue())['revisions']['count'] == 1
+
+
+def test_analyze_document_forensics_result_shape(pdf_bytes):
+    """Full analysis returns every check and an overall score"""
+    results = analyze_document_forensics(None, pdf_bytes, 'doc.pdf', 'unknown')
+    for key in ['alignment', 'fonts', 'metadata', 'numbers', 'image',
+                'page_numbers', 'noa_id_check']:
+        assert key in results
+    assert results['risk_level'] in ('LOW', 'MEDIUM', 'HIGH')
+
+
+@pytest.fixture
+def fake_poppler(monkeypatch):
+    """Replace poppler with a blank-page renderer that records its calls"""
+    from PIL import Image
+    from forensics import raster
+
+    calls = []
+
+    def fake_convert(pdf_bytes, dpi, first_page=1, last_page=4, **kwargs):
+        calls.append((dpi, first_page, last_page))
+        size = (int(8.5 * dpi), int(11 * dpi))
+        return [Image.new('RGB', size) for _ in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(raster, 'convert_from_bytes', fake_convert)
+    monkeypatch.setattr(raster, 'pdfinfo_from_bytes', lambda pdf_bytes: {'Pages': 4})
+    return calls
+
+
+def test_raster_provider_renders_once_and_downsamples(fake_poppler):
+    """Pages are rendered once at the highest DPI; lower DPIs are derived"""
+    from forensics.raster import PageRasterProvider
+
+    provider = PageRasterProvider(b'%PDF')
+    provider.require(150)
+    provider.require(300)
+    assert provider.page(0, 300).size == (2550, 3300)
+    assert provider.page(0, 150).size == (1275, 1650)
+    assert fake_poppler == [(300, 1, 1)]
+
+
+def test_raster_provider_renders_only_requested_pages(fake_poppler):
+    """Only requested pages are rendered, consecutive ones in a single call"""
+    from forensics.raster import PageRasterProvider
+
+    provider = PageRasterProvider(b'%PDF', dpi=200)
+    assert len(provider.pages(200, max_pages=2)) == 2
+    provider.pages(200, indices=[0, 2])
+    assert fake_poppler == [(200, 1, 2), (200, 3, 3)]
+
+
+def test_raster_provider_renders_each_page_at_its_own_dpi(fake_poppler, monkeypatch):
+    """A DPI declared for some pages doesn't raise the render of the others"""
+    from forensics import raster
+
+    monkeypatch.setattr(raster, 'PDFIUM_AVAILABLE', False)
+    provider = raster.PageRasterProvider(b'%PDF')
+    provider.require(150)
+    provider.require(300, regions_only=True, indices=[0])
+    images = provider.pages(150, max_pages=3)
+    assert [image.size for image in images] == [(1275, 1650)] * 3
+    assert provider.region(0, 300, (0.0, 0.0, 1.0, 1.0)).size == (2550, 3300)
+    assert fake_poppler == [(300, 1, 1), (150, 2, 3)]
+
+
+def test_raster_provider_renders_regions_on_their_own(pdf_bytes, fake_poppler, monkeypatch):
+    """OCR regions render alone with pdfium, or are cropped from one full render"""
+    import numpy as np
+    from forensics import raster
+
+    box = (0.0, 0.1, 0.5, 0.3)
+    if raster.PDFIUM_AVAILABLE:
+        provider = raster.PageRasterProvider(pdf_bytes, page_count=2)
+        region = provider.region(0, 200, box)
+        full = raster.pdfium.PdfDocument(pdf_bytes)[0].render(scale=200 / 72).to_pil()
+        expected = raster.crop_fraction(full, box).convert('RGB')
+        assert region.size == expected.size == (850, 440)
+        assert np.array_equal(np.asarray(region), np.asarray(expected))
+        assert fake_poppler == []
+
+    monkeypatch.setattr(raster, 'PDFIUM_AVAILABLE', False)
+    provider = raster.PageRasterProvider(b'%PDF')
+    provider.require(300, regions_only=True)
+    assert provider.region(0, 300, box).size == (1275, 660)
+    assert provider.region(0, 200, box).size == (850, 440)
+    assert fake_poppler == [(300, 1, 1)]
+
+
+def test_concurrent_analysis_matches_sequential(pdf_bytes):
+    """Running checks on a thread pool gives the same results plus timings"""
+    sequential = analyze_document_forensics(None, pdf_bytes, 'doc.pdf', 'unknown')
+    concurrent = analyze_document_forensics(None, pdf_bytes, 'doc.pdf', 'unknown', max_workers=4)
+    for key in ['alignment', 'fonts', 'numbers', 'overall_score', 'risk_level']:
+        assert concurrent[key] == sequential[key]
+    # A text-only PDF has no embedded images, so the image check is routed away
+    assert set(concurrent['timings']) == {
+        'alignment', 'fonts', 'metadata', 'numbers', 'page_numbers', 'noa_id_check'
+    }
+
+
+def test_result_cache_memory_and_disk_tiers(tmp_path):
+    """Entries survive memory eviction on disk; disk is bounded by size"""
+    from forensics.cache import ResultCache, make_cache_key
+
+    cache = ResultCache(str(tmp_path / 'cache.db'), memory_items=1, max_disk_bytes=10_000)
+    cache.put('a', {'value': 1})
+    cache.put('b', {'value': 2})
+
+    assert cache.get('a') == {'value': 1}     # from disk, 'a' left memory
+    assert cache.get('a') == {'value': 1}     # now from memory
+    assert cache.get('missing') is None
+    stats = cache.stats()
+    assert (stats['memory_hits'], stats['disk_hits'], stats['misses']) == (1, 1, 1)
+
+    cache.put('big', {'blob': 'x' * 9_000})
+    assert cache.stats()['disk_bytes'] <= 10_000
+    assert make_cache_key('abc', 'noa') != make_cache_key('abc', 't1')
+
+
+def test_replay_side_effects_flags_resubmitted_noa(tmp_path, monkeypatch):
+    """A cached NOA result re-registers its ID, so a resubmission is a duplicate"""
+    from forensics.forensic_analyzer import replay_side_effects, score_results
+
+    monkeypatch.chdir(tmp_path)
+    cached = {
+        'alignment': {'risk_score': 0}, 'fonts': {'risk_score': 0},
+        'metadata': {'risk_score': 0}, 'numbers': {'risk_score': 0},
+        'image': {'risk_score': 0}, 'page_numbers': {'risk_score': 0},
+        'noa_id_check': {'risk_score': 0, 'id_number': '5X4YR5JX', 'extracted_info': {}},
+    }
+    score_results(cached)
+
+    first = replay_side_effects(dict(cached), 'first.pdf', 'ab' * 32)
+    assert first['noa_id_check']['is_duplicate'] is False
+    again = replay_side_effects(dict(cached), 'again.pdf', 'ab' * 32)
+    assert again['noa_id_check']['is_duplicate'] is True
+    assert again['overall_score'] > first['overall_score']
+
+
+def test_ocr_cli_backend_batches_regions(monkeypatch):
+    """One tesseract run covers a whole batch; TSV rows map back per image"""
+    from PIL import Image
+    from forensics import ocr
+
+    runs = []
+    tsv = (
+        "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+        "5\t1\t1\t1\t1\t1\t0\t0\t10\t10\t90\tPage\n"
+        "5\t1\t1\t1\t1\t2\t0\t0\t10\t10\t80\t1\n"
+        "5\t2\t1\t1\t1\t1\t0\t0\t10\t10\t70\tPage\n"
+        "5\t2\t1\t1\t1\t2\t0\t0\t10\t10\t-1\t\n"
+    )
+
+    class Completed:
+        stdout = tsv.encode()
+
+    def fake_run(args, **kwargs):
+        with open(args[1]) as f:
+            runs.append(f.read().split())
+        return Completed()
+
+    monkeypatch.setattr(ocr.subprocess, 'run', fake_run)
+    results = ocr.TesseractCliBackend().recognize_batch([Image.new('L', (20, 20))] * 3, psm=6)
+
+    assert len(runs) == 1 and len(runs[0]) == 3
+    assert results[0] == {'text': 'Page 1', 'confidence': 85.0}
+    assert results[1] == {'text': 'Page', 'confidence': 70.0}
+    assert results[2] == {'text': '', 'confidence': None}
+
+
+def test_noa_id_read_from_text_layer_without_rendering(tmp_path, monkeypatch, fake_poppler):
+    """A born-digital NOA's ID comes from its words; no page is rendered or OCR'd"""
+    from forensics.checks import extract_and_check_noa_id
+
+    monkeypatch.chdir(tmp_path)
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    c.setFont("Helvetica", 11)
+    c.drawString(72, 740, "Notice of Assessment for the 2023 tax year")
+    c.drawString(300, 680, "Date issued   March 4, 2024")
+    c.drawString(300, 660, "5X4YR5JX")
+    c.showPage()
+    c.save()
+
+    result = extract_and_check_noa_id(buf.getvalue(), 'noa.pdf', 'noa')
+    assert result['id_number'] == '5X4YR5JX'
+    assert result['id_source'] == 'text_layer'
+    assert result['ocr_confidence'] is None
+    assert result['extracted_info']['date_issued'] == 'March 4, 2024'
+    assert fake_poppler == []
+
+
+def test_noa_id_ocrd_from_image_upload(tmp_path, monkeypatch, fake_poppler):
+    """A photographed NOA opens as an image; its ID region is OCR'd without poppler"""
+    from PIL import Image
+    from forensics import checks
+
+    class FakeService:
+        def recognize_one(self, image, psm):
+            self.size = image.size
+            return {'text': 'Date issued\n5X4YR5JX', 'confidence': 88.0}
+
+    service = FakeService()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(checks, 'TESSERACT_AVAILABLE', True)
+    monkeypatch.setattr(checks, 'get_ocr_service', lambda: service)
+    buf = io.BytesIO()
+    Image.new('RGB', (850, 1100), 'white').save(buf, format='JPEG', dpi=(100, 100))
+
+    result = checks.extract_and_check_noa_id(buf.getvalue(), 'noa.jpg', 'noa')
+    assert result['id_number'] == '5X4YR5JX'
+    assert result['id_source'] == 'ocr'
+    assert service.size == (1020, 660)
+    assert fake_poppler == []
+
+
+def make_scanned_pdf():
+    """PDF whose only page is a full-page image with no text layer"""
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+
+    scan = io.BytesIO()
+    Image.new('L', (850, 1100), 255).save(scan, format='PNG')
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter)
+    c.drawImage(ImageReader(io.BytesIO(scan.getvalue())), 0, 0, width=612, height=792)
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def test_page_classification_routes_checks(pdf_bytes, fake_poppler):
+    """Scans skip the text-layer checks; text-only PDFs skip the image check"""
+    scanned = analyze_document_forensics(None, make_scanned_pdf(), 'scan.pdf', 'unknown')
+    page = scanned['page_classification']['pages'][0]
+    assert page['type'] == 'scanned' and page['image_coverage'] == 1.0
+    assert scanned['alignment']['applicable'] is False
+    assert 'alignment' not in scanned['timings']
+    assert 'image' in scanned['timings']
+
+    digital = analyze_document_forensics(None, pdf_bytes, 'doc.pdf', 'unknown')
+    assert digital['page_classification']['counts'] == {'digital': 2}
+    assert digital['image']['applicable'] is False
+
+
+def test_image_quality_uses_embedded_scan_without_rendering(fake_poppler):
+    """Scans are measured on the embedded image; JPEGs decode at a reduced DCT scale"""
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+    from forensics.checks import check_image_quality
+
+    result = check_image_quality(make_scanned_pdf())
+    assert result['image_sources'] == [{'page': 1, 'source': 'embedded', 'dpi': 100}]
+
+    jpeg = io.BytesIO()
+    Image.new('RGB', (2400, 3200), 'white').save(jpeg, format='JPEG')
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=(576, 768))   # 8 x 10.67 in -> 300 dpi
+    c.drawImage(ImageReader(io.BytesIO(jpeg.getvalue())), 0, 0, width=576, height=768)
+    c.showPage()
+    c.save()
+
+    result = check_image_quality(buf.getvalue())
+    # 300 dpi decoded at 1/2 scale: the coarsest DCT scale still >= 150 dpi
+    assert result['image_sources'] == [{'page': 1, 'source': 'embedded', 'dpi': 150}]
+    assert fake_poppler == []
+
+    # Unreadable input keeps the result shape the visualizations read
+    failed = check_image_quality(b'%PDF-1.4 truncated')
+    assert failed['flags'][0].startswith('Image analysis unavailable')
+    assert set(failed) == set(result)
+    assert failed['image_sources'] == failed['inconsistent_regions'] == []
+
+
+def test_tile_map_localizes_pasted_region():
+    """A clean block pasted into a noisy scan is reported at its PDF-point location"""
+    import cv2
+    import numpy as np
+    from forensics.tiles import tile_map
+
+    rng = np.random.default_rng(0)
+    page = np.full((1650, 1275), 235, np.float32)   # letter at 150 dpi
+    for y in range(100, 1600, 40):
+        for x in range(100, 1100, 60):
+            cv2.putText(page, "1234", (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 30, 1)
+    scan = cv2.GaussianBlur(np.clip(page + rng.normal(0, 3, page.shape), 0, 255), (3, 3), 0.8)
+
+    assert tile_map(scan.astype(np.uint8))['regions'] == []
+    assert tile_map(page.astype(np.uint8))['regions'] == []
+
+    scan[600:760, 400:700] = page[600:760, 400:700]
+    regions = tile_map(scan.astype(np.uint8))['regions']
+    assert regions
+    x0, top, x1, bottom = regions[0]['bbox']
+    # Pasted block spans 192-336 pt across and 288-365 pt down
+    assert x0 < 200 and x1 > 330 and top < 295 and bottom > 360
+
+
+def test_jpeg_check_detects_double_compression():
+    """Coefficient histograms of a re-saved JPEG show the first quantization"""
+    import cv2
+    import numpy as np
+    from PIL import Image
+    from forensics.checks import check_jpeg_compression
+
+    rng = np.random.default_rng(1)
+    texture = np.zeros((600, 480), np.float32)
+    for scale in (3, 9, 27):
+        noise = rng.normal(0, 1, (600 // scale + 2, 480 // scale + 2)).astype(np.float32)
+        texture += cv2.resize(noise, (480, 600), interpolation=cv2.INTER_CUBIC) * 20
+    image = Image.fromarray(np.clip(texture + 128, 0, 255).astype(np.uint8))
+
+    def save(img, quality):
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=quality)
+        return buf.getvalue()
+
+    for quality in (50, 75, 90, 95):
+        single = check_jpeg_compression(save(image, quality))
+        assert single['quality'] == quality and single['standard_tables']
+        assert single['double_compression']['detected'] is False
+        assert single['risk_score'] == 0
+
+    # Quality raised (peaks and gaps) and lowered (uneven bins) on re-save
+    for primary, secondary in ((55, 90), (70, 85), (85, 70), (90, 75)):
+        double = check_jpeg_compression(save(Image.open(io.BytesIO(save(image, primary))), secondary))
+        assert double['quality'] == secondary
+        assert double['double_compression']['detected'] is True, (primary, secondary)
+        assert abs(double['double_compression']['primary_quality'] - primary) <= 3
+        assert double['risk_score'] >= 40
+
+    # Truncated or corrupt headers are reported, not raised
+    jpeg = save(image, 80)
+    assert jpeg[20:22] == b'\xff\xdb' and jpeg[89:91] == b'\xff\xc0'
+    for broken in (
+        jpeg[:21],                                          # marker cut after 0xFF
+        jpeg[:22] + b'\x00\x42\x10' + jpeg[25:],            # 16-bit table, odd length
+        jpeg[:98] + b'\xff' + jpeg[99:],                     # 255 frame components
+        jpeg[:22] + b'\x00\x01' + jpeg[24:],                 # segment length below 2
+    ):
+        result = check_jpeg_compression(broken)
+        assert result['applicable'] is False
+        assert result['flags'][0].startswith('JPEG analysis unavailable')
+    # A scan cut short is still sampled
+    assert check_jpeg_compression(jpeg[:len(jpeg) // 2])['quality'] == 80
+
+
+def test_image_upload_analyzed_natively(fake_poppler):
+    """JPEG uploads are one scanned page decoded in place: no PDF, no poppler"""
+    from PIL import Image
+    from forensics.document import ImageDocument, open_document
+
+    image = Image.new('RGB', (3300, 2550), 'white')   # 11 x 8.5 in at 300 dpi
+    exif = image.getexif()
+    exif[0x0131] = 'Adobe Photoshop 24.0'
+    buf = io.BytesIO()
+    image.save(buf, format='JPEG', dpi=(300, 300), exif=exif)
+    jpeg = buf.getvalue()
+
+    with open_document(jpeg) as document:
+        assert isinstance(document, ImageDocument)
+        assert (round(document.pages[0].width), round(document.pages[0].height)) == (792, 612)
+        # Decoded at a reduced DCT scale for a 150 dpi consumer
+        assert document.rasters.page(0, 150).size == (1650, 1275)
+        assert document.page_scan(0, 100)[1] == 150
+
+    results = analyze_document_forensics(None, jpeg, 'photo.jpg', 'unknown')
+    assert results['page_classification']['counts'] == {'scanned': 1}
+    assert results['alignment']['applicable'] is False
+    assert results['image']['image_sources'][0]['source'] == 'embedded'
+    assert results['metadata']['metadata']['creator'] == 'Adobe Photoshop 24.0'
+    assert results['jpeg']['quality'] == 75
+    assert fake_poppler == []
+
+
+def test_page_numbers_ocr_fans_out_in_page_order(monkeypatch, fake_poppler):
+    """Odd pages are OCR'd in concurrent batches, read back in order, and stop at max risk"""
+    import threading
+    import time
+    from forensics import checks, ocr
+
+    class SlowBackend:
+        """Reads 'Page N' back after a delay, N odd in image order of arrival"""
+
+        def __init__(self):
+            self.calls = 0
+            self.images = 0
+            self.lock = threading.Lock()
+
+        def recognize_batch(self, images, psm):
+            with self.lock:
+                self.calls += 1
+                first = self.images
+                self.images += len(images)
+            time.sleep(0.2)
+            return [{'text': f'Page {2 * (first + i) + 1}', 'confidence': 90.0}
+                    for i in range(len(images))]
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(ocr, 'OCR_AVAILABLE', True)
+    monkeypatch.setattr(ocr, 'TESSEROCR_AVAILABLE', False)
+    service = ocr.OcrService(workers=8)
+    service.backend = SlowBackend()
+    monkeypatch.setattr(checks, 'TESSERACT_AVAILABLE', True)
+    monkeypatch.setattr(checks, 'get_ocr_service', lambda: service)
+
+    with DocumentContext(pdf_bytes=make_pdf(pages=16)) as document:
+        document.page_count   # parsed page count is shared with the rasters
+        start = time.perf_counter()
+        result = checks.check_page_numbers(document, 'noa', stop_after_issues=None)
+        elapsed = time.perf_counter() - start
+
+    # 8 odd pages on 8 workers: one CLI task per page, run side by side
+    assert service.backend.calls == 8
+    assert elapsed < 0.2 * 4
+    assert result['pages_checked'] == 8 and not result['stopped_early']
+    found = [p['extracted_number'] for p in result['page_numbers_found']]
+    assert sorted(found) == [1, 3, 5, 7, 9, 11, 13, 15]
+
+    # Every page misnumbered: stops once the score is maxed out
+    monkeypatch.setattr(SlowBackend, 'recognize_batch',
+                        lambda self, images, psm: [{'text': 'Page 99', 'confidence': 50.0} for _ in images])
+    with DocumentContext(pdf_bytes=make_pdf(pages=16)) as document:
+        document.page_count
+        result = checks.check_page_numbers(document, 'noa', stop_after_issues=4)
+    assert result['pages_checked'] == 4 and result['stopped_early']
+    assert result['risk_score'] == 80
+    service.close()
+
+
+def test_ocr_iter_spreads_pages_over_workers(monkeypatch):
+    """CLI tasks only batch images once there are more of them than workers"""
+    from PIL import Image
+    from forensics import ocr
+
+    class CountingBackend:
+        def __init__(self):
+            self.tasks = []
+
+        def recognize_batch(self, images, psm):
+            self.tasks.append(len(images))
+            return [{'text': '', 'confidence': None} for _ in images]
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(ocr, 'OCR_AVAILABLE', True)
+    monkeypatch.setattr(ocr, 'TESSEROCR_AVAILABLE', False)
+    service = ocr.OcrService(workers=8)
+    service.backend = CountingBackend()
+    corners = (Image.new('L', (340, 220), 255) for _ in range(4))
+    assert len(list(service.recognize_iter(corners, psm=6, count=4))) == 4
+    assert service.backend.tasks == [1, 1, 1, 1]
+
+    service.backend = CountingBackend()
+    assert len(list(service.recognize_iter([Image.new('L', (340, 220), 255)] * 40, psm=6))) == 40
+    assert len(service.backend.tasks) == 40 // ocr.ITER_BATCH_SIZE
+    service.close()
+
+
+def test_ocr_cache_skips_repeated_regions(tmp_path, monkeypatch):
+    """Identical regions under the same config are OCR'd once, across services"""
+    from PIL import Image, ImageDraw
+    from forensics import ocr
+    from forensics.ocr_cache import OcrCache
+
+    class CountingBackend:
+        lang = 'eng'
+
+        def __init__(self):
+            self.images = 0
+
+        def recognize_batch(self, images, psm):
+            self.images += len(images)
+            return [{'text': f'psm {psm}', 'confidence': 90.0} for _ in images]
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(ocr, 'OCR_AVAILABLE', True)
+    monkeypatch.setattr(ocr, 'TESSEROCR_AVAILABLE', False)
+    corner = Image.new('L', (340, 220), 255)
+    ImageDraw.Draw(corner).text((20, 20), 'Page 1', fill=0)
+    other = Image.new('L', (340, 220), 255)
+
+    cache = OcrCache(str(tmp_path / 'ocr.db'), memory_items=8, max_entries=2)
+    service = ocr.OcrService(workers=2, cache=cache)
+    service.backend = CountingBackend()
+    assert service.recognize([corner, other, corner.copy()], psm=6)[2] == {'text': 'psm 6', 'confidence': 90.0}
+    assert service.backend.images == 2
+    service.recognize([corner, other], psm=6)
+    assert list(service.recognize_iter([corner], psm=6)) == [{'text': 'psm 6', 'confidence': 90.0}]
+    assert service.backend.images == 2
+    # The tesseract config is part of the key
+    assert service.recognize_one(corner, psm=11)['text'] == 'psm 11'
+    assert service.backend.images == 3
+    service.close()
+
+    # A fresh process-level cache (another worker) hits the disk tier
+    fresh = ocr.OcrService(workers=1, cache=OcrCache(str(tmp_path / 'ocr.db'), max_entries=2))
+    fresh.backend = CountingBackend()
+    fresh.recognize([corner], psm=11)
+    assert fresh.backend.images == 0
+
+    stats = fresh.cache.stats()
+    assert stats['disk_entries'] == 2        # LRU-bounded
+    assert stats['misses'] == 4
+    assert stats['memory_hits'] + stats['disk_hits'] == 4
+    assert stats['hit_rate'] == 0.5
+    fresh.close()
+
+
+def test_visualizations_draw_boxes_into_page_panels(pdf_bytes, fake_poppler):
+    """Highlights are blended into the page rasters and encoded once per page"""
+    import base64
+    import numpy as np
+    from PIL import Image
+    from forensics.overlay import GUTTER, TITLE_HEIGHT, box_mask
+    from forensics.visualizer_api import create_forensic_visualizations_api, render_page_panels
+
+    boxes = np.array([[-4, 2, 10, 6], [5, 4, 12, 20], [30, 30, 30, 40]])
+    mask, (top, left) = box_mask((16, 16), boxes)
+    expected = np.zeros((16, 16), dtype=bool)
+    expected[2:6, 0:10] = expected[4:16, 5:12] = True
+    assert (top, left) == (2, 0)
+    assert np.array_equal(mask, expected[2:16, 0:12])
+
+    page = Image.new('RGB', (850, 1100), 'white')
+    highlights = {layer: np.empty((0, 4)) for layer in
+                  ('odd_fonts', 'numbers_2dp', 'numbers_other', 'numbers_integer')}
+    highlights['alignment'] = np.array([[72.0, 72.0, 144.0, 108.0]])
+    grid = render_page_panels(page, 792, highlights)
+    assert grid.shape == (2 * (1100 + TITLE_HEIGHT + GUTTER) + GUTTER, 2 * (850 + GUTTER) + GUTTER, 3)
+    alignment = grid[2 * GUTTER + 1100 + 2 * TITLE_HEIGHT:, 2 * GUTTER + 850:]
+    assert tuple(alignment[120, 150]) == (255, 255, 153)   # yellow fill at 40%
+    assert tuple(alignment[100, 150]) == (255, 153, 92)    # red edge over the fill
+    assert tuple(alignment[90, 150]) == (255, 255, 255)
+
+    results = analyze_document_forensics(pdf_file=io.BytesIO(pdf_bytes), pdf_bytes=pdf_bytes)
+    for image_format in ('png', 'webp'):
+        visualizations = create_forensic_visualizations_api(
+            io.BytesIO(pdf_bytes), pdf_bytes, results, image_format=image_format
+        )
+        assert [v['page'] for v in visualizations] == ['1', '2']
+        decoded = Image.open(io.BytesIO(base64.b64decode(visualizations[0]['image_base64'])))
+        assert decoded.format == image_format.upper()
+        assert decoded.size == (grid.shape[1], grid.shape[0])
+
+
+def test_overlay_returns_highlights_as_vector_layers():
+    """The panels' boxes are exported in page space as JSON layers and SVG"""
+    import json
+    from forensics.document import load_document
+    from forensics.visualizer_api import overlay_svg, page_overlay, render_overlay
+
+    pdf = make_pdf(pages=1)
+    results = {
+        'fonts': {'dominant_font': 'Courier'},
+        'numbers': {'positions': [{'page': 1, 'precision': 2, 'box': [72, 90, 120.55, 100]}]},
+        'alignment': {'issues': [{'page': 2, 'boxes': [[0, 0, 10, 10]]}]},
+    }
+    with load_document(pdf) as document:
+        overlay = page_overlay(document, results, 0)
+
+    assert (overlay['width'], overlay['height']) == (612, 792)
+    layers = overlay['layers']
+    assert layers['numbers_2dp']['boxes'] == [[72.0, 90.0, 120.6, 100.0]]
+    assert layers['numbers_2dp']['fill'] == '#008000'
+    assert layers['odd_fonts']['boxes'] and layers['alignment']['boxes'] == []
+
+    svg = overlay_svg(overlay)
+    assert '<g id="numbers_2dp"' in svg and 'M72 90h48.6v10h-48.6z' in svg
+    assert 'id="alignment"' not in svg
+    assert json.loads(render_overlay(pdf, results, 1)) == overlay